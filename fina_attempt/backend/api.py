@@ -238,7 +238,8 @@ import json
 import os
 import tempfile
 import traceback
-from typing import List, Optional, Tuple
+from functools import partial
+from typing import List, Optional, Tuple, Union
 
 from fastapi import FastAPI, File, Form, HTTPException, UploadFile, Header
 from fastapi.middleware.cors import CORSMiddleware
@@ -251,6 +252,9 @@ DFMEA_DEBUG = os.getenv("DFMEA_DEBUG", "0") == "1"
 from server.pipeline.dfmea_pipeline import DFMEAPipeline
 from server.utils.excel_parser import read_csv_safe, read_excel_safe
 from server.utils.docx_parser import parse_docx_to_rows  # may have varying signature
+from server.utils.parsers import run_parse_jobs
+from server.utils.parse_cache import ParseCacheStats, get_parse_cache
+from server.utils.io_helpers import SpooledUpload, UploadTooLarge, close_uploads, intake_uploads
 
 # ---------------- FastAPI app ----------------
 app = FastAPI(title="DFMEA Backend", version="1.2")
@@ -273,51 +277,6 @@ class DFMEAResponse(BaseModel):
     message: Optional[str] = None  # helpful status note
 
 # ---------------- Helpers ----------------
-def _is_legacy_doc(filename: str) -> bool:
-    if not filename:
-        return False
-    name = filename.lower()
-    return name.endswith(".doc") and not name.endswith(".docx")
-
-def _split_by_type(files: List[UploadFile]) -> Tuple[list, list, list, list, list]:
-    """
-    Split UploadFile list into (docx_list, csv_list, xlsx_list, empty_list, legacy_doc_list).
-    Each list contains tuples (filename, bytes).
-    """
-    docx, csvs, xlsxs, empties, legacy = [], [], [], [], []
-    for uf in files or []:
-        fname = uf.filename or ""
-        if _is_legacy_doc(fname):
-            legacy.append(fname)
-            continue
-
-        # read bytes safely
-        blob: bytes = b""
-        try:
-            uf.file.seek(0, io.SEEK_SET)
-            blob = uf.file.read()
-        except Exception:
-            try:
-                blob = uf.read()
-            except Exception:
-                blob = b""
-
-        if not blob:
-            empties.append(fname)
-            continue
-
-        name = fname.lower()
-        if name.endswith(".docx"):
-            docx.append((fname, blob))
-        elif name.endswith(".csv"):
-            csvs.append((fname, blob))
-        elif name.endswith(".xlsx"):
-            xlsxs.append((fname, blob))
-        else:
-            # ignore unknown extensions; we only support docx/csv/xlsx
-            pass
-    return docx, csvs, xlsxs, empties, legacy
-
 def _normalize_rows(rows, fname: str) -> list:
     """Ensure rows is a list[dict] and each row has a 'source'."""
     norm = []
@@ -333,7 +292,7 @@ def _normalize_rows(rows, fname: str) -> list:
             norm.append({"source": fname, "text": str(item)})
     return norm
 
-def _parse_docx_anyway(fname: str, blob: bytes) -> list:
+def _parse_docx_anyway(fname: str, blob: Union[bytes, str]) -> list:
     """
     Try multiple call styles so we work with any parse_docx_to_rows signature:
       1) parse_docx_to_rows(BytesIO, source_name=fname)
@@ -341,6 +300,14 @@ def _parse_docx_anyway(fname: str, blob: bytes) -> list:
       3) write temp file and call parse_docx_to_rows(path)
     Normalize the returned rows to list[dict] with 'source'.
     """
+    # spilled uploads arrive as a temp-file path, which every signature accepts
+    if isinstance(blob, str):
+        try:
+            rows = parse_docx_to_rows(blob, source_name=fname)
+        except TypeError:
+            rows = parse_docx_to_rows(blob)
+        return _normalize_rows(rows, fname)
+
     # 1) try keyword 'source_name'
     try:
         bio = io.BytesIO(blob)
@@ -379,40 +346,72 @@ def _parse_docx_anyway(fname: str, blob: bytes) -> list:
     except Exception as e:
         raise e  # let caller wrap into HTTPException
 
-def _rows_from_docx_bytes(items: List[Tuple[str, bytes]], bucket: str) -> list:
-    rows = []
-    for fname, blob in items:
-        try:
-            r = _parse_docx_anyway(fname, blob)
-            if r:
-                rows.extend(r)
-        except Exception as e:
-            _fail(400, f"{bucket} DOCX '{fname}' parse failed: {e}")
-    return rows
+def _table_rows(kind: str, fname: str, blob: Union[bytes, str]) -> Optional[list]:
+    """Parse one CSV/XLSX upload into records (None when it has no data)."""
+    df = read_csv_safe(blob) if kind == "csv" else read_excel_safe(blob)
+    if df is None or df.empty:
+        return None
+    df["__source__"] = fname
+    return df.to_dict(orient="records")
 
-def _rows_from_table_files(csvs: List[Tuple[str, bytes]], xlsxs: List[Tuple[str, bytes]], bucket: str) -> list:
-    rows = []
-    for fname, blob in csvs:
-        try:
-            df = read_csv_safe(blob)
-            if df is None or df.empty:
-                _fail(400, f"{bucket} CSV '{fname}' has no data.")
-            df["__source__"] = fname
-            rows.extend(df.to_dict(orient="records"))
-        except Exception as e:
-            _fail(400, f"{bucket} CSV '{fname}' parse failed: {e}")
-
-    for fname, blob in xlsxs:
-        try:
-            df = read_excel_safe(blob)
-            if df is None or df.empty:
-                _fail(400, f"{bucket} Excel '{fname}' has no data.")
-            df["__source__"] = fname
-            rows.extend(df.to_dict(orient="records"))
-        except Exception as e:
-            _fail(400, f"{bucket} Excel '{fname}' parse failed: {e}")
+def _upload_jobs(uploads: List[SpooledUpload], bucket: str) -> list:
+    """
+    One (label, upload, job) per parseable upload — DOCX first, then CSV, then Excel
+    (the old parse order). Other kinds are rejected up front by generate_dfmea.
+    """
+    jobs = []
+    for up in uploads:
+        if up.kind == "docx":
+            jobs.append((f"{bucket} DOCX", up, partial(_parse_docx_anyway, up.filename, up.source())))
+    for kind, label in (("csv", "CSV"), ("xlsx", "Excel")):
+        for up in uploads:
+            if up.kind == kind:
+                jobs.append((f"{bucket} {label}", up, partial(_table_rows, kind, up.filename, up.source())))
+    return jobs
+
+def _stamp_source(rows: list, kind: str, fname: str) -> list:
+    """Re-apply the upload's filename (cached rows are keyed by content only)."""
+    for r in rows:
+        if kind == "docx":
+            r["source"] = fname
+            if "file" in r:
+                r["file"] = os.path.basename(fname)
+        else:
+            r["__source__"] = fname
     return rows
 
+def _rows_from_uploads(buckets: List[list]) -> Tuple[List[list], dict]:
+    """
+    Parse every upload of every bucket concurrently (DFMEA_PARSE_WORKERS processes) and
+    return (one row list per bucket in upload order, parse-cache counts). Uploads whose
+    bytes were parsed before are served from the content-addressed parse cache.
+    The first failing file (in upload order) is reported through _fail, same as the
+    old per-bucket loops.
+    """
+    cache = get_parse_cache()
+    stats = ParseCacheStats()
+
+    plan = []
+    for i, jobs in enumerate(buckets):
+        for label, up, job in jobs:
+            key = cache.key_for_digest(up.kind, up.sha256)
+            plan.append((i, label, up.filename, up.kind, key, cache.get(key, stats), job))
+
+    todo = [p for p in plan if p[5] is None]
+    parsed = iter(run_parse_jobs([p[6] for p in todo]))
+
+    out: List[list] = [[] for _ in buckets]
+    for i, label, fname, kind, key, rows, _ in plan:
+        if rows is None:
+            rows, err = next(parsed)
+            if err is not None:
+                _fail(400, f"{label} '{fname}' parse failed: {err}")
+            if rows is None:
+                _fail(400, f"{label} '{fname}' has no data.")
+            cache.put(key, rows)
+        out[i].extend(_stamp_source(rows, kind, fname))
+    return out, stats.as_counts()
+
 def _make_excel_download_bytes(entries: list) -> Optional[bytes]:
     try:
         import pandas as pd
@@ -458,27 +457,39 @@ def generate_dfmea(
     if (focus or "").strip() and not x_admin_auth:
         _fail(401, "Admin authentication required for focus prompt.")
 
-    # ---- collect & validate files
-    all_files = (prds or []) + (knowledge_base or []) + (field_issues or [])
-    # reject legacy .doc
-    _, _, _, _, legacy_bad = _split_by_type(all_files)
-    if legacy_bad:
-        _fail(400, f"Legacy .doc files are not supported: {', '.join(legacy_bad)}. Please upload .docx/.csv/.xlsx.")
-
-    # split by buckets
-    prd_docx, prd_csvs, prd_xlsxs, prd_empty, _  = _split_by_type(prds)
-    kb_docx,  kb_csvs,  kb_xlsxs,  kb_empty,  _  = _split_by_type(knowledge_base)
-    fri_docx, fri_csvs, fri_xlsxs, fri_empty, _  = _split_by_type(field_issues)
-
-    # empties
-    empties = prd_empty + kb_empty + fri_empty
-    if empties:
-        _fail(400, f"Empty uploads detected: {', '.join([e or '(unnamed)'] for e in empties)}")
+    # ---- intake: read every upload once (hash + magic-byte type + spool), enforce size limits
+    try:
+        intake = intake_uploads([prds, knowledge_base, field_issues])
+    except UploadTooLarge as e:
+        _fail(413, str(e))
 
-    # parse rows per bucket
-    prd_rows = _rows_from_docx_bytes(prd_docx, "PRD") + _rows_from_table_files(prd_csvs, prd_xlsxs, "PRD")
-    kb_rows  = _rows_from_docx_bytes(kb_docx,  "Knowledge Base") + _rows_from_table_files(kb_csvs, kb_xlsxs, "Knowledge Base")
-    fri_rows = _rows_from_docx_bytes(fri_docx, "Field Issues")   + _rows_from_table_files(fri_csvs, fri_xlsxs, "Field Issues")
+    try:
+        uploads = [up for bucket in intake for up in bucket]
+
+        # reject legacy .doc (OLE container, whatever the extension says)
+        legacy_bad = [up.filename for up in uploads if up.kind == "doc"]
+        if legacy_bad:
+            _fail(400, f"Legacy .doc files are not supported: {', '.join(legacy_bad)}. Please upload .docx/.csv/.xlsx.")
+
+        # empties
+        empties = [up.filename or "(unnamed)" for up in uploads if up.kind == "empty"]
+        if empties:
+            _fail(400, f"Empty uploads detected: {', '.join(empties)}")
+
+        # anything else we cannot parse (plain text, JSON, legacy .xls, unknown binaries)
+        unsupported = [up.filename or "(unnamed)" for up in uploads if up.kind not in ("docx", "csv", "xlsx")]
+        if unsupported:
+            _fail(400, f"Unsupported file type: {', '.join(unsupported)}. Please upload .docx/.csv/.xlsx.")
+
+        # parse rows per bucket
+        prd_up, kb_up, fri_up = intake
+        (prd_rows, kb_rows, fri_rows), parse_counts = _rows_from_uploads([
+            _upload_jobs(prd_up, "PRD"),
+            _upload_jobs(kb_up,  "Knowledge Base"),
+            _upload_jobs(fri_up, "Field Issues"),
+        ])
+    finally:
+        close_uploads(intake)
 
     if not (prd_rows or kb_rows or fri_rows):
         _fail(400, "No usable content detected in uploads. Provide .docx/.csv/.xlsx with valid data.")
@@ -524,7 +535,7 @@ def generate_dfmea(
         _fail(500, "Pipeline returned invalid response (expected dict).")
 
     entries = result.get("entries", [])
-    counts = result.get("counts", {})
+    counts = {**(result.get("counts") or {}), **parse_counts}
     excel_bytes = result.get("excel_bytes", None)
     if excel_bytes is None:
         excel_bytes = _make_excel_download_bytes(entries)
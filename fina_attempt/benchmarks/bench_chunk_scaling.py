@@ -0,0 +1,142 @@
+# benchmarks/bench_chunk_scaling.py
+"""
+Sentence-aware chunking scaling benchmark: offset-based chunker
+(ChunkingAgent._sentence_aware_chunks) vs the previous string-concatenation
+implementation, on 1 KB .. 5 MB inputs.
+
+Shapes:
+  prose   PRD-style sentences of ~80 chars
+  terse   very short sentences ("OK."), which the old splitter merged by
+          repeated concatenation (quadratic)
+  run-on  no sentence punctuation (hard character windows)
+
+A flat µs/KB column means linear scaling. The legacy chunker is skipped
+above --legacy-max-kb because it is quadratic on "terse".
+
+Run from fina_attempt/:
+    python -m benchmarks.bench_chunk_scaling
+    python -m benchmarks.bench_chunk_scaling --legacy-max-kb 0
+"""
+from __future__ import annotations
+
+import argparse
+import re
+import time
+from typing import Callable, List
+
+from server.agents.chunking_agent import ChunkingConfig, _clean_text, _sentence_aware_chunks
+
+SIZES_KB = (1, 10, 100, 1024, 5 * 1024)
+
+SHAPES = {
+    "prose": "Display brightness shall reach 500 nits at full backlight in direct sunlight. ",
+    "terse": "OK. ",
+    "run-on": "display shall be readable outdoors at 20000 lux with the full stack up ",
+}
+
+
+# ---------- previous implementation (baseline) ----------
+
+_SENT_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(])")
+
+
+def _legacy_split_sentences(text: str) -> List[str]:
+    merged: List[str] = []
+    buf = ""
+    for p in _SENT_SPLIT.split(text):
+        p = p.strip()
+        if not p:
+            continue
+        if not buf:
+            buf = p
+        elif len(p) < 40 or len(buf) < 60:
+            buf = f"{buf} {p}"
+        else:
+            merged.append(buf)
+            buf = p
+    if buf:
+        merged.append(buf)
+    return merged
+
+
+def _legacy_windows(text: str, cfg: ChunkingConfig) -> List[str]:
+    chunks, start, n = [], 0, len(text)
+    size = max(cfg.chunk_size, cfg.min_chunk_size)
+    ov = max(0, min(cfg.chunk_overlap, size - 1))
+    while start < n:
+        end = min(n, start + size)
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end == n:
+            break
+        start = max(end - ov, start + 1)
+    return chunks
+
+
+def _legacy_sentence_aware_chunks(text: str, cfg: ChunkingConfig) -> List[str]:
+    chunks: List[str] = []
+    cur = ""
+    for s in _legacy_split_sentences(text):
+        if len(cur) + 1 + len(s) <= cfg.chunk_size:
+            cur = s if not cur else f"{cur} {s}"
+        elif cur:
+            if len(cur) < cfg.min_chunk_size and len(s) < cfg.chunk_size:
+                cur = f"{cur} {s}"
+            else:
+                chunks.append(cur.strip())
+                cur = s
+        else:
+            chunks.extend(_legacy_windows(s, cfg))
+            cur = ""
+    if cur:
+        chunks.append(cur.strip())
+    if cfg.chunk_overlap > 0 and len(chunks) > 1:
+        ov = cfg.chunk_overlap
+        out = [chunks[0]]
+        for ch in chunks[1:]:
+            tail = out[-1][-ov:] if len(out[-1]) > ov else out[-1]
+            if not ch.startswith(tail):
+                ch = (tail + " " + ch).strip()
+            out.append(ch)
+        chunks = out
+    return chunks
+
+
+# ---------- driver ----------
+
+def _best_of(fn: Callable[[], List[str]], repeat: int) -> tuple:
+    best, out = float("inf"), []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes-kb", type=int, nargs="*", default=list(SIZES_KB))
+    ap.add_argument("--legacy-max-kb", type=int, default=1024, help="largest input for the legacy chunker")
+    ap.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    args = ap.parse_args()
+
+    cfg = ChunkingConfig()
+    print(f"{'shape':7} {'size KB':>8} {'chunker':8} {'chunks':>8} {'seconds':>9} {'µs/KB':>8}")
+    for shape, unit in SHAPES.items():
+        for kb in args.sizes_kb:
+            text = _clean_text(unit * max(1, kb * 1024 // len(unit)), cfg)
+            runs = [("offsets", _sentence_aware_chunks)]
+            if kb <= args.legacy_max_kb:
+                runs.append(("legacy", _legacy_sentence_aware_chunks))
+            results = {}
+            for name, fn in runs:
+                sec, chunks = _best_of(lambda: fn(text, cfg), args.repeat if kb < 1024 else 1)
+                results[name] = chunks
+                print(f"{shape:7} {kb:8d} {name:8} {len(chunks):8,d} {sec:9.3f} {sec * 1e6 / kb:8.1f}")
+            if len(results) == 2 and results["offsets"] != results["legacy"]:
+                print("  !! outputs differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+# benchmarks/bench_chunking.py
+"""
+Chunking benchmark and regression suite.
+
+Synthetic corpora modeled on our sources (KB rows, field-issue rows, PRD blocks
+with requirement IDs / headings / table rows) plus pathological inputs (run-on
+text without sentence punctuation, very long unbroken tokens, thousands of
+micro-sentences) are chunked with every ChunkingConfig mode. Per case we record
+chunks/sec, MB/s, peak ΔRSS (fresh spawned process per case) and the chunk-length
+distribution.
+
+Results are compared with benchmarks/baselines/chunking.json:
+  * chunk counts and length distribution must match exactly (behavior change)
+  * throughput, normalized by a fixed calibration workload so baselines move
+    between machines, must not drop more than --tolerance
+Token-mode cases are only compared when the tokenizer matches the baseline's.
+
+Run from fina_attempt/:
+    python -m benchmarks.bench_chunking                    # report + compare
+    python -m benchmarks.bench_chunking --check            # exit 1 on regression
+    python -m benchmarks.bench_chunking --update-baseline  # after an intended change
+    python -m benchmarks.bench_chunking --scale 0.05 --in-process
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import re
+import resource
+import sys
+import time
+from dataclasses import replace
+from typing import Any, Callable, Dict, List, Optional
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "chunking.json")
+
+# scale 1.0 sizes; pathological corpora are sized in KB per item
+CORPORA: Dict[str, Dict[str, int]] = {
+    "kb": {"items": 2000},
+    "field": {"items": 20000},
+    "prd": {"items": 5000},
+    "run-on": {"items": 16, "kb": 64},
+    "long-token": {"items": 16, "kb": 64},
+    "terse": {"items": 16, "kb": 64},
+}
+
+MODES = ("chars", "windowed", "tokens", "no-groups")
+
+_WORDS = (
+    "display touch panel backlight glass crack drop impact housing seal gasket connector "
+    "flex cable solder joint moisture ingress corrosion firmware brightness contrast lux "
+    "temperature humidity vibration shock battery charging thermal screen protector glove "
+    "stylus latency jitter accuracy linearity adhesive bezel lens scratch coating"
+).split()
+
+
+# ---------- synthetic corpora ----------
+
+def _sentence(rng: random.Random, lo: int = 6, hi: int = 24) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(lo, hi))]
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), f"{rng.randint(1, 9999)}")
+    return " ".join(words).capitalize() + rng.choice(".....!?")
+
+
+def _kb_row(rng: random.Random, i: int) -> str:
+    fields = {
+        "ID": i,
+        "Function": rng.choice(["Display", "Touch Panel", "Housing"]),
+        "Potential Failure Mode": _sentence(rng),
+        "Potential Failure Effects": _sentence(rng),
+        "SEVERITY": rng.randint(1, 10),
+        "Potential Causes": " ".join(_sentence(rng) for _ in range(rng.randint(1, 4))),
+        "Preventive Controls": " ".join(_sentence(rng) for _ in range(rng.randint(1, 3))),
+        "Detection Controls": _sentence(rng),
+        "RPN": rng.randint(1, 1000),
+        "JIRA": float("nan") if rng.random() < 0.5 else f"QUAL-{rng.randint(100, 999)}",
+    }
+    return str(fields)
+
+
+def _field_row(rng: random.Random, i: int) -> str:
+    return str({
+        "Product": rng.choice(["TC52/57 Mufasa", "TC52/57 Lightning", "MC93 Quasar"]),
+        "Fault_Code": rng.choice(["Damage-Cracked Touch Panel", "No Display", "Ghost Touch", "Flicker"]),
+        "Part_Category": rng.choice(["DISPLAY + TP", "HOUSING", "BATTERY"]),
+        "Fault_Type": rng.choice(["Damage", "Functional", "Cosmetic"]),
+    })
+
+
+def _prd_rows(rng: random.Random, n: int) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    req = 5000
+    while len(rows) < n:
+        kind = rng.random()
+        idx = len(rows)
+        if kind < 0.15:
+            text, rid = f"4.17.{rng.randint(1, 9)}.{rng.randint(1, 20)} {rng.choice(_WORDS).title()} {rng.choice(_WORDS)}", None
+        elif kind < 0.55:
+            req += 1
+            rid = f"Quasar-{req}"
+            text = f"{rid} - {rng.choice(_WORDS).title()} " + " ".join(_sentence(rng) for _ in range(rng.randint(1, 5)))
+        elif kind < 0.75:
+            text, rid = "Shall Have, Req't Team Approved, System Requirement", None
+        else:
+            text, rid = f"Index: {idx % 9} | Description: {_sentence(rng, 4, 12)} | Example: {_sentence(rng, 3, 8)}", None
+        rows.append({"source_type": "prd", "file": "spec.docx", "idx": idx, "text": text, "requirement_id": rid})
+    return rows
+
+
+def make_corpus(name: str, scale: float = 1.0, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = random.Random(f"{name}:{seed}")
+    spec = CORPORA[name]
+    n = max(1, int(spec["items"] * scale))
+    if name == "kb":
+        return [{"source_type": "kb", "file": "kb.csv", "idx": i, "text": _kb_row(rng, i)} for i in range(n)]
+    if name == "field":
+        return [{"source_type": "field", "file": "fri.xlsx", "idx": i, "text": _field_row(rng, i)} for i in range(n)]
+    if name == "prd":
+        return _prd_rows(rng, n)
+
+    size = spec["kb"] * 1024
+    items = []
+    for i in range(n):
+        if name == "run-on":
+            parts, total = [], 0
+            while total < size:
+                w = rng.choice(_WORDS)
+                parts.append(w)
+                total += len(w) + 1
+            text = " ".join(parts)
+        elif name == "long-token":
+            blob = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/") for _ in range(size // 2))
+            text = f"{_sentence(rng)} {blob} {_sentence(rng)} {blob[::-1]}"
+        else:  # terse
+            text = "OK. " * (size // 4)
+        items.append({"source_type": "kb", "file": f"{name}.txt", "idx": i, "text": text})
+    return items
+
+
+# ---------- cases ----------
+
+def _config(mode: str, workers: int = 1):
+    from server.agents.chunking_agent import ChunkingConfig
+    base = ChunkingConfig(unit="chars", sentence_aware=True, group_requirements=True, workers=1)
+    if mode == "windowed":
+        base = replace(base, sentence_aware=False)
+    elif mode == "tokens":
+        base = replace(base, unit="tokens")
+    elif mode == "no-groups":
+        base = replace(base, group_requirements=False)
+    elif mode == "parallel":
+        base = replace(base, workers=workers)
+    return base
+
+
+def cases(workers: int = 1) -> List[tuple]:
+    out = []
+    for corpus in CORPORA:
+        for mode in MODES:
+            if mode == "no-groups" and corpus != "prd":
+                continue
+            out.append((corpus, mode))
+        if workers > 1:
+            out.append((corpus, "parallel"))
+    return out
+
+
+def tokenizer_name() -> str:
+    from server.utils import tokens
+    return f"tiktoken:{tokens.TOKEN_ENCODING}" if tokens._tok is not None else "fallback"
+
+
+def _percentile(sorted_vals: List[int], q: float) -> int:
+    if not sorted_vals:
+        return 0
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * (len(sorted_vals) - 1) + 0.5))]
+
+
+def _rss_kb() -> int:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_case(
+    corpus: str, mode: str, *, scale: float = 1.0, workers: int = 1, repeat: int = 1, calibrated: bool = True,
+) -> Dict[str, Any]:
+    from server.agents.chunking_agent import ChunkingAgent
+
+    items = make_corpus(corpus, scale)
+    mb = sum(len(it["text"]) for it in items) / 1e6
+    agent = ChunkingAgent(_config(mode, workers))
+
+    base = _rss_kb()
+    best, chunks = float("inf"), []
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        chunks = agent.run(items)
+        best = min(best, time.perf_counter() - t0)
+    rss_mb = max(0, _rss_kb() - base) / 1024
+    calibration = calibrate() if calibrated else 0.0
+
+    lengths = sorted(len(c["chunk"]) for c in chunks)
+    return {
+        "items": len(items),
+        "mb": round(mb, 3),
+        "chunks": len(chunks),
+        "seconds": best,
+        "calibration": calibration,
+        "chunks_per_sec": len(chunks) / best if best else 0.0,
+        "mb_per_sec": mb / best if best else 0.0,
+        "rss_mb": round(rss_mb, 1),
+        "len_p50": _percentile(lengths, 0.5),
+        "len_p95": _percentile(lengths, 0.95),
+        "len_max": lengths[-1] if lengths else 0,
+        "tokens_p95": _percentile(sorted(c["meta"].get("tokens", 0) for c in chunks), 0.95),
+    }
+
+
+def calibrate(repeat: int = 5) -> float:
+    """
+    Seconds for a fixed regex/str workload; chunks/sec * calibration is roughly
+    machine-neutral. Measured next to each case so load changes during a run cancel out.
+    """
+    text = ("Calibration sentence number one.   It has spaces and Punctuation! " * 4000)
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(5):
+            s = re.sub(r"\s+", " ", text)
+            parts = re.split(r"(?<=[.!?])\s+(?=[A-Z0-9(])", s)
+            " ".join(p.strip().lower() for p in parts)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _child(corpus: str, mode: str, scale: float, workers: int, repeat: int, q) -> None:
+    importlib.import_module("server.agents.chunking_agent")  # import cost is not part of the measurement
+    q.put(run_case(corpus, mode, scale=scale, workers=workers, repeat=repeat))
+
+
+def _spawned(corpus: str, mode: str, scale: float, workers: int, repeat: int) -> Dict[str, Any]:
+    ctx = mp.get_context("spawn")
+    q = ctx.Queue()
+    p = ctx.Process(target=_child, args=(corpus, mode, scale, workers, repeat, q))
+    p.start()
+    out = q.get()
+    p.join()
+    return out
+
+
+# ---------- baselines ----------
+
+SHAPE_KEYS = ("items", "chunks", "len_p50", "len_p95", "len_max", "tokens_p95")
+
+
+def load_baseline(path: str = BASELINE_PATH) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {}
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline_run: Dict[str, Any],
+    *,
+    tokenizer: str,
+    tolerance: float,
+    case_tolerance: float,
+    check_speed: bool = True,
+) -> List[str]:
+    """
+    Problems found versus one stored run ({"tokenizer", "cases"}). Single cases are
+    noisy, so throughput fails on the geometric mean of normalized ratios dropping more
+    than `tolerance`, or on any one case dropping more than `case_tolerance`.
+    """
+    problems: List[str] = []
+    base_cases = baseline_run.get("cases") or {}
+    same_tok = baseline_run.get("tokenizer") == tokenizer
+    for key, res in results.items():
+        ref = base_cases.get(key)
+        if ref is None or (key.endswith("/tokens") and not same_tok):
+            continue
+        for k in SHAPE_KEYS:
+            if ref.get(k) != res.get(k):
+                problems.append(f"{key}: {k} {ref.get(k)} -> {res.get(k)}")
+        if check_speed and ref.get("chunks_per_sec") and ref.get("calibration"):
+            ratio = (res["chunks_per_sec"] * res["calibration"]) / (ref["chunks_per_sec"] * ref["calibration"])
+            res["vs_baseline"] = ratio
+            if ratio < 1 - case_tolerance:
+                problems.append(f"{key}: throughput {ratio:.0%} of baseline")
+    geo = throughput_geomean(results)
+    if check_speed and geo is not None and geo < 1 - tolerance:
+        problems.append(f"overall: throughput geomean {geo:.0%} of baseline")
+    return problems
+
+
+def throughput_geomean(results: Dict[str, Dict[str, Any]]) -> Optional[float]:
+    ratios = [v["vs_baseline"] for v in results.values() if v.get("vs_baseline")]
+    if not ratios:
+        return None
+    return math.exp(sum(math.log(x) for x in ratios) / len(ratios))
+
+
+def run_suite(
+    *,
+    scale: float = 1.0,
+    workers: int = 1,
+    repeat: int = 1,
+    in_process: bool = False,
+    calibrated: bool = True,
+    log: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for corpus, mode in cases(workers):
+        if in_process:
+            res = run_case(corpus, mode, scale=scale, workers=workers, repeat=repeat, calibrated=calibrated)
+        else:
+            res = _spawned(corpus, mode, scale, workers, repeat)
+        results[f"{corpus}/{mode}"] = res
+        if log:
+            log(_row(f"{corpus}/{mode}", res))
+    return results
+
+
+def _row(key: str, r: Dict[str, Any]) -> str:
+    return (
+        f"{key:22} {r['items']:>7,d} {r['mb']:>7.2f} {r['chunks']:>8,d} {r['seconds']:>8.3f} "
+        f"{r['chunks_per_sec']:>10,.0f} {r['mb_per_sec']:>7.1f} {r['rss_mb']:>7.1f} "
+        f"{r['len_p50']:>5d} {r['len_p95']:>5d} {r['len_max']:>6d}"
+    )
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scale", type=float, default=1.0, help="corpus size multiplier (baselines are per scale)")
+    ap.add_argument("--workers", type=int, default=1, help=">1 adds a 'parallel' mode per corpus")
+    ap.add_argument("--repeat", type=int, default=5, help="best of N timed runs per case")
+    ap.add_argument("--in-process", action="store_true", help="no spawned children (ΔRSS is not meaningful)")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed drop of the throughput geomean")
+    ap.add_argument("--case-tolerance", type=float, default=0.5, help="allowed drop of any single case")
+    ap.add_argument("--check", action="store_true", help="exit 1 if anything regressed")
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    args = ap.parse_args()
+
+    tok = tokenizer_name()
+    print(f"tokenizer {tok}, scale {args.scale:g}")
+    print(f"{'case':22} {'items':>7} {'MB':>7} {'chunks':>8} {'sec':>8} {'chunks/s':>10} {'MB/s':>7} "
+          f"{'ΔRSS':>7} {'p50':>5} {'p95':>5} {'max':>6}")
+    results = run_suite(scale=args.scale, workers=args.workers, repeat=args.repeat,
+                        in_process=args.in_process, log=print)
+
+    baseline = load_baseline(args.baseline)
+    run_key = f"{args.scale:g}"
+    if args.update_baseline:
+        baseline.setdefault("runs", {})[run_key] = {
+            "tokenizer": tok,
+            "cases": {k: {**v, "seconds": round(v["seconds"], 5)} for k, v in results.items()},
+        }
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(baseline, fh, indent=1, sort_keys=True)
+        print(f"baseline for scale {run_key} written to {args.baseline}")
+        return 0
+
+    ref = (baseline.get("runs") or {}).get(run_key)
+    if not ref:
+        print(f"no baseline for scale {run_key}; run with --update-baseline")
+        return 0
+    problems = compare(results, ref, tokenizer=tok, tolerance=args.tolerance, case_tolerance=args.case_tolerance)
+    geo = throughput_geomean(results)
+    if geo is not None:
+        print("normalized throughput vs baseline: "
+              + ", ".join(f"{k} {v['vs_baseline']:.0%}" for k, v in results.items() if "vs_baseline" in v)
+              + f"; geomean {geo:.0%}")
+    for p in problems:
+        print("REGRESSION", p)
+    if not problems:
+        print("no regressions")
+    return 1 if (problems and args.check) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
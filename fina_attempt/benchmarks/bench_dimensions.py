@@ -0,0 +1,202 @@
+# benchmarks/bench_dimensions.py
+"""
+Reduced-dimension embeddings: recall and search latency vs the full-size vectors.
+
+For each target size, the corpus and query vectors are reduced by Matryoshka
+truncation and by a PCA fitted on a corpus sample (never on the queries), loaded
+into a Qdrant collection, and searched with the same queries. Reported per config:
+recall@k against the exact top-k of the full-size vectors, search latency
+(p50/p95 per query) and vector memory.
+
+Vector sources (first match wins):
+  --vectors corpus.npy [--queries queries.npy]   real embeddings, e.g. exported from Qdrant
+  --backend azure|onnx|sentence-transformers     embed synthetic KB/PRD rows (queries: field rows)
+  (default)                                      synthetic vectors with a decaying spectrum
+
+API-side reduction (Azure `dimensions`) is not measured here: it needs a re-embed
+per size; for text-embedding-3 it behaves like truncation + re-normalization.
+
+Run from fina_attempt/:
+    python -m benchmarks.bench_dimensions
+    python -m benchmarks.bench_dimensions --dims 1024 512 256 128 --k 12
+    python -m benchmarks.bench_dimensions --backend onnx --corpus 5000
+    python -m benchmarks.bench_dimensions --url http://localhost:6333   # real node / HNSW
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from server.utils.dim_reduction import DimReduction, fit_pca
+
+
+# ---------- vectors ----------
+
+def synthetic_vectors(n: int, n_queries: int, dim: int = 1536, seed: int = 7) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Clustered unit vectors whose per-component variance decays like a power law (as
+    in real text embeddings), randomly rotated so no component order is privileged
+    unless --matryoshka. Queries are noisy copies of random corpus points.
+    """
+    rng = np.random.default_rng(seed)
+    scale = (np.arange(1, dim + 1, dtype=np.float64) ** -0.6)
+    centers = rng.standard_normal((max(8, n // 50), dim)) * scale
+    x = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.standard_normal((n, dim)) * scale
+    q = x[rng.integers(0, n, n_queries)] + 0.35 * rng.standard_normal((n_queries, dim)) * scale
+    return _unit(x), _unit(q)
+
+
+def embedded_vectors(backend: str, n: int, n_queries: int) -> Tuple[np.ndarray, np.ndarray]:
+    from benchmarks.bench_chunking import CORPORA, make_corpus
+    from server.agents.embedding_agent import EmbeddingAgent
+
+    def rows(name: str, count: int) -> List[Dict[str, Any]]:
+        items = make_corpus(name, scale=count / CORPORA[name]["items"])[:count]
+        return [{"text": r.pop("text"), "metadata": {**r, "embed": True}} for r in items]
+
+    agent = EmbeddingAgent(backend, reduction=DimReduction())  # full size; reduced below
+    corpus = agent.run(rows("kb", n // 2) + rows("prd", n - n // 2))
+    queries = agent.run(rows("field", n_queries))
+    return corpus.vectors, queries.vectors
+
+
+def _unit(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+
+# ---------- search ----------
+
+def search_config(
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    *,
+    url: Optional[str] = None,
+) -> Tuple[np.ndarray, List[float]]:
+    """Load `corpus` into a fresh collection, run every query; (top-k row indexes, seconds per query)."""
+    from qdrant_client import QdrantClient
+    from qdrant_client.http import models as rest
+
+    client = QdrantClient(url=url) if url else QdrantClient(":memory:")
+    name = f"bench_dims_{uuid.uuid4().hex[:8]}"
+    client.create_collection(name, vectors_config=rest.VectorParams(size=corpus.shape[1], distance=rest.Distance.COSINE))
+    try:
+        client.upload_collection(name, vectors=corpus, ids=list(range(len(corpus))), wait=True)
+        hits = np.full((len(queries), k), -1, dtype=np.int64)
+        secs: List[float] = []
+        for i, q in enumerate(queries):
+            t0 = time.perf_counter()
+            res = client.query_points(name, query=q, limit=k, with_payload=False).points
+            secs.append(time.perf_counter() - t0)
+            hits[i, : len(res)] = [int(p.id) for p in res]
+        return hits, secs
+    finally:
+        client.delete_collection(name)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+# ---------- suite ----------
+
+def run_suite(
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    *,
+    dims: List[int],
+    k: int = 12,
+    fit_sample: int = 5000,
+    url: Optional[str] = None,
+    log=print,
+) -> List[Dict[str, Any]]:
+    truth = exact_top_k(corpus, queries, k)
+    native = corpus.shape[1]
+    rng = np.random.default_rng(0)
+    sample = corpus[rng.choice(len(corpus), min(fit_sample, len(corpus)), replace=False)]
+    sizes = [d for d in dims if d < native]
+
+    configs: List[Tuple[str, DimReduction]] = [("native", DimReduction())]
+    with tempfile.TemporaryDirectory() as tmp:
+        if sizes:
+            pca_path = os.path.join(tmp, "pca.npz")
+            fit_pca(sample, min(max(sizes), len(sample) - 1), pca_path)
+        for d in sizes:
+            configs.append((f"truncate-{d}", DimReduction("truncate", d)))
+            if d < len(sample):
+                configs.append((f"pca-{d}", DimReduction("pca", d, pca_path)))
+
+        results = []
+        for label, red in configs:
+            c, q = red.apply(corpus), red.apply(queries)
+            hits, secs = search_config(c, q, k, url=url)
+            ms = np.asarray(secs) * 1000
+            row = {
+                "config": label,
+                "dims": c.shape[1],
+                f"recall@{k}": round(recall_at_k(hits, truth), 4),
+                "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                "p95_ms": round(float(np.percentile(ms, 95)), 3),
+                "vector_mb": round(c.nbytes / 2**20, 2),
+            }
+            results.append(row)
+            if log:
+                log(f"{label:14} {row['dims']:>6} {row[f'recall@{k}']:>10.4f} {row['p50_ms']:>9.3f} "
+                    f"{row['p95_ms']:>9.3f} {row['vector_mb']:>10.2f}")
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--vectors", help=".npy corpus vectors (N x D)")
+    ap.add_argument("--queries", help=".npy query vectors (default: 200 corpus rows held out)")
+    ap.add_argument("--backend", help="embed a synthetic corpus with this EmbeddingAgent backend")
+    ap.add_argument("--corpus", type=int, default=20000, help="corpus size (synthetic / --backend)")
+    ap.add_argument("--n-queries", type=int, default=200)
+    ap.add_argument("--native-dim", type=int, default=1536, help="synthetic vector size")
+    ap.add_argument("--matryoshka", action="store_true", help="synthetic: no rotation, leading components dominate")
+    ap.add_argument("--dims", type=int, nargs="+", default=[1024, 512, 256, 128])
+    ap.add_argument("--k", type=int, default=12)
+    ap.add_argument("--fit-sample", type=int, default=5000, help="corpus rows the PCA is fitted on")
+    ap.add_argument("--url", help="Qdrant URL (default: in-process local mode, exact search)")
+    args = ap.parse_args()
+
+    if args.vectors:
+        corpus = _unit(np.load(args.vectors))
+        if args.queries:
+            queries = _unit(np.load(args.queries))
+        else:
+            queries, corpus = corpus[: args.n_queries], corpus[args.n_queries:]
+        source = args.vectors
+    elif args.backend:
+        corpus, queries = embedded_vectors(args.backend, args.corpus, args.n_queries)
+        source = f"backend {args.backend}"
+    else:
+        corpus, queries = synthetic_vectors(args.corpus, args.n_queries, args.native_dim)
+        if not args.matryoshka:
+            rot, _ = np.linalg.qr(np.random.default_rng(1).standard_normal((args.native_dim,) * 2))
+            corpus, queries = corpus @ rot.astype(np.float32), queries @ rot.astype(np.float32)
+        source = "synthetic" + (" (matryoshka-like)" if args.matryoshka else "")
+
+    print(f"{source}: {len(corpus)} x {corpus.shape[1]} corpus, {len(queries)} queries, "
+          f"qdrant {'at ' + args.url if args.url else 'local mode'}")
+    print(f"{'config':14} {'dims':>6} {'recall@' + str(args.k):>10} {'p50 ms':>9} {'p95 ms':>9} {'vectors MB':>10}")
+    run_suite(corpus, queries, dims=args.dims, k=args.k, fit_sample=args.fit_sample, url=args.url)
+
+
+if __name__ == "__main__":
+    main()
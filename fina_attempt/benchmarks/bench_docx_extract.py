@@ -0,0 +1,94 @@
+# benchmarks/bench_docx_extract.py
+"""
+DOCX extraction benchmark: python-docx object model vs streaming XML extractor.
+
+Each (method, file) pair runs in a fresh process so peak RSS is not polluted by
+earlier runs. Small sample files can be inflated with --repeat, which clones the
+document body N times into a temporary DOCX to approximate our large spec bundles.
+
+Run from fina_attempt/:
+    python -m benchmarks.bench_docx_extract
+    python -m benchmarks.bench_docx_extract --repeat 200
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import multiprocessing as mp
+import os
+import re
+import resource
+import tempfile
+import time
+import zipfile
+from typing import Dict, Tuple
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "server", "sample_files")
+
+
+def _rss_kb() -> int:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _measure(method: str, path: str) -> Tuple[float, int, int]:
+    from server.utils.docx_parser import iter_docx_rows, parse_docx_to_rows
+
+    base = _rss_kb()
+    t0 = time.perf_counter()
+    if method == "python-docx":
+        n = len(parse_docx_to_rows(path))
+    else:
+        n = sum(1 for _ in iter_docx_rows(path))
+    elapsed = time.perf_counter() - t0
+    return elapsed, max(0, _rss_kb() - base), n
+
+
+def _inflate(path: str, repeat: int, out_dir: str) -> str:
+    """Clone the <w:body> content `repeat` times into a new DOCX."""
+    if repeat <= 1:
+        return path
+    out = os.path.join(out_dir, f"x{repeat}_{os.path.basename(path)}")
+    with zipfile.ZipFile(path) as src, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            data = src.read(info.filename)
+            if info.filename == "word/document.xml":
+                xml = data.decode("utf-8")
+                m = re.search(r"(<w:body>)(.*?)(<w:sectPr[^>]*>.*</w:sectPr>)?(</w:body>)", xml, re.S)
+                if m:
+                    body = m.group(2) * repeat
+                    xml = xml[: m.start(2)] + body + xml[m.end(2):]
+                data = xml.encode("utf-8")
+            dst.writestr(info, data)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=50, help="inflate each sample body N times (default 50)")
+    ap.add_argument("files", nargs="*", help="DOCX files (default: server/sample_files/*.docx)")
+    args = ap.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(SAMPLE_DIR, "*.docx")))
+    ctx = mp.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'file':48} {'method':12} {'MB':>7} {'rows':>8} {'sec':>8} {'rows/s':>10} {'ΔRSS MB':>9}")
+        for f in files:
+            path = _inflate(f, args.repeat, tmp)
+            size_mb = os.path.getsize(path) / 1e6
+            results: Dict[str, Tuple[float, int, int]] = {}
+            for method in ("python-docx", "streaming"):
+                with ctx.Pool(1) as pool:
+                    results[method] = pool.apply(_measure, (method, path))
+                sec, rss_kb, n = results[method]
+                print(
+                    f"{os.path.basename(f)[:48]:48} {method:12} {size_mb:7.2f} {n:8d} "
+                    f"{sec:8.3f} {n / sec if sec else 0:10.0f} {rss_kb / 1024:9.1f}"
+                )
+            if results["python-docx"][2] != results["streaming"][2]:
+                print("  !! row count mismatch between methods")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# benchmarks/bench_tabular_rows.py
+"""
+Row normalization benchmark: iterrows() reference vs the column-wise
+df_to_normalized_rows / df_to_field_issue_rows.
+
+Synthetic frames mimic a field-issue export (product/subsystem/component/
+fault columns + free-text description with some blanks/NaNs).
+
+Run from fina_attempt/:
+    python -m benchmarks.bench_tabular_rows
+    python -m benchmarks.bench_tabular_rows --sizes 10000 100000 --legacy-max 100000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from server.utils.excel_parser import (
+    detect_preferred_text_column,
+    df_to_field_issue_rows,
+    df_to_normalized_rows,
+)
+
+
+# ---------- reference (pre-vectorization) implementations ----------
+
+def legacy_df_to_normalized_rows(df, *, product, subproduct, source_type, file_name,
+                                 text_pref_cols=("text", "notes", "description", "failure_mode",
+                                                 "failure mode", "issue", "symptom")) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    pref = detect_preferred_text_column(df, text_pref_cols)
+    for i, row in df.iterrows():
+        if pref is not None:
+            val = row.get(pref)
+            text = str(val) if pd.notna(val) else ""
+        else:
+            text = str({c: row.get(c) for c in df.columns})
+        text = (text or "").strip()
+        if not text:
+            continue
+        out.append({"product": product, "subproduct": subproduct, "source_type": source_type,
+                    "file": os.path.basename(file_name), "idx": int(i), "text": text})
+    return out
+
+
+def legacy_fri_df_to_rows(fri_df, *, product, subproduct) -> List[Dict]:
+    cols = {c.lower(): c for c in fri_df.columns}
+    product_key = cols.get("product")
+    subsystem_key = cols.get("subsystem") or cols.get("sub_product") or cols.get("subproduct")
+    component_key = cols.get("component") or subsystem_key
+    fault_code_key = cols.get("fault_code") or cols.get("code")
+    fault_type_key = cols.get("fault_type") or cols.get("type")
+    rows: List[Dict] = []
+    for _, r in fri_df.iterrows():
+        rows.append({
+            "product": str(r.get(product_key) if product_key else product),
+            "subsystem": str(r.get(subsystem_key) if subsystem_key else subproduct),
+            "component": str(r.get(component_key) if component_key else subproduct),
+            "fault_code": str(r.get(fault_code_key) or "") if fault_code_key else "",
+            "fault_type": str(r.get(fault_type_key) or "") if fault_type_key else "",
+        })
+    return rows
+
+
+# ---------- harness ----------
+
+def make_field_frame(n: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    desc = np.array([
+        "Display flickers after wake from sleep",
+        "Touch unresponsive in bottom-left corner at low temperature",
+        "Backlight bleed visible at edges",
+        "Cracked cover glass after 1.2 m drop",
+        "",
+    ], dtype=object)
+    d = desc[rng.integers(0, len(desc), n)]
+    d[rng.random(n) < 0.02] = np.nan
+    return pd.DataFrame({
+        "Product": "Quasar",
+        "Subsystem": rng.choice(["Display", "Touch Panel", "Enclosure"], n),
+        "Component": rng.choice(["LCD", "Backlight", "Cover glass", "Controller"], n),
+        "Fault_Code": rng.integers(100, 999, n).astype(str),
+        "Fault_Type": rng.choice(["Functional", "Cosmetic", "Intermittent"], n),
+        "Description": d,
+    })
+
+
+def _rate(fn: Callable[[], list], n: int) -> float:
+    t0 = time.perf_counter()
+    fn()
+    sec = time.perf_counter() - t0
+    return n / sec if sec else float("inf")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--legacy-max", type=int, default=1_000_000,
+                    help="skip the iterrows reference above this many rows")
+    args = ap.parse_args()
+
+    print(f"{'rows':>9} {'step':24} {'legacy rows/s':>14} {'columnar rows/s':>16} {'speedup':>8}")
+    for n in args.sizes:
+        df = make_field_frame(n)
+        cases = [
+            ("df_to_normalized_rows",
+             lambda: legacy_df_to_normalized_rows(df, product="Quasar", subproduct="Display",
+                                                  source_type="field", file_name="fri.xlsx"),
+             lambda: df_to_normalized_rows(df, product="Quasar", subproduct="Display",
+                                           source_type="field", file_name="fri.xlsx")),
+            ("_fri_df_to_rows",
+             lambda: legacy_fri_df_to_rows(df, product="Quasar", subproduct="Display"),
+             lambda: df_to_field_issue_rows(df, product="Quasar", subproduct="Display")),
+        ]
+        for name, legacy, columnar in cases:
+            new = _rate(columnar, n)
+            old = _rate(legacy, n) if n <= args.legacy_max else float("nan")
+            speedup = new / old if old == old else float("nan")
+            print(f"{n:9d} {name:24} {old:14,.0f} {new:16,.0f} {speedup:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
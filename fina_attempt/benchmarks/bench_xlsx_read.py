@@ -0,0 +1,118 @@
+# benchmarks/bench_xlsx_read.py
+"""
+XLSX ingestion benchmark: pd.read_excel + df_to_normalized_rows /
+df_to_field_issue_rows (every cell of the sheet) vs the read-only,
+column-projected streaming reader.
+
+Each case runs in a fresh spawned process; ΔRSS is the peak growth after
+imports. The synthetic workbook mimics a field-issue export with extra wide
+columns the pipeline never reads.
+
+Run from fina_attempt/:
+    python -m benchmarks.bench_xlsx_read
+    python -m benchmarks.bench_xlsx_read --rows 100000 --extra-cols 20
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import multiprocessing as mp
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.bench_tabular_rows import make_field_frame
+
+TEXT_COLS = ("description",)
+
+
+def _pandas_rows(path: str) -> list:
+    from server.utils.excel_parser import df_to_normalized_rows, parse_excel_or_csv
+    return df_to_normalized_rows(parse_excel_or_csv(path), product="Quasar", subproduct="Display",
+                                 source_type="field", file_name=path, text_pref_cols=TEXT_COLS)
+
+
+def _stream_rows(path: str) -> list:
+    from server.utils.excel_parser import iter_xlsx_normalized_rows
+    return list(iter_xlsx_normalized_rows(path, product="Quasar", subproduct="Display",
+                                          source_type="field", text_pref_cols=TEXT_COLS))
+
+
+def _pandas_fri(path: str) -> list:
+    from server.utils.excel_parser import df_to_field_issue_rows, parse_excel_or_csv
+    return df_to_field_issue_rows(parse_excel_or_csv(path), product="Quasar", subproduct="Display")
+
+
+def _stream_fri(path: str) -> list:
+    from server.utils.excel_parser import iter_xlsx_field_issue_rows
+    return list(iter_xlsx_field_issue_rows(path, product="Quasar", subproduct="Display"))
+
+
+CASES = {
+    ("rows", "pandas"): _pandas_rows,
+    ("rows", "stream"): _stream_rows,
+    ("field", "pandas"): _pandas_fri,
+    ("field", "stream"): _stream_fri,
+}
+
+
+def _rss_kb() -> int:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _child(case, path: str, q) -> None:
+    # import cost is not part of the measurement
+    for mod in ("pandas", "server.utils.excel_parser"):
+        importlib.import_module(mod)
+    base = _rss_kb()
+    t0 = time.perf_counter()
+    n = len(CASES[case](path))
+    sec = time.perf_counter() - t0
+    q.put((n, sec, max(0, _rss_kb() - base) / 1024))
+
+
+def _write(path: str, rows: int, extra_cols: int, q) -> None:
+    df = make_field_frame(rows)
+    for i in range(extra_cols):
+        df[f"Notes_{i}"] = "free-form technician comment that the pipeline never reads"
+    df.to_excel(path, index=False, engine="xlsxwriter")
+    q.put(df.shape[1])
+
+
+def _run(target, *args):
+    # children are spawned from this (small) process: ru_maxrss survives fork+exec
+    ctx = mp.get_context("spawn")
+    q = ctx.Queue()
+    p = ctx.Process(target=target, args=(*args, q))
+    p.start()
+    out = q.get()
+    p.join()
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--extra-cols", type=int, default=10, help="unused wide columns added to the sheet")
+    args = ap.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        t0 = time.perf_counter()
+        ncols = _run(_write, path, args.rows, args.extra_cols)
+        print(f"workbook: {args.rows:,} rows x {ncols} cols, "
+              f"{os.path.getsize(path) / 1e6:.1f} MB (written in {time.perf_counter() - t0:.1f}s)")
+
+        print(f"{'output':7} {'reader':8} {'rows out':>10} {'seconds':>9} {'ΔRSS MB':>9}")
+        for case in CASES:
+            n, sec, rss = _run(_child, case, path)
+            print(f"{case[0]:7} {case[1]:8} {n:10,d} {sec:9.2f} {rss:9.0f}")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
 # server/agents/chunking_agent.py
 from __future__ import annotations
 
+import os
 import re
+from bisect import bisect_left
 from dataclasses import dataclass
-from typing import Dict, Any, List, Iterable, Optional
+from functools import partial
+from itertools import chain
+from typing import Dict, Any, List, Iterable, Iterator, Optional, Tuple
+
+from server.utils.parsers import run_parse_jobs
+from server.utils.tokens import token_offsets, tokens_in_span
 
 _SENT_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(])")
+# Numbered PRD section heading, e.g. "4.17.4.1.2 Palm Rejection"
+_SECTION_HEADING = re.compile(r"^\s*\d+(?:\.\d+)+\.?\s+\S")
+_MAX_HEADING_CHARS = 100
 
 @dataclass
 class ChunkingConfig:
@@ -16,6 +26,17 @@ class ChunkingConfig:
     sentence_aware: bool = True    # try to cut along sentence boundaries first
     normalize_ws: bool = True      # condense whitespace
     trim_quotes: bool = True       # strip matching leading/trailing quotes
+    # Token-budget mode (unit="tokens"): chunks hold at most max_tokens tokens, cut on
+    # sentence boundaries, and meta["tokens"] carries each chunk's token count
+    unit: str = os.getenv("DFMEA_CHUNK_UNIT", "chars")                      # chars | tokens
+    max_tokens: int = int(os.getenv("DFMEA_CHUNK_MAX_TOKENS", "256"))
+    overlap_tokens: int = int(os.getenv("DFMEA_CHUNK_OVERLAP_TOKENS", "40"))
+    # run(): >1 shards items across the shared process pool (same output as serial)
+    workers: int = int(os.getenv("DFMEA_CHUNK_WORKERS", "1"))
+    batch_items: int = int(os.getenv("DFMEA_CHUNK_BATCH_ITEMS", "2000"))   # items per shard
+    # PRD blocks: chunk each requirement (its ID block + follow-up blocks + the section
+    # headings right before it) as one text instead of block by block
+    group_requirements: bool = os.getenv("DFMEA_CHUNK_GROUP_REQUIREMENTS", "1") == "1"
 
 def _clean_text(text: str, cfg: ChunkingConfig) -> str:
     s = text or ""
@@ -30,95 +51,146 @@ def _clean_text(text: str, cfg: ChunkingConfig) -> str:
                 break
     return s
 
-def _split_sentences(text: str) -> List[str]:
-    # Simple sentence splitter (punctuation-based). Keeps things lightweight.
-    if not text:
-        return []
-    parts = _SENT_SPLIT.split(text)
-    # Merge micro-sentences (e.g., headings) with neighbors if needed
-    merged: List[str] = []
-    buf = ""
-    for p in parts:
-        p = p.strip()
-        if not p:
-            continue
-        if not buf:
-            buf = p
-        else:
-            # Attach very short “sentences” to buffer
-            if len(p) < 40 or len(buf) < 60:
-                buf = f"{buf} {p}"
-            else:
-                merged.append(buf)
-                buf = p
-    if buf:
-        merged.append(buf)
+def _sentence_spans(text: str) -> List[Tuple[int, int]]:
+    # Simple sentence splitter (punctuation-based) → (start, end) spans of cleaned text.
+    # Micro-sentences (e.g., headings) are merged with neighbors by extending the span.
+    merged: List[Tuple[int, int]] = []
+    ca = cb = -1  # span being merged into; ca < 0 → none yet
+    a = 0         # start of the next sentence
+    n = len(text)
+    for b, nxt in chain((m.span() for m in _SENT_SPLIT.finditer(text)), ((n, n),)):
+        if b > a:
+            if ca < 0:
+                ca = a
+            elif b - a >= 40 and cb - ca >= 60:
+                merged.append((ca, cb))
+                ca = a
+            cb = b
+        a = nxt
+    if ca >= 0:
+        merged.append((ca, cb))
     return merged
 
-def _windowed_chunks_by_chars(text: str, cfg: ChunkingConfig) -> List[str]:
-    # Hard windowing by characters, with overlap
-    if not text:
-        return []
-    chunks = []
-    start = 0
-    n = len(text)
+def _window_spans(text: str, a: int, b: int, cfg: ChunkingConfig) -> List[Tuple[int, int]]:
+    # Hard windowing of text[a:b] by characters, with overlap; stripped (start, end) offsets
+    spans: List[Tuple[int, int]] = []
     size = max(cfg.chunk_size, cfg.min_chunk_size)
     ov = max(0, min(cfg.chunk_overlap, size - 1))
-    while start < n:
-        end = min(n, start + size)
-        chunk = text[start:end]
-        chunk = chunk.strip()
-        if chunk:
-            chunks.append(chunk)
-        if end == n:
+    start = a
+    while start < b:
+        end = min(b, start + size)
+        s, e = start, end
+        while s < e and text[s].isspace():
+            s += 1
+        while e > s and text[e - 1].isspace():
+            e -= 1
+        if e > s:
+            spans.append((s, e))
+        if end == b:
             break
         start = max(end - ov, start + 1)
-    return chunks
+    return spans
+
+def _windowed_chunks_by_chars(text: str, cfg: ChunkingConfig) -> List[str]:
+    return [text[s:e] for s, e in _window_spans(text, 0, len(text or ""), cfg)]
 
 def _sentence_aware_chunks(text: str, cfg: ChunkingConfig) -> List[str]:
-    sentences = _split_sentences(text)
-    if not sentences:
+    # Works on (start, end) offsets into `text`; substrings are only made for emitted
+    # chunks, so cost is linear in len(text) (plus overlap) whatever the sentence mix.
+    spans = _sentence_spans(text)
+    if not spans:
         return []
 
-    chunks: List[str] = []
-    cur = ""
-    for s in sentences:
+    base: List[Tuple[int, int]] = []
+    ca = cb = -1  # current chunk span; ca < 0 → empty
+    for a, b in spans:
+        cur_len = cb - ca if ca >= 0 else 0
         # If adding this sentence keeps us under or near the target, add it
-        if len(cur) + 1 + len(s) <= cfg.chunk_size:
-            cur = s if not cur else f"{cur} {s}"
-        else:
+        if cur_len + 1 + (b - a) <= cfg.chunk_size:
+            if ca < 0:
+                ca = a
+            cb = b
+        elif ca >= 0:
             # If current is too small, try to squeeze more; else flush
-            if cur:
-                if len(cur) < cfg.min_chunk_size and len(s) < cfg.chunk_size:
-                    cur = f"{cur} {s}"
-                else:
-                    chunks.append(cur.strip())
-                    cur = s
+            if cur_len < cfg.min_chunk_size and b - a < cfg.chunk_size:
+                cb = b
             else:
-                # Very long single sentence → hard split by chars
-                chunks.extend(_windowed_chunks_by_chars(s, cfg))
-                cur = ""
-    if cur:
-        chunks.append(cur.strip())
-
-    # Add overlap by duplicating trailing/leading tails
-    if cfg.chunk_overlap > 0 and len(chunks) > 1:
-        ov = cfg.chunk_overlap
-        with_overlap: List[str] = []
-        for i, ch in enumerate(chunks):
-            if i == 0:
-                with_overlap.append(ch)
-                continue
-            prev = with_overlap[-1]
-            tail = prev[-ov:] if len(prev) > ov else prev
-            # Only add overlap if it’s not already present at the start
-            if not ch.startswith(tail):
-                ch = (tail + " " + ch).strip()
-            with_overlap.append(ch)
-        chunks = with_overlap
+                base.append((ca, cb))
+                ca, cb = a, b
+        else:
+            # Very long single sentence → hard split by chars
+            base.extend(_window_spans(text, a, b, cfg))
+    if ca >= 0:
+        base.append((ca, cb))
+
+    ov = cfg.chunk_overlap
+    if ov <= 0 or len(base) < 2:
+        return [text[a:b] for a, b in base]
 
+    # Overlap: prefix each chunk with the tail of the previous one (unless it already
+    # starts with it); when tail + " " + chunk is a slice of `text`, emit the slice
+    chunks = [text[base[0][0]:base[0][1]]]
+    for a, b in base[1:]:
+        prev = chunks[-1]
+        tail = prev[-ov:] if len(prev) > ov else prev
+        if text.startswith(tail, a, b):
+            chunks.append(text[a:b])
+            continue
+        t0 = a - 1 - len(tail)
+        if t0 >= 0 and text[a - 1] == " " and text.startswith(tail, t0, a - 1):
+            chunks.append(text[t0:b].strip())
+        else:
+            chunks.append((tail + " " + text[a:b]).strip())
     return chunks
 
+def _token_budget_chunks(text: str, cfg: ChunkingConfig) -> List[Tuple[str, int]]:
+    # Encode once; cut at sentence ends (in token space) so no chunk exceeds max_tokens
+    offsets = token_offsets(text)
+    n = len(offsets)
+    if not n:
+        return []
+    budget = max(1, cfg.max_tokens)
+    ov = max(0, min(cfg.overlap_tokens, budget - 1))
+
+    cuts = [n]
+    if cfg.sentence_aware:
+        # a token belongs to the sentence it starts in
+        cuts = sorted({bisect_left(offsets, end) for _, end in _sentence_spans(text)} | {n})
+
+    ranges: List[Tuple[int, int]] = []
+    start = end = 0
+    for cut in cuts:
+        if cut <= end:
+            continue
+        if cut - start > budget and end > start:
+            ranges.append((start, end))
+            start = end
+        while cut - start > budget:
+            # single sentence over budget → hard split by tokens (never inside a character)
+            step = start + budget
+            while step > start + 1 and offsets[step] == offsets[step - 1]:
+                step -= 1
+            ranges.append((start, step))
+            start = step
+        end = cut
+    if end > start:
+        ranges.append((start, end))
+
+    out: List[Tuple[str, int]] = []
+    for i, (a, b) in enumerate(ranges):
+        if i:
+            a = max(0, a - ov, b - budget)
+            while 0 < a < b and offsets[a] == offsets[a - 1]:
+                a += 1
+        lo = offsets[a]
+        hi = offsets[b] if b < n else len(text)
+        chunk = text[lo:hi]
+        lo += len(chunk) - len(chunk.lstrip())
+        hi -= len(chunk) - len(chunk.rstrip())
+        if hi > lo:
+            out.append((text[lo:hi], tokens_in_span(offsets, lo, hi)))
+    return out
+
 class ChunkingAgent:
     """
     Splits normalized items into overlapping text chunks while preserving metadata.
@@ -143,25 +215,65 @@ class ChunkingAgent:
             "file": "...",
             "idx": <origin idx>,
             "chunk_id": <sequential int per input row>,
+            "tokens": <token count>,      # only with ChunkingConfig.unit == "tokens"
+            "requirement_id": "...",      # PRD requirement groups only
+            "idx_last": <last idx>,       # when a group spans several rows
           }
         }
+
+    With group_requirements, consecutive PRD rows of one file that follow a row tagged
+    with `requirement_id` are chunked together with it (plus any numbered headings just
+    before it), so a requirement is not scattered over tiny chunks or mixed with its
+    neighbours. Groups larger than the size budget are split by the normal strategy.
     """
 
     def __init__(self, config: Optional[ChunkingConfig] = None):
         self.cfg = config or ChunkingConfig()
 
     def run(self, items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        workers = max(1, self.cfg.workers)
+        if workers == 1:
+            return list(self.iter_chunks(items))
+        items = list(items)
+        if len(items) <= self.cfg.batch_items:
+            return list(self.iter_chunks(items))
+
+        # chunk_id restarts per item (or requirement group), so shards are independent;
+        # few large shards keep pickling overhead low, and results come back in order
+        size = min(max(1, self.cfg.batch_items), -(-len(items) // workers))
+        bounds = [0]
+        while bounds[-1] < len(items):
+            end = min(len(items), bounds[-1] + size)
+            while self.cfg.group_requirements and end < len(items) and not _starts_group(items[end - 1], items[end]):
+                end += 1
+            bounds.append(end)
+        jobs = [partial(_chunk_batch, items[a:b], self.cfg) for a, b in zip(bounds, bounds[1:])]
         out: List[Dict[str, Any]] = []
+        # own pool: its size (DFMEA_CHUNK_WORKERS) is independent of the parse pool's
+        for chunks, err in run_parse_jobs(jobs, workers=workers, pool_name="chunk"):
+            if err is not None:
+                raise err
+            out.extend(chunks)
+        return out
+
+    def iter_chunks(self, items: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Generator version of run(): chunks are produced item by item as `items` is consumed."""
+        if self.cfg.group_requirements:
+            # tokens mode: ~4 chars/token is close enough, the chunker enforces the exact budget
+            budget = self.cfg.chunk_size if self.cfg.unit != "tokens" else self.cfg.max_tokens * 4
+            items = _requirement_groups(items, budget)
         for it in items:
             text = _clean_text(it.get("text", ""), self.cfg)
             if not text:
                 continue
 
             # Choose strategy
-            if self.cfg.sentence_aware:
-                chunks = _sentence_aware_chunks(text, self.cfg)
+            if self.cfg.unit == "tokens":
+                chunks = _token_budget_chunks(text, self.cfg)
+            elif self.cfg.sentence_aware:
+                chunks = [(ch, None) for ch in _sentence_aware_chunks(text, self.cfg)]
             else:
-                chunks = _windowed_chunks_by_chars(text, self.cfg)
+                chunks = [(ch, None) for ch in _windowed_chunks_by_chars(text, self.cfg)]
 
             if not chunks:
                 continue
@@ -175,14 +287,104 @@ class ChunkingAgent:
                 "file": it.get("file", ""),
                 "idx": int(it.get("idx", 0)),
             }
-            for ch in chunks:
-                out.append({
+            if it.get("requirement_id"):
+                base_meta["requirement_id"] = it["requirement_id"]
+            if "idx_last" in it:
+                base_meta["idx_last"] = int(it["idx_last"])
+            for ch, n_tokens in chunks:
+                meta = {**base_meta, "chunk_id": seq}
+                if n_tokens is not None:
+                    meta["tokens"] = n_tokens
+                yield {
                     "chunk": ch,
-                    "meta": {**base_meta, "chunk_id": seq},
-                })
+                    "meta": meta,
+                }
                 seq += 1
 
-        return out
+def _is_prd(it: Dict[str, Any]) -> bool:
+    return (it.get("source_type") or "").lower() == "prd"
+
+def _is_heading(it: Dict[str, Any]) -> bool:
+    text = it.get("text") or ""
+    return not it.get("requirement_id") and len(text) <= _MAX_HEADING_CHARS and bool(_SECTION_HEADING.match(text))
+
+def _starts_group(prev: Dict[str, Any], cur: Dict[str, Any]) -> bool:
+    # True when _requirement_groups never merges `cur` into what came before it
+    if not _is_prd(cur) or not _is_prd(prev) or prev.get("file") != cur.get("file"):
+        return True
+    if cur.get("requirement_id") or _is_heading(cur):
+        return not _is_heading(prev)  # headings wait for the next requirement
+    return False
+
+def _requirement_groups(items: Iterable[Dict[str, Any]], budget: int) -> Iterator[Dict[str, Any]]:
+    """
+    Merge PRD rows into requirement groups: a row with `requirement_id` opens a group
+    (taking the numbered headings directly before it as a prefix); following rows of the
+    same file without an ID or heading join it while the group stays within `budget`
+    characters, after which a continuation group with the same ID is started. Other
+    rows pass through unchanged.
+    """
+    group: List[Dict[str, Any]] = []     # open requirement group
+    headings: List[Dict[str, Any]] = []  # headings waiting for the next requirement
+    size = 0                             # characters in `group` (joined with spaces)
+
+    def merged(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if len(rows) == 1:
+            return rows[0]
+        rid = next((r["requirement_id"] for r in rows if r.get("requirement_id")), None)
+        return {
+            **rows[0],
+            "text": " ".join((r.get("text") or "").strip() for r in rows),
+            "requirement_id": rid,
+            "idx_last": rows[-1].get("idx", 0),
+        }
+
+    def flush() -> Iterator[Dict[str, Any]]:
+        if group:
+            yield merged(group)
+            group.clear()
+        yield from headings
+        headings.clear()
+
+    for it in items:
+        same_file = (group or headings) and (group or headings)[-1].get("file") == it.get("file")
+        if not _is_prd(it) or not same_file:
+            yield from flush()
+            if not _is_prd(it):
+                yield it
+                continue
+        n = len((it.get("text") or "").strip())
+        if it.get("requirement_id"):
+            if group:
+                yield merged(group)
+                group.clear()
+            group.extend(headings)
+            headings.clear()
+            group.append(it)
+            size = sum(len((r.get("text") or "").strip()) + 1 for r in group)
+        elif _is_heading(it):
+            if group:
+                yield merged(group)
+                group.clear()
+            headings.append(it)
+        elif group:
+            if size + n > budget:
+                # continuation of the same requirement
+                rid = next(r["requirement_id"] for r in group if r.get("requirement_id"))
+                yield merged(group)
+                group.clear()
+                it = {**it, "requirement_id": rid}
+                size = 0
+            group.append(it)
+            size += n + 1
+        else:
+            yield from flush()
+            yield it
+    yield from flush()
+
+def _chunk_batch(items: List[Dict[str, Any]], cfg: ChunkingConfig) -> List[Dict[str, Any]]:
+    # module-level so it pickles into pool workers
+    return list(ChunkingAgent(cfg).iter_chunks(items))
 
 # Quick manual test
 if __name__ == "__main__":
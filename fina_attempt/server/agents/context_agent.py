@@ -4,11 +4,14 @@ import json
 import re
 from typing import List, Dict, Any, Optional
 
-from server.agents.vectorstore_agent import VectorStoreAgent
+from server.agents.vectorstore_agent import VectorStoreAgent, collection_generation
 from server.utils.azure_openai_client import (
     get_azure_openai_client,
     AZURE_CHAT_DEPLOYMENT,
 )
+from server.utils.query_cache import QueryCacheConfig, QueryCacheStats, make_caches, normalize_query
+
+_MISS = object()
 
 SAFE_SYSTEM_MSG = (
     "You are a DFMEA analyst.\n"
@@ -27,6 +30,11 @@ class ContextAgent:
     - Applies a score threshold
     - Calls LLM only when evidence is strong
     - Output shape matches previous implementation exactly (list of dicts with 'citations')
+    - Field-issue rows repeat the same (product, subsystem, component, fault) combination
+      many times: query embeddings and hit lists are kept in LRU caches
+      (DFMEA_QUERY_CACHE*). Hit lists are keyed by normalized query, filters, top_k and
+      score_threshold, and dropped when the collection's write generation changes (any
+      upsert/delete in this process). `cache_stats` counts one generate() call.
     """
 
     def __init__(
@@ -39,6 +47,8 @@ class ContextAgent:
         top_k: int = 12,
         score_threshold: float = 0.48,
         min_hits: int = 2,
+        embedder: Optional[Any] = None,     # EmbeddingAgent of the collection (queries must match its points)
+        cache: Optional[QueryCacheConfig] = None,
     ):
         self.collection_name = collection_name
         self.vectorstore = VectorStoreAgent(collection_name=self.collection_name)
@@ -55,6 +65,11 @@ class ContextAgent:
         self.chat_deploy = AZURE_CHAT_DEPLOYMENT or "gpt-4o"
         self.system_msg = SAFE_SYSTEM_MSG
 
+        self.embedder = embedder
+        self._vectors, self._results = make_caches(cache)
+        self._generation = collection_generation(self.collection_name)
+        self.cache_stats = QueryCacheStats()
+
     # ---------- Primary API (kept) ----------
     def generate(self, field_issues: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -66,6 +81,7 @@ class ContextAgent:
         """
         all_entries: List[Dict[str, Any]] = []
         next_id = 1
+        self.cache_stats = QueryCacheStats()
 
         for row in field_issues or []:
             norm = self._normalize_row(row)
@@ -73,15 +89,8 @@ class ContextAgent:
             # 1) compact query string
             query = self._build_query(norm)
 
-            # 2) strict retrieval (filters + score threshold)
-            hits = self.vectorstore.search(
-                query=query,
-                top_k=self.top_k,
-                product=norm["product"],
-                subsystem=norm["subsystem"],
-                components=[norm["component"]],
-                score_threshold=self.score_threshold,
-            )
+            # 2) strict retrieval (filters + score threshold), cached
+            hits = self._retrieve(query, norm)
             if not hits or len(hits) < self.min_hits:
                 # not enough evidence → abstain on this row
                 continue
@@ -118,6 +127,49 @@ class ContextAgent:
         """
         return []
 
+    # ---------- Retrieval ----------
+    def _retrieve(self, query: str, norm: Dict[str, Any]) -> List[Dict[str, Any]]:
+        gen = collection_generation(self.collection_name)
+        if gen != self._generation:
+            if self._results.clear():
+                self.cache_stats.invalidations += 1
+            self._generation = gen
+
+        key = (
+            normalize_query(query),
+            norm["product"], norm["subsystem"], (norm["component"],),
+            self.top_k, self.score_threshold,
+        )
+        hits = self._results.get(key, _MISS)
+        if hits is not _MISS:
+            self.cache_stats.result_hits += 1
+            return hits
+        self.cache_stats.result_misses += 1
+
+        hits = self.vectorstore.search(
+            query_vector=self._query_vector(key[0]),
+            top_k=self.top_k,
+            product=norm["product"],
+            subsystem=norm["subsystem"],
+            components=[norm["component"]],
+            score_threshold=self.score_threshold,
+        )
+        self._results.put(key, hits)
+        return hits
+
+    def _query_vector(self, text: str):
+        vec = self._vectors.get(text)
+        if vec is not None:
+            self.cache_stats.vector_hits += 1
+            return vec
+        self.cache_stats.vector_misses += 1
+        if self.embedder is None:
+            from server.agents.embedding_agent import EmbeddingAgent
+            self.embedder = EmbeddingAgent(collection=self.collection_name)
+        vec = self.embedder.embed_query(text)
+        self._vectors.put(text, vec)
+        return vec
+
     # ---------- Helpers ----------
     def _chat(self, system_msg: str, user_msg: str) -> str:
         resp = self.client.chat.completions.create(
@@ -0,0 +1,164 @@
+# server/agents/dedup_agent.py
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import mmh3
+import numpy as np
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_DIGITS = re.compile(r"\d+")
+
+# Universal hashing ((a*x + b) mod p) over 32-bit shingle hashes; a*x + b stays < 2**64
+_PRIME = np.uint64(4294967311)
+
+# -------------------------
+# Config
+# -------------------------
+@dataclass
+class DedupConfig:
+    enabled: bool = os.getenv("DFMEA_DEDUP", "1") == "1"
+    threshold: float = float(os.getenv("DFMEA_DEDUP_THRESHOLD", "0.9"))  # min estimated Jaccard to fold
+    num_perm: int = 128            # MinHash signature length (bands * rows)
+    bands: int = 32                # LSH bands; rows per band = num_perm // bands
+    shingle_words: int = 3         # word n-gram size
+    # Sources where digit runs are masked, so rows differing only by part number or date
+    # fold together (not PRDs, where "500 nits" vs "700 nits" are different requirements)
+    mask_digits_in: Tuple[str, ...] = ("kb", "field")
+    max_aliases: int = 50          # provenance entries stored per representative (dup_count stays exact)
+    seed: int = 1
+
+# -------------------------
+# Agent
+# -------------------------
+class DedupAgent:
+    """
+    Folds exact and near-duplicate chunks before embedding.
+
+    Input/Output: ChunkingAgent items ({"chunk": str, "meta": {...}}), order preserved.
+    Within one (product, subproduct, source_type) the first chunk of a cluster is kept;
+    later copies are dropped and recorded on the kept chunk:
+
+        meta["aliases"]   = [{"file": ..., "idx": ..., "chunk_id": ...}, ...]
+        meta["dup_count"] = <number of folded chunks>
+
+    1) exact: same text after lowercasing / whitespace collapse (blake2b key)
+    2) near:  MinHash over word shingles (mmh3), LSH banding for candidates, then the
+              signature-estimated Jaccard must reach `threshold`. Candidates are only
+              compared with kept chunks, so clusters never chain A~B~C.
+    """
+
+    def __init__(self, config: Optional[DedupConfig] = None):
+        self.cfg = config or DedupConfig()
+        rows = max(1, self.cfg.num_perm // max(1, self.cfg.bands))
+        self._bands = max(1, self.cfg.num_perm // rows)
+        self._rows = rows
+        n = self._bands * rows
+        rng = np.random.default_rng(self.cfg.seed)
+        self._a = rng.integers(1, 2**32, size=n, dtype=np.uint64)
+        self._b = rng.integers(0, 2**32, size=n, dtype=np.uint64)
+
+    def run(self, chunks: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        chunks = list(chunks)
+        if not self.cfg.enabled:
+            return chunks
+        kept, exact, near = self._fold(chunks)
+        print(
+            f"[DedupAgent] {len(chunks)} chunk(s) -> {len(kept)} kept; "
+            f"folded {exact} exact and {near} near-duplicate(s)."
+        )
+        return kept
+
+    def iter_dedup(self, chunks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming twin of run(): dedups each source file's consecutive chunks as a group
+        (aliases must be complete before a chunk is emitted), so memory is bounded by
+        the largest file rather than the corpus. Cross-file duplicates are not folded.
+        """
+        group: List[Dict[str, Any]] = []
+        key = None
+        for ch in chunks:
+            meta = ch.get("meta") or {}
+            k = (meta.get("source_type"), meta.get("file"))
+            if group and k != key:
+                yield from self._fold(group)[0] if self.cfg.enabled else group
+                group = []
+            key = k
+            group.append(ch)
+        if group:
+            yield from self._fold(group)[0] if self.cfg.enabled else group
+
+    # ---------- internals ----------
+
+    def _fold(self, chunks: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int, int]:
+        kept: List[Dict[str, Any]] = []
+        exact_seen: Dict[Tuple, int] = {}                 # (scope, text key) -> index in kept
+        buckets: Dict[Tuple, List[int]] = {}              # (scope, band, band bytes) -> kept indexes
+        sigs: Dict[int, np.ndarray] = {}                  # kept index -> signature
+        n_exact = n_near = 0
+
+        for ch in chunks:
+            text = ch.get("chunk") or ""
+            meta = ch.get("meta") or {}
+            scope = (meta.get("product"), meta.get("subproduct"), meta.get("source_type"))
+
+            norm = " ".join(text.lower().split())
+            ekey = (scope, hashlib.blake2b(norm.encode("utf-8"), digest_size=16).digest())
+            rep = exact_seen.get(ekey)
+            if rep is not None:
+                self._alias(kept[rep], meta)
+                n_exact += 1
+                continue
+
+            sig = self._signature(norm, mask_digits=scope[2] in self.cfg.mask_digits_in)
+            bands = [
+                (scope, i, sig[i * self._rows:(i + 1) * self._rows].tobytes())
+                for i in range(self._bands)
+            ]
+            rep = self._best_match(sig, bands, buckets, sigs)
+            if rep is not None:
+                self._alias(kept[rep], meta)
+                n_near += 1
+                continue
+
+            idx = len(kept)
+            kept.append({**ch, "meta": dict(meta)})
+            exact_seen[ekey] = idx
+            sigs[idx] = sig
+            for b in bands:
+                buckets.setdefault(b, []).append(idx)
+
+        return kept, n_exact, n_near
+
+    def _best_match(self, sig, bands, buckets, sigs) -> Optional[int]:
+        cands = set()
+        for b in bands:
+            cands.update(buckets.get(b, ()))
+        best, best_sim = None, self.cfg.threshold
+        for idx in sorted(cands):
+            sim = float(np.count_nonzero(sigs[idx] == sig)) / sig.size
+            if sim >= best_sim and (best is None or sim > best_sim):
+                best, best_sim = idx, sim
+        return best
+
+    def _signature(self, norm: str, *, mask_digits: bool) -> np.ndarray:
+        words = _WORD.findall(_DIGITS.sub("0", norm) if mask_digits else norm)
+        k = self.cfg.shingle_words
+        if len(words) <= k:
+            shingles = {" ".join(words)}
+        else:
+            shingles = {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+        x = np.fromiter((mmh3.hash(s, signed=False) for s in shingles), dtype=np.uint64, count=len(shingles))
+        # (perms x shingles) -> min per permutation
+        return ((np.outer(self._a, x) + self._b[:, None]) % _PRIME).min(axis=1)
+
+    def _alias(self, rep: Dict[str, Any], meta: Dict[str, Any]) -> None:
+        m = rep["meta"]
+        m["dup_count"] = int(m.get("dup_count", 0)) + 1
+        aliases = m.setdefault("aliases", [])
+        if len(aliases) < self.cfg.max_aliases:
+            aliases.append({"file": meta.get("file", ""), "idx": meta.get("idx", 0), "chunk_id": meta.get("chunk_id", 0)})
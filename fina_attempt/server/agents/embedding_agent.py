@@ -3,23 +3,27 @@ from __future__ import annotations
 
 import os
 import time
-from typing import List, Dict, Any, Tuple
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Deque, Iterable, Iterator, List, Dict, Any, Optional, Tuple, Union
+
+import numpy as np
 
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from openai import RateLimitError, APIConnectionError, InternalServerError
 
-# Optional tokenizer for token accounting
-try:
-    from tiktoken import get_encoding
-    _tok = get_encoding("cl100k_base")
-except Exception:  # pragma: no cover
-    _tok = None
+from server.agents.embedding_backends import EmbeddingBackend, backend_name_for, make_backend
+from server.utils.embedding_batch import EmbeddingBatch
+from server.utils.dim_reduction import DimReduction
+from server.utils.embedding_cache import EmbeddingCacheStats, get_embedding_cache
+from server.utils.rate_limit import AdaptiveRateLimiter, parse_retry_after
+from server.utils.tokens import count_tokens as _count_tokens, split_tokens, truncate_tokens
 
-# Your Azure client helper (must exist in your repo)
-from server.utils.azure_openai_client import (
-    get_azure_openai_client,
-    AZURE_EMBEDDING_DEPLOYMENT,
-)
+# Records per bulk embedding-cache lookup
+_LOOKUP_BLOCK = 256
+# Bounds a batch made (almost) entirely of cache hits, which costs no inputs or tokens
+_MAX_BATCH_RECORDS = 8192
 
 def _as_text_and_meta(item: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
     """
@@ -48,21 +52,18 @@ def _should_embed(meta: Dict[str, Any]) -> bool:
     src = (meta.get("source_type") or meta.get("source") or "").lower()
     return src != "field"  # default: embed kb/prd, skip field
 
-def _count_tokens(text: str) -> int:
-    if not _tok:
-        # rough fallback ~4 chars/token
-        return max(1, len(text or "") // 4)
-    return len(_tok.encode(text or ""))
-
 class EmbeddingAgent:
     """
-    Azure OpenAI embeddings with batching, retries, and cooldowns.
+    Embeddings with batching, retries, and cooldowns. Vectors come from a pluggable
+    EmbeddingBackend (Azure OpenAI by default; a local ONNX / sentence-transformers
+    model with DFMEA_EMBED_BACKEND or per collection with DFMEA_EMBED_BACKENDS).
 
     INPUT (either shape works):
       - {"chunk": "<text>", "meta": {...}}                      # from our chunker
       - {"text": "<text>", "metadata": {...}}                   # from your prior code
 
-    OUTPUT:
+    OUTPUT: an EmbeddingBatch (float32 N x D vectors + columnar metadata). Each row
+    still reads like the old record dict:
       {
         "text": "<original text>",
         "embedding": [float,...],
@@ -75,19 +76,80 @@ class EmbeddingAgent:
       - Only items with metadata.embed == True are embedded.
       - If 'embed' missing, we infer True for non-field sources.
       - Skips empty/whitespace-only texts.
+      - Requests are packed in order up to EMBED_BATCH_SIZE inputs and
+        EMBED_MAX_BATCH_TOKENS tokens. An input over EMBED_MAX_INPUT_TOKENS is truncated,
+        or with EMBED_OVERSIZE=split embedded in pieces and averaged, so it never
+        fails its batch.
+      - A batch that still fails after retries is dropped from the output and, when
+        `dead_letter` is set, recorded there for a later replay.
+      - Vectors are cached on disk by (backend model, dimensions, text hash) across
+        collections and subproducts (DFMEA_EMBED_CACHE*); only misses are sent.
+      - Local backends skip the request limits, limiter and cooldown; they truncate
+        to their model's max length and batch by sequence length themselves.
+      - EMBED_DIMENSIONS stores smaller vectors: requested from the API
+        (text-embedding-3 `dimensions`) or reduced locally by Matryoshka truncation or
+        a fitted PCA (EMBED_DIM_METHOD, see DimReduction). profile() describes the
+        result and is recorded with the collection.
+      - EMBED_CONCURRENCY > 1 keeps several batches in flight, paced by EMBED_RPM /
+        EMBED_TPM token buckets, Retry-After on 429s and an AIMD in-flight window
+        instead of the fixed cooldown. Output order always follows input order.
     """
 
-    def __init__(self):
-        self.client = get_azure_openai_client()
-        self.deployment = AZURE_EMBEDDING_DEPLOYMENT
-        if not self.deployment:
-            raise RuntimeError("AZURE_OPENAI_EMBEDDING_DEPLOYMENT is not set.")
+    def __init__(
+        self,
+        backend: Union[str, EmbeddingBackend, None] = None,
+        *,
+        collection: Optional[str] = None,
+        reduction: Optional[DimReduction] = None,
+    ):
+        # backend instance, name ("azure" | "onnx" | "sentence-transformers"), or the
+        # one configured for `collection`
+        if not isinstance(backend, EmbeddingBackend):
+            backend = make_backend(backend or backend_name_for(collection))
+        self.backend = backend
+        self.deployment = backend.name  # model key for the embedding cache
 
-        # tune via env if needed
-        self.batch_size = int(os.getenv("EMBED_BATCH_SIZE", "50"))
+        # tune via env if needed; request limits default to the Azure OpenAI embeddings API
+        self.batch_size = int(os.getenv("EMBED_BATCH_SIZE", "2048"))               # max inputs per request
+        self.max_batch_tokens = int(os.getenv("EMBED_MAX_BATCH_TOKENS", "300000"))  # max tokens per request
+        self.max_input_tokens = int(os.getenv("EMBED_MAX_INPUT_TOKENS", "8191"))   # max tokens per input
+        self.oversize = os.getenv("EMBED_OVERSIZE", "truncate").lower()           # truncate | split
         self.cooldown = float(os.getenv("EMBED_BATCH_COOLDOWN_SEC", "2"))
+        if not backend.remote:
+            self.max_input_tokens = 1 << 30  # the backend's tokenizer truncates
+            self.cooldown = 0.0
+        self.reduction = reduction or DimReduction.from_config(remote=backend.remote)
+        if self.reduction.method == "api":
+            if not backend.remote:
+                raise ValueError(f"Backend {backend.name!r} cannot return reduced dimensions; use truncate or pca.")
+            backend.dimensions = self.reduction.dims
+        # size requested from the backend, 0 = the model's native size (part of the cache key)
+        self.dimensions = self.reduction.request_dims
+
+        self.cache = get_embedding_cache()
+        # cache_stats: the last run/iter_embed call; cache_totals: summed over calls until
+        # the caller resets it (DFMEAPipeline does per index()/replay())
+        self.cache_stats = EmbeddingCacheStats()
+        self.cache_totals = EmbeddingCacheStats()
+        # where batches that fail after retries go (anything with append(records, error),
+        # e.g. DeadLetterLog); None = they are only logged
+        self.dead_letter = None
+
+        # concurrent mode (0 = no RPM/TPM limit; 429s still pause and shrink the window)
+        self.concurrency = int(os.getenv("EMBED_CONCURRENCY", "1"))
+        self.max_attempts = int(os.getenv("EMBED_MAX_ATTEMPTS", "6"))
+        self.limiter = None
+        if self.concurrency > 1 and backend.remote:
+            self.limiter = AdaptiveRateLimiter(
+                rpm=float(os.getenv("EMBED_RPM", "0")),
+                tpm=float(os.getenv("EMBED_TPM", "0")),
+                max_concurrency=self.concurrency,
+            )
+            # let every 429 reach the limiter instead of the SDK's own sleep-and-retry
+            if hasattr(backend, "without_sdk_retries"):
+                backend.without_sdk_retries()
 
-    def run(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def run(self, items: List[Dict[str, Any]]) -> EmbeddingBatch:
         """
         Convenience wrapper that mirrors our earlier agent signature:
         takes chunked items and returns embedded records.
@@ -101,11 +163,11 @@ class EmbeddingAgent:
 
         return self.embed_chunks_sync(normalized)
 
-    def embed_chunks_sync(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def embed_chunks_sync(self, chunks: List[Dict[str, Any]]) -> EmbeddingBatch:
         """
-        Batches calls to Azure OpenAI embeddings API.
+        Batches calls to the embedding backend.
 
-        Returns: list of
+        Returns: one EmbeddingBatch, rows in input order
           { "text", "embedding", "vector", "metadata", "tokens" }
         """
         to_embed = []
@@ -120,44 +182,199 @@ class EmbeddingAgent:
         skipped = (len(chunks) if chunks else 0) - len(to_embed)
         print(f"[EmbeddingAgent] Preparing to embed {len(to_embed)} chunk(s); skipped {skipped} non-embeddable/empty item(s).")
 
-        embedded: List[Dict[str, Any]] = []
         if not to_embed:
+            embedded = EmbeddingBatch.empty()
             self._log_token_usage(embedded)
             return embedded
 
-        for i in range(0, len(to_embed), self.batch_size):
-            batch = to_embed[i : i + self.batch_size]
-            texts = [b["text"] for b in batch]
-            metas = [b["metadata"] for b in batch]
-
-            # Guard again against unexpected empties
-            keep = [(t, m) for (t, m) in zip(texts, metas) if isinstance(t, str) and t.strip()]
-            if not keep:
-                continue
-            texts, metas = zip(*keep)
-
-            try:
-                resp = self._embed_with_retry(list(texts))
-                # Azure/OpenAI returns embeddings in resp.data[j].embedding
-                for j, item in enumerate(resp.data):
-                    text = texts[j]
-                    meta = metas[j]
-                    vec = item.embedding
-                    embedded.append({
-                        "text": text,
-                        "embedding": vec,
-                        "vector": vec,         # alias
-                        "metadata": meta,
-                        "tokens": _count_tokens(text),
-                    })
-            except Exception as e:
-                print(f"[EmbeddingAgent] Batch {i//self.batch_size+1} failed after retries: {type(e).__name__}: {e}")
-
-            time.sleep(self.cooldown)
+        embedded = EmbeddingBatch.concat(self._run_batches(self._batches(to_embed)))
 
         self._log_token_usage(embedded)
         return embedded
 
+    def iter_embed(self, items: Iterable[Dict[str, Any]]) -> Iterator[EmbeddingBatch]:
+        """
+        Streaming twin of run(): consumes chunked items lazily and yields one
+        EmbeddingBatch per API batch, so callers can upsert while later batches are
+        still being embedded. Same filtering, retries, pacing and usage summary.
+        """
+        usage = {"items": 0, "total": 0, "kb": 0, "field": 0}
+        skipped = 0
+        n = 0
+
+        def records():
+            nonlocal skipped
+            for it in items:
+                text, meta = _as_text_and_meta(it)
+                if not text.strip() or not _should_embed(meta):
+                    skipped += 1
+                    continue
+                yield {"text": text, "metadata": meta}
+
+        for out in self._run_batches(self._batches(records())):
+            n += 1
+            for k, v in zip(("items", "total", "kb", "field"), _token_usage(out)):
+                usage[k] += v
+            if len(out):
+                yield out
+
+        print(f"[EmbeddingAgent] Streamed {n} batch(es); skipped {skipped} non-embeddable/empty item(s).")
+        _print_token_usage(usage["items"], usage["total"], usage["kb"], usage["field"])
+
+    def _batches(self, records: Iterable[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Pack records into requests by token budget. Next-fit in input order: a request
+        is closed only when the next record would exceed the input or token limit, which
+        gives the fewest requests possible without reordering. Token counts come from
+        the chunker (meta["tokens"]) when present. Cache hits ride along at no cost; a
+        batch without misses makes no request.
+        """
+        self.cache_stats = EmbeddingCacheStats()
+        batch: List[Dict[str, Any]] = []
+        b_inputs = b_tokens = 0
+        n_req = n_rec = n_cut = 0
+        for rec in self._lookup(self._fit(r) for r in records):
+            n_rec += 1
+            if "cut" in rec:
+                n_cut += 1
+            k = len(rec["need"])
+            t = sum(rec["weights"][i] for i in rec["need"])
+            if batch and (
+                b_inputs + k > self.batch_size
+                or b_tokens + t > self.max_batch_tokens
+                or len(batch) >= _MAX_BATCH_RECORDS
+            ):
+                if b_inputs:
+                    n_req += 1
+                yield batch
+                batch, b_inputs, b_tokens = [], 0, 0
+            batch.append(rec)
+            b_inputs += k
+            b_tokens += t
+        if batch:
+            if b_inputs:
+                n_req += 1
+            yield batch
+        st = self.cache_stats
+        self.cache_totals.hits += st.hits
+        self.cache_totals.misses += st.misses
+        print(
+            f"[EmbeddingAgent] Packed {n_rec} input(s) into {n_req} request(s); "
+            f"embedding cache {st.hits} hit(s), {st.misses} miss(es)"
+            + (f"; {n_cut} oversize input(s) {'split' if self.oversize == 'split' else 'truncated'}." if n_cut else ".")
+        )
+
+    def _lookup(self, records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Fill cached vectors with one bulk query per block of records; "need" keeps the misses."""
+        it = iter(records)
+        while True:
+            block = list(islice(it, _LOOKUP_BLOCK))
+            if not block:
+                return
+            texts = [t for rec in block for t in rec["inputs"]]
+            found = self.cache.get_many(self.deployment, self.dimensions, texts, self.cache_stats)
+            pos = 0
+            for rec in block:
+                k = len(rec["inputs"])
+                rec["vectors"] = found[pos:pos + k]
+                rec["need"] = [i for i, v in enumerate(rec["vectors"]) if v is None]
+                pos += k
+                yield rec
+
+    def _fit(self, rec: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Adds "inputs" (texts to send), "weights" (tokens per input), "tokens" (their
+        sum), "vectors" (one slot per input) and "need" (inputs still to embed) to a
+        {"text","metadata"} record, keeping every input within max_input_tokens and the
+        whole record within one request.
+        """
+        text = rec["text"]
+        n = (rec.get("metadata") or {}).get("tokens") or _count_tokens(text)
+        if n <= self.max_input_tokens:
+            return {**rec, "inputs": [text], "weights": [n], "tokens": n, "vectors": [None], "need": [0]}
+        if self.oversize == "split":
+            fit = max(1, min(self.batch_size, self.max_batch_tokens // max(1, self.max_input_tokens)))
+            pieces = split_tokens(text, self.max_input_tokens)[:fit]
+        else:
+            pieces = [truncate_tokens(text, self.max_input_tokens)]
+        pieces = [p for p in pieces if p.strip()] or [text[: self.max_input_tokens]]
+        weights = [_count_tokens(p) for p in pieces]
+        return {
+            **rec, "inputs": pieces, "weights": weights, "tokens": sum(weights),
+            "vectors": [None] * len(pieces), "need": list(range(len(pieces))), "cut": self.oversize,
+        }
+
+    def _run_batches(self, batches: Iterable[List[Dict[str, Any]]]) -> Iterator[EmbeddingBatch]:
+        """
+        Embedded records per batch, in batch order. Sequential mode sleeps `cooldown`
+        between batches; concurrent mode keeps up to 2x`concurrency` batches submitted
+        (the limiter decides how many are actually in flight) and yields them in order.
+        """
+        if self.limiter is None:
+            for n, batch in enumerate(batches, 1):
+                yield self._embed_batch(batch, n)
+                if any(b.get("need") for b in batch):
+                    time.sleep(self.cooldown)
+            return
+
+        pending: Deque[Future] = deque()
+        todo = enumerate(batches, 1)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as pool:
+            while True:
+                while len(pending) < 2 * self.concurrency:
+                    nxt = next(todo, None)
+                    if nxt is None:
+                        break
+                    pending.append(pool.submit(self._embed_batch, nxt[1], nxt[0]))
+                if not pending:
+                    break
+                yield pending.popleft().result()
+        st = self.limiter.stats
+        print(
+            f"[EmbeddingAgent] Concurrent: {st.requests} request(s), {st.throttled} throttled, "
+            f"{st.waited_sec:.1f}s waiting on limits, window {self.limiter.limit}/{self.concurrency}."
+        )
+
+    def _embed_batch(self, batch: List[Dict[str, Any]], n: int) -> EmbeddingBatch:
+        """Embed one packed batch (see _batches); a batch that fails after retries is empty."""
+        # Guard again against unexpected empties
+        keep = [b if "inputs" in b else self._fit(b) for b in batch if isinstance(b.get("text"), str) and b["text"].strip()]
+        if not keep:
+            return EmbeddingBatch.empty()
+        sent = [(b, i) for b in keep for i in b["need"]]
+        inputs = [b["inputs"][i] for b, i in sent]
+
+        try:
+            if inputs:
+                vecs = self._send(inputs, sum(b["weights"][i] for b, i in sent))
+                for (b, i), v in zip(sent, vecs):
+                    b["vectors"][i] = v
+                self.cache.put_many(self.deployment, self.dimensions, inputs, vecs)
+            vectors = self.reduction.apply(np.asarray(
+                [b["vectors"][0] if len(b["vectors"]) == 1 else _combine(b["vectors"], b["weights"]) for b in keep],
+                dtype=np.float32,
+            ))
+        except Exception as e:
+            print(f"[EmbeddingAgent] Batch {n} failed after retries: {type(e).__name__}: {e}")
+            if self.dead_letter is not None:
+                self.dead_letter.append(keep, e)
+                print(f"[EmbeddingAgent] Batch {n}: {len(keep)} chunk(s) written to the dead-letter log.")
+            return EmbeddingBatch.empty()
+        return EmbeddingBatch(
+            vectors,
+            [b["text"] for b in keep],
+            [b["metadata"] for b in keep],
+            [b["tokens"] for b in keep],
+        )
+
+    def _send(self, inputs: List[str], tokens: int):
+        """One backend request: direct for local backends, retried (and limited) for remote ones."""
+        if not self.backend.remote:
+            return self.backend.embed(inputs)
+        if self.limiter is None:
+            return self._embed_with_retry(inputs)
+        return self._embed_limited(inputs, tokens)
+
     @retry(
         stop=stop_after_attempt(5),
         wait=wait_exponential(multiplier=2, min=4, max=60),
@@ -165,25 +382,92 @@ class EmbeddingAgent:
         reraise=True,
     )
     def _embed_with_retry(self, texts: List[str]):
-        return self.client.embeddings.create(input=texts, model=self.deployment)
-
-    def _log_token_usage(self, embedded: List[Dict[str, Any]]):
-        total_tokens = sum(item.get("tokens", 0) for item in embedded)
-        kb_tokens = sum(
-            item.get("tokens", 0)
-            for item in embedded
-            if ((item.get("metadata") or {}).get("source") == "knowledge_bank")
-            or ((item.get("metadata") or {}).get("source_type") == "kb")
-        )
-        field_tokens = sum(
-            item.get("tokens", 0)
-            for item in embedded
-            if ((item.get("metadata") or {}).get("source") == "field_reported_issues")
-            or ((item.get("metadata") or {}).get("source_type") == "field")
-        )
+        return self.backend.embed(texts)
+
+    def _embed_limited(self, texts: List[str], tokens: int):
+        """
+        One request under the shared limiter. A 429 pauses every worker for its
+        Retry-After (or a default backoff) and halves the in-flight window; connection
+        and 5xx errors back off exponentially. Raises after `max_attempts`.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            self.limiter.acquire(tokens)
+            try:
+                vecs = self.backend.embed(texts)
+            except RateLimitError as e:
+                if attempt == self.max_attempts:
+                    raise
+                headers = getattr(getattr(e, "response", None), "headers", None)
+                pause = self.limiter.on_throttle(parse_retry_after(headers))
+                print(f"[EmbeddingAgent] 429 (attempt {attempt}); pausing {pause:.1f}s, window {self.limiter.limit}.")
+                continue
+            except (APIConnectionError, InternalServerError):
+                if attempt == self.max_attempts:
+                    raise
+                time.sleep(min(60.0, 2.0 ** attempt))
+                continue
+            finally:
+                self.limiter.release()
+            self.limiter.on_success()
+            return vecs
+
+    def profile(self) -> Dict[str, Any]:
+        """Embedding settings a collection's points depend on (queries must match them)."""
+        return {"backend": self.backend.name, "reduction": self.reduction.as_dict()}
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """
+        Vector for a search query from the same backend (and cache) as the indexed
+        chunks, so a collection is always queried in its own embedding space.
+
+        A single direct request: no batch cooldown, usage banner or cache_stats reset,
+        and a failure raises instead of going to the dead-letter log.
+        """
+        if not isinstance(text, str) or not text.strip():
+            raise RuntimeError("Query embedding failed: empty text.")
+        rec = self._fit({"text": text, "metadata": {}})
+        found = self.cache.get_many(self.deployment, self.dimensions, rec["inputs"])
+        need = [i for i, v in enumerate(found) if v is None]
+        if need:
+            inputs = [rec["inputs"][i] for i in need]
+            vecs = self._send(inputs, sum(rec["weights"][i] for i in need))
+            for i, v in zip(need, vecs):
+                found[i] = v
+            self.cache.put_many(self.deployment, self.dimensions, inputs, vecs)
+        vec = found[0] if len(found) == 1 else _combine(found, rec["weights"])
+        return self.reduction.apply(np.asarray([vec], dtype=np.float32))[0]
+
+    def _log_token_usage(self, embedded: EmbeddingBatch):
+        _print_token_usage(*_token_usage(embedded))
+
+
+def _combine(vectors: List[Any], weights: List[int]) -> np.ndarray:
+    """Token-weighted mean of the pieces of a split input, re-normalized to unit length."""
+    v = np.average(np.asarray(vectors, dtype=np.float64), axis=0, weights=np.asarray(weights, dtype=np.float64))
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+def _token_usage(embedded: EmbeddingBatch) -> Tuple[int, int, int, int]:
+    """(items, total tokens, KB tokens, field tokens) of an embedded batch."""
+    n = len(embedded)
+    tokens = embedded.tokens.tolist()
+    source = embedded.columns.get("source") or [None] * n
+    source_type = embedded.columns.get("source_type") or [None] * n
+    kb_tokens = sum(
+        t for t, s, st in zip(tokens, source, source_type)
+        if s == "knowledge_bank" or st == "kb"
+    )
+    field_tokens = sum(
+        t for t, s, st in zip(tokens, source, source_type)
+        if s == "field_reported_issues" or st == "field"
+    )
+    return n, sum(tokens), kb_tokens, field_tokens
+
 
-        print("\n🔍 [EmbeddingAgent] Token Usage Summary")
-        print(f"  • Embedded Items        : {len(embedded)}")
-        print(f"  • Total Tokens          : {total_tokens:,}")
-        print(f"  • Knowledge Bank Tokens : {kb_tokens:,}")
-        print(f"  • Field Issues Tokens   : {field_tokens:,} (should be 0 if you keep embed=False for field)")
+def _print_token_usage(items: int, total_tokens: int, kb_tokens: int, field_tokens: int) -> None:
+    print("\n🔍 [EmbeddingAgent] Token Usage Summary")
+    print(f"  • Embedded Items        : {items}")
+    print(f"  • Total Tokens          : {total_tokens:,}")
+    print(f"  • Knowledge Bank Tokens : {kb_tokens:,}")
+    print(f"  • Field Issues Tokens   : {field_tokens:,} (should be 0 if you keep embed=False for field)")
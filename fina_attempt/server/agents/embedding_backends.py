@@ -0,0 +1,224 @@
+# server/agents/embedding_backends.py
+from __future__ import annotations
+
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+from server.utils.azure_openai_client import (
+    get_azure_openai_client,
+    AZURE_EMBEDDING_DEPLOYMENT,
+)
+
+# Backend per collection: "collection=backend,..." (e.g. "onprem_corpus=onnx"); others use
+# DFMEA_EMBED_BACKEND. A collection must keep one backend, its vectors are not comparable.
+EMBED_BACKEND = os.getenv("DFMEA_EMBED_BACKEND", "azure")
+EMBED_BACKENDS = os.getenv("DFMEA_EMBED_BACKENDS", "")
+
+
+# -------------------------
+# Interface
+# -------------------------
+class EmbeddingBackend(ABC):
+    """
+    Turns a list of texts into vectors (same order). EmbeddingAgent does filtering,
+    packing, caching and the record shape; a backend only embeds.
+
+      name    : identifies model + settings; part of the embedding-cache key
+      remote  : True for rate-limited APIs (retries, cooldown, RPM/TPM limiter apply);
+                local backends truncate to their model's max length themselves
+      dimensions : requested output size, honored only by backends whose model
+                   accepts it (DimReduction "api"); 0 = native
+
+    Subclasses must implement embed(); one without it cannot be instantiated.
+    """
+
+    name: str = ""
+    remote: bool = False
+    dimensions: int = 0
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> Any:
+        """(N x D) float array or a list of N vectors."""
+
+
+# -------------------------
+# Azure OpenAI
+# -------------------------
+class AzureOpenAIBackend(EmbeddingBackend):
+    remote = True
+
+    def __init__(self, client: Any = None, deployment: Optional[str] = None):
+        self.client = client or get_azure_openai_client()
+        self.deployment = deployment or AZURE_EMBEDDING_DEPLOYMENT
+        if not self.deployment:
+            raise RuntimeError("AZURE_OPENAI_EMBEDDING_DEPLOYMENT is not set.")
+        self.name = self.deployment
+
+    def without_sdk_retries(self) -> None:
+        """Let 429s surface immediately (the caller's limiter handles them)."""
+        if hasattr(self.client, "with_options"):
+            self.client = self.client.with_options(max_retries=0)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        # text-embedding-3 models shorten their output natively when asked
+        extra = {"dimensions": self.dimensions} if self.dimensions else {}
+        resp = self.client.embeddings.create(input=texts, model=self.deployment, **extra)
+        # Azure/OpenAI returns embeddings in resp.data[j].embedding
+        return [item.embedding for item in resp.data]
+
+
+# -------------------------
+# Local ONNX Runtime (CPU)
+# -------------------------
+@dataclass
+class OnnxBackendConfig:
+    model_dir: str = os.getenv("DFMEA_ONNX_MODEL_DIR", "")                      # model + tokenizer.json
+    model_file: str = os.getenv("DFMEA_ONNX_MODEL_FILE", "onnx/model_quantized.onnx")
+    threads: int = int(os.getenv("DFMEA_ONNX_THREADS", "0"))                    # intra-op threads, 0 = all cores
+    max_length: int = int(os.getenv("DFMEA_ONNX_MAX_LENGTH", "512"))            # model tokens per input
+    max_batch_tokens: int = int(os.getenv("DFMEA_ONNX_BATCH_TOKENS", "8192"))   # padded tokens per session.run
+    max_batch_size: int = 128
+    pooling: str = os.getenv("DFMEA_ONNX_POOLING", "mean")                      # mean | cls
+    normalize: bool = True
+
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    Sentence embeddings from an exported (typically int8-quantized) transformer on CPU
+    via onnxruntime + the model's HF `tokenizer.json`.
+
+    Dynamic batching: inputs are sorted by token length and grouped so that
+    batch size x longest sequence stays within `max_batch_tokens`, so short KB rows run
+    in large batches and long PRD chunks in small ones with little padding. Output
+    order is the input order.
+    """
+
+    def __init__(self, cfg: Optional[OnnxBackendConfig] = None, *, session: Any = None, tokenizer: Any = None):
+        self.cfg = cfg or OnnxBackendConfig()
+        if session is None or tokenizer is None:
+            if not self.cfg.model_dir:
+                raise RuntimeError("DFMEA_ONNX_MODEL_DIR is not set.")
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+
+            opts = ort.SessionOptions()
+            if self.cfg.threads > 0:
+                opts.intra_op_num_threads = self.cfg.threads
+            opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = ort.InferenceSession(
+                os.path.join(self.cfg.model_dir, self.cfg.model_file), opts, providers=["CPUExecutionProvider"]
+            )
+            tokenizer = Tokenizer.from_file(os.path.join(self.cfg.model_dir, "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=self.cfg.max_length)
+        tokenizer.no_padding()
+        self.session = session
+        self.tokenizer = tokenizer
+        self.inputs = {i.name for i in session.get_inputs()}
+        model = os.path.basename(os.path.normpath(self.cfg.model_dir)) or "onnx"
+        self.name = f"onnx:{model}/{self.cfg.model_file}:{self.cfg.pooling}:{self.cfg.max_length}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), np.float32)
+        encs = self.tokenizer.encode_batch(list(texts))
+        ids = [e.ids for e in encs]
+        out: Optional[np.ndarray] = None
+        for group in length_groups([len(x) for x in ids], self.cfg.max_batch_tokens, self.cfg.max_batch_size):
+            vecs = self._run([ids[i] for i in group])
+            if out is None:
+                out = np.empty((len(texts), vecs.shape[1]), np.float32)
+            out[group] = vecs
+        return out
+
+    def _run(self, seqs: Sequence[Sequence[int]]) -> np.ndarray:
+        width = max(1, max(len(s) for s in seqs))
+        input_ids = np.zeros((len(seqs), width), np.int64)
+        mask = np.zeros((len(seqs), width), np.int64)
+        for r, s in enumerate(seqs):
+            input_ids[r, :len(s)] = s
+            mask[r, :len(s)] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": mask, "token_type_ids": np.zeros_like(input_ids)}
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.inputs})[0]
+        if hidden.ndim == 3:
+            if self.cfg.pooling == "cls":
+                hidden = hidden[:, 0]
+            else:
+                m = mask[:, :, None].astype(np.float32)
+                hidden = (hidden * m).sum(axis=1) / np.maximum(m.sum(axis=1), 1.0)
+        vecs = np.asarray(hidden, dtype=np.float32)
+        if self.cfg.normalize:
+            vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        return vecs
+
+
+def length_groups(lengths: Sequence[int], max_batch_tokens: int, max_batch_size: int) -> List[List[int]]:
+    """
+    Indexes grouped by ascending length so that len(group) * max length in the group
+    (the padded size) stays within max_batch_tokens; an over-long input runs alone.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    groups: List[List[int]] = []
+    group: List[int] = []
+    for i in order:
+        width = max(1, lengths[i])   # ascending: the newest input is the widest
+        if group and ((len(group) + 1) * width > max_batch_tokens or len(group) >= max_batch_size):
+            groups.append(group)
+            group = []
+        group.append(i)
+    if group:
+        groups.append(group)
+    return groups
+
+
+# -------------------------
+# sentence-transformers (CPU)
+# -------------------------
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Any sentence-transformers model on CPU; DFMEA_ST_ONNX=1 uses its ONNX Runtime backend."""
+
+    def __init__(self, model: Optional[str] = None, *, threads: Optional[int] = None, onnx: Optional[bool] = None):
+        from sentence_transformers import SentenceTransformer
+
+        model = model or os.getenv("DFMEA_ST_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        threads = int(os.getenv("DFMEA_ONNX_THREADS", "0")) if threads is None else threads
+        onnx = os.getenv("DFMEA_ST_ONNX", "0") == "1" if onnx is None else onnx
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+        kwargs = {"backend": "onnx"} if onnx else {}
+        self.model = SentenceTransformer(model, device="cpu", **kwargs)
+        self.batch_size = int(os.getenv("DFMEA_ST_BATCH_SIZE", "64"))
+        self.name = f"st:{model}{':onnx' if onnx else ''}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        # encode() already sorts by length internally, so batches carry little padding
+        return self.model.encode(
+            list(texts), batch_size=self.batch_size, convert_to_numpy=True, normalize_embeddings=True,
+        ).astype(np.float32)
+
+
+# -------------------------
+# Selection
+# -------------------------
+def backend_name_for(collection: Optional[str]) -> str:
+    """Backend configured for a collection (DFMEA_EMBED_BACKENDS), else DFMEA_EMBED_BACKEND."""
+    for pair in EMBED_BACKENDS.split(","):
+        name, _, backend = pair.partition("=")
+        if collection and name.strip() == collection and backend.strip():
+            return backend.strip().lower()
+    return EMBED_BACKEND.lower()
+
+
+def make_backend(name: str) -> EmbeddingBackend:
+    name = (name or "azure").lower()
+    if name == "azure":
+        return AzureOpenAIBackend()
+    if name == "onnx":
+        return OnnxBackend()
+    if name in ("st", "sentence-transformers"):
+        return SentenceTransformerBackend()
+    raise ValueError(f"Unknown embedding backend {name!r} (azure | onnx | sentence-transformers)")
@@ -3,9 +3,9 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 
-from server.utils.parsers import load_all_sources  # ← central loaders (kb/field/prd)
+from server.utils.parsers import load_all_sources, iter_all_sources  # ← central loaders (kb/field/prd)
 
 # -------------------------
 # Defaults (kept from old app spirit)
@@ -30,6 +30,7 @@ class ExtractionConfig:
     kb_paths: Optional[List[str]] = None           # CSV/XLSX
     field_paths: Optional[List[str]] = None        # CSV/XLSX
     prd_paths: Optional[List[str]] = None          # DOCX
+    workers: Optional[int] = None                  # >1: parse files in a process pool (default: DFMEA_PARSE_WORKERS)
 
 # -------------------------
 # Agent
@@ -69,10 +70,24 @@ class ExtractionAgent:
             kb_paths=self.config.kb_paths,
             field_paths=self.config.field_paths,
             prd_paths=self.config.prd_paths,
+            workers=self.config.workers,
         )
         # keep only rows with text
         return [r for r in rows if (r.get("text") or "").strip()]
 
+    def iter_run(self) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming version of run(): yields rows file by file (same order) using the
+        streaming DOCX/CSV/XLSX readers, for pipelines that must not hold the corpus.
+        """
+        yield from iter_all_sources(
+            product=self.config.product,
+            subproduct=self.config.subproduct,
+            kb_paths=self.config.kb_paths,
+            field_paths=self.config.field_paths,
+            prd_paths=self.config.prd_paths,
+        )
+
 # -------------------------
 # Quick manual test
 # -------------------------
@@ -1,345 +1,413 @@
-# # server/agents/vectorstore_agent.py
-# from __future__ import annotations
-
-# import os
-# import uuid
-# from dataclasses import dataclass
-# from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
-
-# from qdrant_client import QdrantClient
-# from qdrant_client.http.models import (
-#     Distance,
-#     VectorParams,
-#     PointStruct,
-#     Filter,
-#     FieldCondition,
-#     MatchValue,
-#     SearchRequest,
-# )
-
-# # -------------------------
-# # Config dataclass
-# # -------------------------
-# @dataclass
-# class QdrantConfig:
-#     url: str = os.getenv("QDRANT_URL", "")
-#     api_key: str = os.getenv("QDRANT_API_KEY", "")
-#     collection: str = os.getenv("QDRANT_COLLECTION", "dfmea_corpus")
-#     prefer_grpc: bool = False
-#     https: bool = True
-#     timeout: int = int(os.getenv("QDRANT_TIMEOUT_SEC", "120"))
-#     verify: bool = False
-#     distance: Distance = Distance.COSINE
-#     on_missing_create: bool = True  # auto-create collection if missing
-#     vectors: Optional[int] = None   # set at ensure_collection(dim) if None
-
-# # -------------------------
-# # Vector store wrapper
-# # -------------------------
-# class VectorStoreAgent:
-#     """
-#     Qdrant wrapper for DFMEA chunks.
-
-#     Expects embedded items like:
-#       {
-#         "text" | "chunk": "<text>",
-#         "vector" | "embedding": [float,...],
-#         "meta" | "metadata": {
-#             "product": "...",
-#             "subproduct": "...",
-#             "source_type": "kb|field|prd",
-#             "file": "...",
-#             "idx": <int>,
-#             ... (anything else is preserved)
-#         }
-#       }
-#     """
-
-#     def __init__(self, cfg: Optional[QdrantConfig] = None):
-#         self.cfg = cfg or QdrantConfig()
-#         if not self.cfg.url:
-#             raise RuntimeError("QDRANT_URL env var is required.")
-#         self.client = QdrantClient(
-#             url=self.cfg.url,
-#             api_key=self.cfg.api_key or None,
-#             prefer_grpc=self.cfg.prefer_grpc,
-#             https=self.cfg.https,
-#             timeout=self.cfg.timeout,
-#             verify=self.cfg.verify,
-#         )
-
-#     # ---------- public API ----------
-
-#     def ensure_collection(self, vector_dim: int) -> None:
-#         """
-#         Ensure collection exists with the requested vector dimension.
-#         """
-#         self.cfg.vectors = vector_dim
-#         try:
-#             self.client.get_collection(self.cfg.collection)
-#             # If exists, we won't mutate vector size here.
-#             return
-#         except Exception:
-#             pass
-
-#         if not self.cfg.on_missing_create:
-#             raise RuntimeError(f"Qdrant collection '{self.cfg.collection}' missing and auto-create disabled.")
-
-#         self.client.recreate_collection(
-#             collection_name=self.cfg.collection,
-#             vectors_config=VectorParams(
-#                 size=vector_dim,
-#                 distance=self.cfg.distance,
-#             ),
-#         )
-
-#     def upsert(self, items: Iterable[Dict[str, Any]]) -> int:
-#         """
-#         Upsert a batch of items into Qdrant.
-
-#         Returns number of points written.
-#         """
-#         points: List[PointStruct] = []
-#         vector_dim: Optional[int] = None
-
-#         for it in items:
-#             text = it.get("chunk") or it.get("text") or ""
-#             vec = it.get("vector") or it.get("embedding")
-#             meta = it.get("meta") or it.get("metadata") or {}
-#             if not isinstance(vec, (list, tuple)) or not vec:
-#                 # skip items without vectors
-#                 continue
-
-#             if vector_dim is None:
-#                 vector_dim = len(vec)
-
-#             payload = {
-#                 "text": text,
-#                 **meta,  # flatten meta for easy filtering (product, subproduct, source_type, file, idx, etc.)
-#             }
-
-#             points.append(
-#                 PointStruct(
-#                     id=str(uuid.uuid4()),
-#                     vector=list(vec),
-#                     payload=payload,
-#                 )
-#             )
-
-#         if not points:
-#             return 0
-
-#         # Make sure collection exists with correct dim
-#         if vector_dim is None:
-#             raise RuntimeError("Cannot infer vector dimension from empty batch.")
-#         self.ensure_collection(vector_dim)
-
-#         self.client.upsert(collection_name=self.cfg.collection, points=points, wait=True)
-#         return len(points)
-
-#     def search(
-#         self,
-#         query_vector: Sequence[float],
-#         *,
-#         product: str,
-#         subproduct: str,
-#         limit: int = 12,
-#         source_types: Optional[List[str]] = None,
-#         with_payload: bool = True,
-#         score_threshold: Optional[float] = None,
-#     ) -> List[Dict[str, Any]]:
-#         """
-#         Search top-K similar points filtered by product/subproduct (and optionally source_types).
-#         """
-#         if not query_vector:
-#             return []
-
-#         conds = [
-#             FieldCondition(key="product", match=MatchValue(product)),
-#             FieldCondition(key="subproduct", match=MatchValue(subproduct)),
-#         ]
-#         if source_types:
-#             # OR over multiple source_types -> use multiple SearchRequest calls or a single filter with "should" once available
-#             # Simple approach: pass list and rely on MatchValue(list) semantics (supported by qdrant-client)
-#             conds.append(FieldCondition(key="source_type", match=MatchValue(source_types)))
-
-#         qfilter = Filter(must=conds)
-
-#         req = SearchRequest(
-#             collection_name=self.cfg.collection,
-#             vector=list(query_vector),
-#             limit=limit,
-#             with_payload=with_payload,
-#             score_threshold=score_threshold,
-#             filter=qfilter,
-#         )
-
-#         res = self.client.search_batch(requests=[req])[0]
-#         out: List[Dict[str, Any]] = []
-#         for sp in res:
-#             # sp: ScoredPoint
-#             payload = sp.payload or {}
-#             out.append({
-#                 "score": float(sp.score),
-#                 "payload": payload,
-#                 "vector_id": sp.id,
-#             })
-#         return out
-
-#     def delete_collection(self) -> None:
-#         try:
-#             self.client.delete_collection(self.cfg.collection)
-#         except Exception:
-#             pass
-
-#     def count(self) -> int:
-#         try:
-#             info = self.client.get_collection(self.cfg.collection)
-#             # Qdrant doesn't return point count here; do a dummy scroll/count if needed.
-#             # Cheap approach: try a small scroll and track 'total' meta, else return -1.
-#             res = self.client.scroll(self.cfg.collection, limit=1, with_payload=False)
-#             # res: (points, next_page_offset)
-#             total = getattr(res, "total", None)
-#             return int(total) if total is not None else -1
-#         except Exception:
-#             return -1
-
-
-# # -------------------------
-# # Quick manual test
-# # -------------------------
-# if __name__ == "__main__":
-#     import random
-
-#     # Env should have QDRANT_URL / QDRANT_API_KEY set
-#     agent = VectorStoreAgent()
-
-#     # Fake vectors (dim=8)
-#     samples = []
-#     for i in range(5):
-#         samples.append({
-#             "chunk": f"Sample text {i}",
-#             "vector": [random.random() for _ in range(8)],
-#             "meta": {
-#                 "product": "Quasar",
-#                 "subproduct": "Display",
-#                 "source_type": "prd" if i % 2 == 0 else "kb",
-#                 "file": "dummy",
-#                 "idx": i,
-#             }
-#         })
-
-#     wrote = agent.upsert(samples)
-#     print("Upserted:", wrote)
-
-#     q = [0.1] * 8
-#     hits = agent.search(q, product="Quasar", subproduct="Display", limit=3)
-#     print("Hits:", len(hits))
-#     if hits:
-#         print(hits[0])
+# server/agents/vectorstore_agent.py
+from __future__ import annotations
 
-
-import os
+import json
 import logging
-from typing import List, Dict, Any, Optional
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
+from dotenv import load_dotenv
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as rest
-from dotenv import load_dotenv
-import uuid
+from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
+
+from server.pipeline.index_manifest import DEFAULT_MANIFEST_DIR
+from server.utils.dim_reduction import load_profile, profile_path, save_profile
+from server.utils.embedding_batch import EmbeddingBatch
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# Embedding settings per collection (EmbeddingAgent.profile() + vector size), next to the index manifests
+COLLECTION_PROFILE_DIR = os.getenv(
+    "DFMEA_COLLECTION_PROFILE_DIR", os.getenv("DFMEA_INDEX_MANIFEST_DIR", DEFAULT_MANIFEST_DIR)
+)
+
+# Write generation per collection (this process), bumped on every upsert/delete so
+# readers holding cached search results (ContextAgent) can tell they went stale.
+_generations: Dict[str, int] = {}
+_generations_lock = threading.Lock()
+
+
+def collection_generation(collection: str) -> int:
+    return _generations.get(collection, 0)
+
+
+def bump_generation(collection: str) -> int:
+    with _generations_lock:
+        _generations[collection] = _generations.get(collection, 0) + 1
+        return _generations[collection]
+
+
+# -------------------------
+# Config
+# -------------------------
+@dataclass
+class QdrantConfig:
+    url: str = os.getenv("QDRANT_URL") or os.getenv("QDRANT_ENDPOINT", "")     # ":memory:" = in-process
+    api_key: str = os.getenv("QDRANT_API_KEY", "")
+    collection: str = os.getenv("QDRANT_COLLECTION", "dfmea_corpus")
+    prefer_grpc: bool = False
+    https: bool = os.getenv("QDRANT_HTTPS", "1") == "1"
+    timeout: int = int(os.getenv("QDRANT_TIMEOUT_SEC", "120"))
+    verify: bool = os.getenv("QDRANT_VERIFY_SSL", "0") == "1"
+    distance: rest.Distance = rest.Distance.COSINE
+    # bulk upsert: sub-batches bounded by points and request bytes, sent concurrently
+    upsert_batch_points: int = int(os.getenv("QDRANT_UPSERT_BATCH_POINTS", "256"))
+    upsert_batch_mb: float = float(os.getenv("QDRANT_UPSERT_BATCH_MB", "16"))
+    upsert_parallel: int = int(os.getenv("QDRANT_UPSERT_PARALLEL", "4"))
+    upsert_max_attempts: int = int(os.getenv("QDRANT_UPSERT_MAX_ATTEMPTS", "5"))
+
+    @property
+    def collection_name(self) -> str:
+        return self.collection
+
+
+@dataclass
+class UpsertStats:
+    points: int = 0
+    batches: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+    @property
+    def points_per_sec(self) -> float:
+        return self.points / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "points": self.points,
+            "batches": self.batches,
+            "retries": self.retries,
+            "seconds": round(self.seconds, 3),
+            "points_per_sec": round(self.points_per_sec, 1),
+        }
+
+
+# -------------------------
+# Agent
+# -------------------------
 class VectorStoreAgent:
-    def __init__(self, collection_name: str = None):
-        self.qdrant_url = os.getenv("QDRANT_ENDPOINT")
-        self.qdrant_api_key = os.getenv("QDRANT_API_KEY")
-        self.base_collection = os.getenv("QDRANT_COLLECTION", "dfmea_collection")
-        self.session_id = str(uuid.uuid4())[:8]
-        self.collection_name = collection_name or f"{self.base_collection}_{self.session_id}"
-        self.client = QdrantClient(
-            url=self.qdrant_url,
-            api_key=self.qdrant_api_key,
-            prefer_grpc=False,  # Make HTTP-based async fallback smoother
-            https=True,
-            timeout=120,#incresed from 30 standard to 120 for better timeout handeling 
-            verify=False
-        )
-        # Disable SSL verification for all requests
-        self.ssl_verify = False
-
-class VectorStoreAgent:
-    def __init__(self, cfg: Optional[VectorStoreAgentConfig] = None):
-        self.cfg = cfg or VectorStoreAgentConfig()
-        try:
-            self.client = QdrantClient(
-                url=self.cfg.url,
-                api_key=self.cfg.api_key or None,
-                prefer_grpc=self.cfg.prefer_grpc,
-                https=self.cfg.https,
-                timeout=self.cfg.timeout,
-                verify=self.cfg.verify,
-            )
-            logger.info(f"Connected to Qdrant at {self.cfg.url} (HTTPS={self.cfg.https}, verify={self.cfg.verify})")
-        except Exception as e:
-            logger.error(f"Failed to connect to Qdrant: {e}")
-            raise
-
-    def ensure_collection(self, vector_dim: int):
+    """
+    Qdrant wrapper for DFMEA chunks.
+
+    Points: vector = the chunk's embedding, payload = {"text", **metadata} (product,
+    subproduct, source_type, file, idx, ... flattened for filtering).
+
+    Upserts are split into sub-batches of at most `upsert_batch_points` points and
+    `upsert_batch_mb` of request body, sent concurrently (`upsert_parallel`), each
+    retried on timeouts / 5xx / 429 with exponential backoff. Every sub-batch is sent
+    with wait=True, so the requests overlap but an upsert only returns once all of its
+    points are applied and searchable, whichever shards they landed on (incremental
+    indexing relies on that before deleting stale points).
+    """
+
+    def __init__(
+        self,
+        cfg: Optional[QdrantConfig] = None,
+        *,
+        collection_name: Optional[str] = None,
+        client: Optional[QdrantClient] = None,
+    ):
+        self.cfg = cfg or QdrantConfig()
+        if collection_name:
+            self.cfg.collection = collection_name
+        self.collection_name = self.cfg.collection
+        if client is not None:
+            self.client = client
+        elif self.cfg.url == ":memory:":
+            self.client = QdrantClient(location=":memory:")
+        else:
+            if not self.cfg.url:
+                raise RuntimeError("QDRANT_URL (or QDRANT_ENDPOINT) env var is required.")
+            try:
+                self.client = QdrantClient(
+                    url=self.cfg.url,
+                    api_key=self.cfg.api_key or None,
+                    prefer_grpc=self.cfg.prefer_grpc,
+                    https=self.cfg.https,
+                    timeout=self.cfg.timeout,
+                    verify=self.cfg.verify,
+                )
+                logger.info(f"Connected to Qdrant at {self.cfg.url} (HTTPS={self.cfg.https}, verify={self.cfg.verify})")
+            except Exception as e:
+                logger.error(f"Failed to connect to Qdrant: {e}")
+                raise
+        # set by the pipeline: EmbeddingAgent.profile(), recorded with the collection
+        self.embedding_profile: Optional[Dict[str, Any]] = None
+        self.last_upsert = UpsertStats()
+        self._ready_dim: Optional[int] = None
+
+    # ---------- collection ----------
+
+    def ensure_collection(self, vector_dim: Optional[int] = None):
+        """
+        Create the collection if missing, sized `vector_dim` (default: the reduced size
+        in `embedding_profile`), and record the embedding settings alongside it. An
+        existing collection must match both, otherwise points and queries would not be
+        comparable; a mismatch raises ValueError.
+        """
+        profile = self.embedding_profile
+        if not vector_dim:
+            vector_dim = ((profile or {}).get("reduction") or {}).get("dims")
+            if not vector_dim:
+                raise ValueError("ensure_collection needs vector_dim (native size is known after the first embedding)")
+        if self._ready_dim == vector_dim:
+            return
+        name = self.collection_name
+        path = profile_path(COLLECTION_PROFILE_DIR, name)
+        wanted = {**profile, "dims": vector_dim} if profile else None
         try:
             collections = self.client.get_collections().collections
-            if self.cfg.collection_name not in [c.name for c in collections]:
-                logger.info(f"Creating Qdrant collection '{self.cfg.collection_name}' with dim={vector_dim}")
+            if name not in [c.name for c in collections]:
+                logger.info(f"Creating Qdrant collection '{name}' with dim={vector_dim}")
                 self.client.create_collection(
-                    collection_name=self.cfg.collection_name,
-                    vectors_config=rest.VectorParams(
-                        size=vector_dim,
-                        distance=rest.Distance.COSINE
-                    ),
+                    collection_name=name,
+                    vectors_config=rest.VectorParams(size=vector_dim, distance=self.cfg.distance),
                 )
+                if wanted:
+                    save_profile(path, wanted)
             else:
-                logger.info(f"Collection '{self.cfg.collection_name}' already exists")
+                size = self.client.get_collection(name).config.params.vectors.size
+                recorded = load_profile(path)
+                if size != vector_dim:
+                    raise ValueError(
+                        f"Collection '{name}' stores {size}-dim vectors, got {vector_dim} "
+                        f"(recorded embedding settings: {recorded})"
+                    )
+                if wanted and recorded and recorded != wanted:
+                    raise ValueError(f"Collection '{name}' was built with {recorded}, not {wanted}")
+                if wanted and not recorded:
+                    save_profile(path, wanted)
+                logger.info(f"Collection '{name}' already exists")
+            self._ready_dim = vector_dim
         except Exception as e:
             logger.error(f"Error ensuring Qdrant collection: {e}")
             raise
 
-    def upsert(self, embeddings: List[List[float]], payloads: List[Dict[str, Any]]):
+    def collection_profile(self) -> Optional[Dict[str, Any]]:
+        """Embedding settings recorded for this collection (None if unknown)."""
+        return load_profile(profile_path(COLLECTION_PROFILE_DIR, self.collection_name))
+
+    # ---------- writes ----------
+
+    def upsert(self, embeddings: Any, payloads: Optional[List[Dict[str, Any]]] = None) -> int:
+        """
+        Upsert an EmbeddingBatch (or old-style embedded dicts, or parallel
+        embeddings/payloads lists). Returns the number of points written.
+        """
+        if isinstance(embeddings, EmbeddingBatch):
+            return self.upsert_batch(embeddings)
+        if payloads is None:
+            return self.upsert_batch(EmbeddingBatch.from_records(embeddings or []))
+        if not embeddings or not payloads:
+            raise ValueError("No embeddings or payloads provided for upsert")
+        return self.upsert_batch(EmbeddingBatch(
+            embeddings,
+            [p.get("text", "") for p in payloads],
+            [{k: v for k, v in p.items() if k != "text"} for p in payloads],
+        ))
+
+    def upsert_batch(self, batch: EmbeddingBatch) -> int:
+        """
+        Upsert an EmbeddingBatch in bounded, concurrent sub-batches (see class doc).
+        Rows without an ID get a random UUID. Stats land in `last_upsert`.
+        """
+        if not len(batch):
+            return 0
+        self.ensure_collection(batch.dim)
+        ids = [pid if pid is not None else str(uuid.uuid4()) for pid in batch.ids]
+        payloads = list(batch.payloads())
+        vectors = batch.vectors.tolist()  # once, not per sub-batch
+        parts = list(self._split(batch.dim, payloads))
+        stats = UpsertStats(points=len(batch), batches=len(parts))
+        lock = threading.Lock()
+
+        def send(part: Tuple[int, int]) -> None:
+            a, b = part
+            points = rest.Batch(ids=ids[a:b], vectors=vectors[a:b], payloads=payloads[a:b])
+            retries = self._send(points, wait=True)
+            if retries:
+                with lock:
+                    stats.retries += retries
+
+        t0 = time.perf_counter()
         try:
-            if not embeddings or not payloads:
-                raise ValueError("No embeddings or payloads provided for upsert")
-
-            vector_dim = len(embeddings[0])
-            logger.info(f"Upserting {len(embeddings)} vectors (dim={vector_dim}) into '{self.cfg.collection_name}'")
-            logger.debug(f"First payload sample: {payloads[0]}")
-
-            self.ensure_collection(vector_dim)
-
-            points = [
-                rest.PointStruct(id=i, vector=embeddings[i], payload=payloads[i])
-                for i in range(len(embeddings))
-            ]
-            self.client.upsert(collection_name=self.cfg.collection_name, points=points)
-            logger.info(f"Upsert completed for {len(points)} points.")
+            if len(parts) == 1:
+                send(parts[0])
+            else:
+                workers = max(1, min(self.cfg.upsert_parallel, len(parts)))
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upsert") as pool:
+                    for _ in pool.map(send, parts):
+                        pass
         except Exception as e:
             logger.error(f"Upsert failed: {e}")
             raise
+        finally:
+            stats.seconds = time.perf_counter() - t0
+            self.last_upsert = stats
+            bump_generation(self.collection_name)
+        logger.info(
+            f"Upserted {stats.points} vectors (dim={batch.dim}) into '{self.collection_name}' in "
+            f"{stats.batches} batch(es), {stats.retries} retry(ies): {stats.points_per_sec:,.0f} points/s."
+        )
+        return len(batch)
+
+    def _split(self, dim: int, payloads: Sequence[Dict[str, Any]]) -> Iterator[Tuple[int, int]]:
+        """(start, end) row ranges within the point and byte limits (JSON request size estimate)."""
+        max_points = max(1, self.cfg.upsert_batch_points)
+        max_bytes = self.cfg.upsert_batch_mb * 1024 * 1024
+        vector_bytes = dim * 20 + 64  # a JSON float is up to ~20 chars, plus id/framing
+        start, size = 0, 0
+        for i, p in enumerate(payloads):
+            n = vector_bytes + len(json.dumps(p, default=str, ensure_ascii=False).encode("utf-8"))
+            if i > start and (i - start >= max_points or size + n > max_bytes):
+                yield start, i
+                start, size = i, 0
+            size += n
+        if start < len(payloads):
+            yield start, len(payloads)
+
+    def _send(self, points: rest.Batch, *, wait: bool) -> int:
+        """One upsert request; retries transient failures, returns how many retries it took."""
+        attempts = max(1, self.cfg.upsert_max_attempts)
+        for attempt in range(1, attempts + 1):
+            try:
+                self.client.upsert(collection_name=self.collection_name, points=points, wait=wait)
+                return attempt - 1
+            except (UnexpectedResponse, ResponseHandlingException) as e:
+                status = getattr(e, "status_code", None)
+                transient = status is None or status >= 500 or status == 429
+                if not transient or attempt == attempts:
+                    raise
+                delay = min(30.0, 0.5 * 2 ** (attempt - 1))
+                logger.warning(f"Upsert of {len(points.ids)} points failed ({e}); retry {attempt} in {delay:.1f}s")
+                time.sleep(delay)
+        return attempts - 1
+
+    def overwrite_payloads(self, payloads: Dict[Any, Dict[str, Any]], batch_size: int = 500) -> int:
+        """
+        Replace the payload of existing points, keeping their vectors (used by incremental
+        indexing when a kept chunk's row moved). Returns how many points were updated.
+        """
+        items = list((payloads or {}).items())
+        for i in range(0, len(items), batch_size):
+            self.client.batch_update_points(
+                collection_name=self.collection_name,
+                update_operations=[
+                    rest.OverwritePayloadOperation(overwrite_payload=rest.SetPayload(payload=payload, points=[pid]))
+                    for pid, payload in items[i : i + batch_size]
+                ],
+                wait=True,
+            )
+        if items:
+            bump_generation(self.collection_name)
+            logger.info(f"Rewrote the payload of {len(items)} points in '{self.collection_name}'.")
+        return len(items)
+
+    def delete(self, point_ids: List[Any], batch_size: int = 1000) -> int:
+        """Delete points by ID (used by incremental indexing); returns how many were requested."""
+        ids = list(point_ids or [])
+        for i in range(0, len(ids), batch_size):
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=rest.PointIdsList(points=ids[i : i + batch_size]),
+                wait=True,
+            )
+        if ids:
+            bump_generation(self.collection_name)
+            logger.info(f"Deleted {len(ids)} points from '{self.collection_name}'.")
+        return len(ids)
+
+    def delete_where(self, *, product: Optional[str] = None, subproduct: Optional[str] = None) -> int:
+        """
+        Delete every point of a (product, subproduct) scope, e.g. before a full re-index
+        of it (the collection is shared between scopes). Returns how many were removed.
+        """
+        if not (product or subproduct):
+            raise ValueError("delete_where needs a product and/or subproduct")
+        if not self.client.collection_exists(self.collection_name):
+            return 0
+        must = [
+            rest.FieldCondition(key=key, match=rest.MatchValue(value=value))
+            for key, value in (("product", product), ("subproduct", subproduct)) if value
+        ]
+        scope = rest.Filter(must=must)
+        n = self.client.count(collection_name=self.collection_name, count_filter=scope, exact=True).count
+        if n:
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=rest.FilterSelector(filter=scope),
+                wait=True,
+            )
+            bump_generation(self.collection_name)
+            logger.info(f"Deleted {n} points of product={product!r}, subproduct={subproduct!r} from '{self.collection_name}'.")
+        return n
+
+    # ---------- reads ----------
+
+    def search(
+        self,
+        query_vector: Sequence[float],
+        top_k: int = 5,
+        *,
+        product: Optional[str] = None,
+        subproduct: Optional[str] = None,
+        subsystem: Optional[str] = None,
+        components: Optional[List[str]] = None,
+        source_types: Optional[List[str]] = None,
+        score_threshold: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k points by similarity, as {"id", "score", "text", "metadata", "payload"}.
+
+        Filters (all optional, empty values ignored): product, subproduct (a field
+        issue's `subsystem` is its subproduct), source_types; components only narrow
+        points that carry a "component" field, others still match.
+        """
+        if query_vector is None or not len(query_vector):
+            raise ValueError("Query vector is empty")
+        must: List[Any] = []
+        if product:
+            must.append(rest.FieldCondition(key="product", match=rest.MatchValue(value=product)))
+        if subproduct or subsystem:
+            must.append(rest.FieldCondition(key="subproduct", match=rest.MatchValue(value=subproduct or subsystem)))
+        if source_types:
+            must.append(rest.FieldCondition(key="source_type", match=rest.MatchAny(any=list(source_types))))
+        components = [c for c in components or [] if c]
+        if components:
+            must.append(rest.Filter(should=[
+                rest.FieldCondition(key="component", match=rest.MatchAny(any=components)),
+                rest.IsEmptyCondition(is_empty=rest.PayloadField(key="component")),
+            ]))
 
-    def search(self, query_vector: List[float], top_k: int = 5) -> List[Dict[str, Any]]:
         try:
-            if not query_vector:
-                raise ValueError("Query vector is empty")
-
-            logger.info(f"Searching top {top_k} in '{self.cfg.collection_name}' (dim={len(query_vector)})")
-            results = self.client.search(
-                collection_name=self.cfg.collection_name,
-                query_vector=query_vector,
+            res = self.client.query_points(
+                collection_name=self.collection_name,
+                query=list(map(float, query_vector)),
+                query_filter=rest.Filter(must=must) if must else None,
                 limit=top_k,
-            )
-            logger.debug(f"Search results: {results}")
-            return results
+                score_threshold=score_threshold,
+                with_payload=True,
+            ).points
         except Exception as e:
             logger.error(f"Search failed: {e}")
             raise
+        out: List[Dict[str, Any]] = []
+        for sp in res:
+            payload = sp.payload or {}
+            out.append({
+                "id": sp.id,
+                "score": float(sp.score),
+                "text": payload.get("text", ""),
+                "metadata": {k: v for k, v in payload.items() if k != "text"},
+                "payload": payload,
+            })
+        return out
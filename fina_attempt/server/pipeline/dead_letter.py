@@ -0,0 +1,129 @@
+# server/pipeline/dead_letter.py
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+from server.pipeline.index_manifest import DATA_DIR, _slug
+
+# under the app's data dir (DFMEA_DATA_DIR), like the index manifests: the log is
+# only worth keeping if it survives tmp cleaners and restarts until replay()
+DEFAULT_DEAD_LETTER_DIR = os.path.join(DATA_DIR, "dead_letters")
+
+
+@dataclass
+class DeadLetterConfig:
+    dead_letter_dir: str = os.getenv("DFMEA_DEAD_LETTER_DIR", DEFAULT_DEAD_LETTER_DIR)
+
+
+class DeadLetterLog:
+    """
+    Durable log of embedding batches that failed after all retries, for one
+    (collection, product, subproduct). Each failure keeps the batch's chunks as
+    {"text", "metadata"} records (point_id included on incremental runs), so
+    DFMEAPipeline.replay() can embed and upsert exactly those chunks later.
+
+    One JSON line per failure, appended and fsync'ed before the batch is reported
+    lost; resolve() rewrites the file atomically without the replayed entries. A torn
+    last line (crash mid-append) is skipped on read.
+    """
+
+    def __init__(
+        self,
+        *,
+        collection: str,
+        product: str,
+        subproduct: str,
+        cfg: Optional[DeadLetterConfig] = None,
+    ):
+        self.cfg = cfg or DeadLetterConfig()
+        self.collection = collection
+        self.product = product
+        self.subproduct = subproduct
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        scope = "__".join(_slug(s) for s in (self.collection, self.product, self.subproduct))
+        return os.path.join(self.cfg.dead_letter_dir, f"{scope}.jsonl")
+
+    # ---------- writes ----------
+
+    def append(self, records: List[Dict[str, Any]], error: BaseException | str) -> str:
+        """Record one failed batch; returns its entry ID."""
+        entry = {
+            "id": uuid.uuid4().hex,
+            "failed_at": time.time(),
+            "error": error if isinstance(error, str) else f"{type(error).__name__}: {error}",
+            "records": [{"text": r["text"], "metadata": r.get("metadata") or {}} for r in records],
+        }
+        line = json.dumps(entry, default=str) + "\n"
+        with self._lock:
+            os.makedirs(self.cfg.dead_letter_dir, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write(line)
+                fh.flush()
+                os.fsync(fh.fileno())
+        return entry["id"]
+
+    def resolve(self, ids: Iterable[str]) -> int:
+        """Drop entries (after a successful replay); returns how many were removed."""
+        done = set(ids)
+        with self._lock:
+            entries = self._read()
+            keep = [e for e in entries if e["id"] not in done]
+            if len(keep) == len(entries):
+                return 0
+            if not keep:
+                os.remove(self.path)
+            else:
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as fh:
+                    fh.writelines(json.dumps(e, default=str) + "\n" for e in keep)
+                    fh.flush()
+                    os.fsync(fh.fileno())
+                os.replace(tmp, self.path)
+        return len(entries) - len(keep)
+
+    def clear(self) -> int:
+        """Drop every entry (a full re-index supersedes them)."""
+        return self.resolve(e["id"] for e in self.pending())
+
+    # ---------- reads ----------
+
+    def pending(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self._read()
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Pending failures without their texts: {"id", "failed_at", "error", "chunks", "sources"}."""
+        out = []
+        for e in self.pending():
+            files = sorted({str((r["metadata"] or {}).get("file") or "") for r in e["records"]} - {""})
+            out.append({
+                "id": e["id"],
+                "failed_at": e["failed_at"],
+                "error": e["error"],
+                "chunks": len(e["records"]),
+                "sources": files,
+            })
+        return out
+
+    def _read(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                lines = fh.readlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for n, line in enumerate(lines, 1):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                print(f"[DeadLetterLog] Skipping unreadable line {n} of {self.path}")
+        return entries
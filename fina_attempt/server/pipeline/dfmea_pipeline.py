@@ -2,22 +2,44 @@
 from __future__ import annotations
 
 import os
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
 import pandas as pd
 
 from server.agents.extraction_agent import ExtractionAgent, ExtractionConfig
 from server.agents.chunking_agent import ChunkingAgent, ChunkingConfig
+from server.agents.dedup_agent import DedupAgent, DedupConfig
 from server.agents.embedding_agent import EmbeddingAgent
 from server.agents.vectorstore_agent import VectorStoreAgent, QdrantConfig
 from server.agents.context_agent import ContextAgent
 from server.agents.writer_agent import WriterAgent
+from server.pipeline.dead_letter import DeadLetterLog
+from server.pipeline.index_manifest import IndexManifest, IndexPlan, chunk_hash, payload_hash
+from server.pipeline.streaming import BoundedPipeline, STREAM_QUEUE_SIZE
+from server.utils.embedding_cache import EmbeddingCacheStats
+from server.utils.excel_parser import df_to_field_issue_rows
+from server.utils.parsers import load_field_issues
+
+# 1 = index() only re-processes added/changed files (see IndexManifest); default: full rebuild.
+# Opt-in because its first run for a scope (no manifest yet) deletes the scope's existing points.
+INCREMENTAL_INDEX = os.getenv("DFMEA_INCREMENTAL_INDEX", "0") == "1"
+# index() streams extract -> chunk -> embed -> upsert through bounded queues (full rebuild)
+STREAMING_INDEX = os.getenv("DFMEA_STREAMING_INDEX", "0") == "1"
+
+
+def _alias_key(meta: Dict[str, Any]) -> str:
+    aliases = meta.get("aliases")
+    if not aliases:
+        return ""
+    refs = ",".join(f"{a.get('idx')}.{a.get('chunk_id')}" for a in aliases)
+    return f"\x00{meta.get('dup_count')}:{refs}"
 
 
 class DFMEAPipeline:
     """
     End-to-end pipeline:
-      1) index():   load KB/Field/PRDs -> chunk -> embed -> upsert to Qdrant
+      1) index():   load KB/Field/PRDs -> chunk -> dedup -> embed -> upsert to Qdrant
+         replay():  embed + upsert only the chunks of batches that failed in index()
       2) generate(): use ContextAgent.generate(field_issues_rows) to get DFMEA entries
       3) write_excel(): export DFMEA entries to Excel bytes
     """
@@ -28,6 +50,7 @@ class DFMEAPipeline:
         product: str,
         subproduct: str,
         qdrant_collection: str | None = None,
+        embed_backend: str | None = None,
     ):
         self.product = product
         self.subproduct = subproduct
@@ -47,15 +70,22 @@ class DFMEAPipeline:
             ExtractionConfig(product=self.product, subproduct=self.subproduct)
         )
         self.chunker = ChunkingAgent(ChunkingConfig())
+        self.dedup = DedupAgent(DedupConfig())
 
-        # Azure embeddings (aligned agent)
-        self.embedder = EmbeddingAgent()
+        # Embeddings: `embed_backend`, else the backend configured for this collection
+        self.embedder = EmbeddingAgent(embed_backend, collection=self.collection)
+        # batches that fail after retries are kept here for replay()
+        self.dead_letters = DeadLetterLog(collection=self.collection, product=self.product, subproduct=self.subproduct)
+        self.embedder.dead_letter = self.dead_letters
 
-        # Vector store
+        # Vector store (records the embedding settings with the collection)
         self.vstore = VectorStoreAgent(QdrantConfig(collection=self.collection))
+        self.vstore.embedding_profile = self.embedder.profile()
 
-        # Context + Writer
-        self.context = ContextAgent(collection_name=self.collection)
+        # Context + Writer: queries get their own embedder (same backend and reduction)
+        # with no dead-letter log, so a failed query raises and is never replayed as a chunk
+        query_embedder = EmbeddingAgent(self.embedder.backend, reduction=self.embedder.reduction)
+        self.context = ContextAgent(collection_name=self.collection, embedder=query_embedder)
         self.writer = WriterAgent()
 
     # ---------------- Indexing ---------------- #
@@ -66,12 +96,41 @@ class DFMEAPipeline:
         kb_paths: Optional[List[str]] = None,
         field_paths: Optional[List[str]] = None,
         prd_paths: Optional[List[str]] = None,
-    ) -> Dict[str, int]:
+        incremental: Optional[bool] = None,
+        streaming: Optional[bool] = None,
+    ) -> Dict[str, Any]:
         """
         Build the corpus for (product, subproduct) by reading the provided files
-        (KB/Field/PRDs), chunking, embedding, and upserting to Qdrant.
+        (KB/Field/PRDs), chunking, folding duplicate chunks (DedupAgent; copies are kept
+        as "aliases" on the embedded chunk), embedding, and upserting to Qdrant.
+
+        Incremental (opt-in: incremental=True or DFMEA_INCREMENTAL_INDEX=1): only
+        added/changed files are re-extracted, only their new chunks are embedded,
+        unchanged chunks whose row moved get their payload (idx, chunk_id, aliases)
+        rewritten, and points of removed files or rows are deleted. Duplicates are folded within each changed file. Returns file
+        counts {"added", "updated", "deleted", "unchanged"} plus {"items", "chunks",
+        "duplicates", "embedded", "upserted", "payloads_updated", "points_deleted"}.
+        The first incremental run of a scope (no manifest yet, e.g. an index built by a
+        full rebuild or an older version) deletes all existing points of (product,
+        subproduct) and re-embeds every file under deterministic IDs.
+
+        Full (default, incremental=False): re-index everything, folding duplicates across files;
+        returns {"items": X, "chunks": Y, "duplicates": D, "embedded": Z, "upserted": Z,
+        "points_deleted": N}. A full rebuild starts from an empty scope: the N existing
+        points of (product, subproduct), its manifest and dead letters are dropped first,
+        so re-runs and switches from/to incremental mode leave no duplicate or orphaned
+        points.
 
-        Returns simple counts: {"items": X, "chunks": Y, "embedded": Z, "upserted": Z}
+        Streaming (streaming=True or DFMEA_STREAMING_INDEX=1; takes precedence): a full
+        re-index where all stages run concurrently over bounded queues, so memory stays
+        flat and upserts overlap embedding. Duplicates are folded per file. Adds
+        per-stage "throughput" stats.
+
+        Every result also has the run's embedding-cache totals ("embed_cache_hits",
+        "embed_cache_misses") and "pending_failures": embedding batches that failed after
+        retries (this run or earlier ones) and are waiting in the dead-letter log, as
+        {"id", "failed_at", "error", "chunks", "sources"}. replay() recovers them without
+        a re-index; a full or streaming re-index supersedes them.
         """
         # Wire file paths (keep defaults if none provided)
         if kb_paths is not None:
@@ -81,6 +140,77 @@ class DFMEAPipeline:
         if prd_paths is not None:
             self.extractor.config.prd_paths = prd_paths
 
+        self.embedder.cache_totals = EmbeddingCacheStats()
+        streaming = STREAMING_INDEX if streaming is None else streaming
+        if streaming or not (INCREMENTAL_INDEX if incremental is None else incremental):
+            points_deleted = self._clear_scope()
+            counts = self._index_streaming() if streaming else self._index_full()
+            counts["points_deleted"] = points_deleted
+        else:
+            counts = self._index_incremental()
+        counts.update(self.embedder.cache_totals.as_counts())
+        counts["pending_failures"] = self.dead_letters.summary()
+        if counts["pending_failures"]:
+            n = sum(f["chunks"] for f in counts["pending_failures"])
+            print(f"[DFMEAPipeline] {n} chunk(s) in {len(counts['pending_failures'])} failed batch(es) pending; run replay().")
+        return counts
+
+    def replay(self) -> Dict[str, Any]:
+        """
+        Embed and upsert only the chunks in the dead-letter log. Entries are removed once
+        their points are written; a batch that fails again is logged anew. Chunks from an
+        incremental run keep their point IDs and are added to the manifest; those whose
+        file was re-indexed or removed since are dropped as "obsolete".
+
+        Returns {"batches", "chunks", "obsolete", "embedded", "upserted", "embed_cache_hits",
+        "embed_cache_misses", "pending_failures"}.
+        """
+        self.embedder.cache_totals = EmbeddingCacheStats()
+        entries = self.dead_letters.pending()
+        counts: Dict[str, Any] = {"batches": len(entries), "chunks": 0, "obsolete": 0, "embedded": 0, "upserted": 0}
+        manifest = IndexManifest(collection=self.collection, product=self.product, subproduct=self.subproduct)
+        missing = manifest.missing_points()
+
+        records: List[Dict[str, Any]] = []
+        for entry in entries:
+            for rec in entry["records"]:
+                pid = rec["metadata"].get("point_id")
+                if pid is not None and pid not in missing:
+                    counts["obsolete"] += 1
+                    continue
+                records.append(rec)
+        counts["chunks"] = len(records)
+
+        if records:
+            embedded = self.embedder.embed_chunks_sync(records)
+            counts["embedded"] = len(embedded)
+            if len(embedded):
+                pids = embedded.columns.get("point_id") or [None] * len(embedded)
+                embedded.ids = [p if isinstance(p, str) else None for p in pids]
+                counts["upserted"] = self.vstore.upsert(embedded)
+                if manifest.add_points(p for p in embedded.ids if p):
+                    manifest.save()
+
+        self.dead_letters.resolve(entry["id"] for entry in entries)
+        counts.update(self.embedder.cache_totals.as_counts())
+        counts["pending_failures"] = self.dead_letters.summary()
+        print(
+            f"[DFMEAPipeline] Replayed {counts['chunks']} chunk(s) from {counts['batches']} failed batch(es); "
+            f"{counts['upserted']} upserted, {counts['obsolete']} obsolete, "
+            f"{len(counts['pending_failures'])} batch(es) still pending."
+        )
+        return counts
+
+    def _clear_scope(self) -> int:
+        """Before re-indexing everything: drop this (product, subproduct)'s points, manifest and dead letters."""
+        self.dead_letters.clear()
+        deleted = self.vstore.delete_where(product=self.product, subproduct=self.subproduct)
+        IndexManifest(collection=self.collection, product=self.product, subproduct=self.subproduct).reset()
+        if deleted:
+            print(f"[DFMEAPipeline] Removed {deleted} existing point(s) of {self.product}/{self.subproduct} before re-indexing.")
+        return deleted
+
+    def _index_full(self) -> Dict[str, int]:
         # 1) Extract normalized items
         items = self.extractor.run()
         items = [it for it in items if it.get("text")]
@@ -91,19 +221,164 @@ class DFMEAPipeline:
         n_chunks = len(chunks)
 
         if n_chunks == 0:
-            return {"items": n_items, "chunks": 0, "embedded": 0, "upserted": 0}
+            return {"items": n_items, "chunks": 0, "duplicates": 0, "embedded": 0, "upserted": 0}
+
+        # 3) Fold exact / near-duplicate chunks (provenance kept as aliases)
+        chunks = self.dedup.run(chunks)
+        n_dup = n_chunks - len(chunks)
 
-        # 3) Embed (uses Azure embeddings)
+        # 4) Embed (uses Azure embeddings)
         embedded = self.embedder.run(chunks)
         n_emb = len(embedded)
 
         if n_emb == 0:
-            return {"items": n_items, "chunks": n_chunks, "embedded": 0, "upserted": 0}
+            return {"items": n_items, "chunks": n_chunks, "duplicates": n_dup, "embedded": 0, "upserted": 0}
 
-        # 4) Upsert to Qdrant
+        # 5) Upsert to Qdrant
         wrote = self.vstore.upsert(embedded)
 
-        return {"items": n_items, "chunks": n_chunks, "embedded": n_emb, "upserted": wrote}
+        return {"items": n_items, "chunks": n_chunks, "duplicates": n_dup, "embedded": n_emb, "upserted": wrote}
+
+    def _index_streaming(self, maxsize: int = STREAM_QUEUE_SIZE) -> Dict[str, Any]:
+        counts: Dict[str, Any] = {"items": 0, "chunks": 0, "duplicates": 0, "embedded": 0, "upserted": 0}
+
+        def embed(chunks):
+            for batch in self.embedder.iter_embed(chunks):
+                counts["embedded"] += len(batch)
+                yield batch
+
+        def upsert(batches):
+            for batch in batches:
+                yield self.vstore.upsert(batch)
+
+        def tally(wrote):
+            counts["upserted"] += wrote or 0
+
+        pipe = (
+            BoundedPipeline(maxsize=maxsize)
+            .add("chunk", self.chunker.iter_chunks)
+            .add("dedup", self.dedup.iter_dedup)
+            .add("embed", embed)
+            .add("upsert", upsert)
+        )
+        _, stats = pipe.run(self.extractor.iter_run(), sink=tally)
+        counts["items"], counts["chunks"] = stats[0].items, stats[1].items
+        counts["duplicates"] = stats[1].items - stats[2].items
+        stats[0].name = "extract"
+        counts["throughput"] = [st.as_dict() for st in stats]
+
+        print(f"[DFMEAPipeline] Streaming index (queue size {pipe.maxsize}):")
+        for st in counts["throughput"]:
+            print(
+                f"  {st['stage']:<8} {st['items']:>8} out  busy {st['busy_sec']:>8.2f}s  "
+                f"{st['items_per_sec']:>10.1f}/s"
+            )
+        return counts
+
+    def _index_incremental(self) -> Dict[str, int]:
+        cfg = self.extractor.config
+        sources = [("kb", p) for p in cfg.kb_paths or []]
+        sources += [("field", p) for p in cfg.field_paths or []]
+        sources += [("prd", p) for p in cfg.prd_paths or []]
+
+        manifest = IndexManifest(collection=self.collection, product=self.product, subproduct=self.subproduct)
+        plan = manifest.plan(sources)
+        counts: Dict[str, int] = {
+            **plan.counts(), "items": 0, "chunks": 0, "duplicates": 0, "embedded": 0, "upserted": 0,
+            "payloads_updated": 0, "points_deleted": 0,
+        }
+        print(f"[DFMEAPipeline] Incremental index, files: {plan.counts()}")
+        if not manifest.files:
+            # no manifest (first run, after a full rebuild, or lost): every file is re-indexed
+            # under deterministic IDs, so points written without them would be orphaned
+            counts["points_deleted"] += self._clear_scope()
+
+        stale = manifest.stale_points(plan.deleted)
+        records: Dict[str, Dict[str, Any]] = {}
+        to_embed: List[Dict[str, Any]] = []
+        moved: Dict[str, Dict[str, Any]] = {}
+
+        for key, items in self._extract_changed(plan).items():
+            counts["items"] += len(items)
+            chunks = self.chunker.run(items)
+            counts["chunks"] += len(chunks)
+            unique = self.dedup.run(chunks)
+            counts["duplicates"] += len(chunks) - len(unique)
+            chunks = unique
+
+            # aliases are part of the point's payload: a changed alias set re-writes it
+            hashes = [chunk_hash(ch["chunk"] + _alias_key(ch["meta"])) for ch in chunks]
+            ids, kept, gone = manifest.diff_file(key, hashes)
+            stale += gone
+            # a kept chunk whose row moved has a new idx/chunk_id: re-write its payload only
+            payloads = {}
+            for ch, pid in zip(chunks, ids):
+                ch["meta"]["point_id"] = pid
+                payloads[pid] = {"text": ch["chunk"], **ch["meta"]}
+            payload_hashes = [payload_hash(payloads[pid]) for pid in ids]
+            moved.update((pid, payloads[pid]) for pid in manifest.changed_payloads(key, ids, payload_hashes))
+            kept_set = set(kept)
+            to_embed.extend(ch for ch, pid in zip(chunks, ids) if pid not in kept_set)
+            records[key] = {"chunks": hashes, "ids": ids, "kept": kept, "payloads": payload_hashes}
+
+        # new/changed chunks only
+        written: List[str] = []
+        if to_embed:
+            embedded = self.embedder.run(to_embed)
+            counts["embedded"] = len(embedded)
+            if len(embedded):
+                embedded.ids = list(embedded.columns["point_id"])
+                counts["upserted"] = self.vstore.upsert(embedded)
+                written = list(embedded.ids)
+        if moved:
+            counts["payloads_updated"] = self.vstore.overwrite_payloads(moved)
+
+        # upsert before delete, so a changed file never disappears from search
+        if stale:
+            counts["points_deleted"] += self.vstore.delete(stale)
+
+        stored = set(written)
+        for rec in records.values():
+            stored.update(rec["kept"])
+        for key, rec in records.items():
+            points = [pid for pid in rec["ids"] if pid in stored]
+            manifest.record(
+                key, path=plan.paths[key], sha256=plan.hashes[key], chunks=rec["chunks"], points=points,
+                payloads=rec["payloads"],
+            )
+        manifest.forget(plan.deleted)
+        manifest.save()
+        return counts
+
+    def _extract_changed(self, plan: IndexPlan) -> Dict[str, List[Dict[str, Any]]]:
+        """Extract only the added/updated files of `plan`, grouped by manifest key."""
+        keys = plan.to_process
+        if not keys:
+            return {}
+        paths: Dict[str, List[str]] = {"kb": [], "field": [], "prd": []}
+        by_file: Dict[tuple, str] = {}
+        for key in keys:
+            kind = key.split(":", 1)[0]
+            path = plan.paths[key]
+            paths[kind].append(path)
+            # rows only carry the basename; two changed files of one kind with the same
+            # basename would be merged (re-indexed together) — harmless but not separated
+            by_file[(kind, os.path.basename(path))] = key
+
+        extractor = ExtractionAgent(ExtractionConfig(
+            product=self.product,
+            subproduct=self.subproduct,
+            kb_paths=paths["kb"],
+            field_paths=paths["field"],
+            prd_paths=paths["prd"],
+            workers=self.extractor.config.workers,
+        ))
+        grouped: Dict[str, List[Dict[str, Any]]] = {key: [] for key in keys}
+        for it in extractor.run():
+            key = by_file.get((it.get("source_type"), it.get("file")))
+            if key is not None:
+                grouped[key].append(it)
+        return grouped
 
     # ---------------- Generation ---------------- #
 
@@ -121,41 +396,46 @@ class DFMEAPipeline:
         Convert Field Reported Issues DataFrame to the row dicts expected by ContextAgent.generate().
         We keep this tolerant—if keys are missing, we fill from pipeline product/subproduct.
         """
-        rows: List[Dict] = []
-
-        # Heuristic key guesses if not provided
-        cols = {c.lower(): c for c in fri_df.columns}
-        product_key = product_key or cols.get("product")
-        subsystem_key = subsystem_key or cols.get("subsystem") or cols.get("sub_product") or cols.get("subproduct")
-        component_key = component_key or cols.get("component") or subsystem_key  # default to subsystem if missing
-        fault_code_key = fault_code_key or cols.get("fault_code") or cols.get("code")
-        fault_type_key = fault_type_key or cols.get("fault_type") or cols.get("type")
-
-        for _, r in fri_df.iterrows():
-            rows.append(
-                {
-                    "product": str(r.get(product_key) if product_key else self.product),
-                    "subsystem": str(r.get(subsystem_key) if subsystem_key else self.subproduct),
-                    "component": str(r.get(component_key) if component_key else self.subproduct),
-                    "fault_code": str(r.get(fault_code_key) or "") if fault_code_key else "",
-                    "fault_type": str(r.get(fault_type_key) or "") if fault_type_key else "",
-                }
-            )
-        return rows
+        return df_to_field_issue_rows(
+            fri_df,
+            product=self.product,
+            subproduct=self.subproduct,
+            product_key=product_key,
+            subsystem_key=subsystem_key,
+            component_key=component_key,
+            fault_code_key=fault_code_key,
+            fault_type_key=fault_type_key,
+        )
 
     def generate(
         self,
         *,
-        field_issues_df: pd.DataFrame,
+        field_issues_df: Optional[pd.DataFrame] = None,
+        field_issue_paths: Optional[Iterable[str]] = None,
         score_threshold: float = 0.48,
         top_k: int = 12,
         min_hits: int = 2,
         focus: str | None = None,
-    ) -> List[Dict]:
+        return_counts: bool = False,
+    ) -> List[Dict] | Dict[str, Any]:
         """
         Calls ContextAgent.generate(field_issues_rows) and returns DFMEA entries (list of dicts).
+        Field issues come from `field_issues_df`, or are read from `field_issue_paths`
+        (CSV/XLSX; large files are streamed, only the field-issue columns decoded).
+        With return_counts=True returns {"entries": [...], "counts": {...}} instead, counts
+        being the retrieval/query-embedding cache statistics of this call.
         """
-        rows = self._fri_df_to_rows(field_issues_df)
+        if field_issues_df is not None:
+            rows = self._fri_df_to_rows(field_issues_df)
+        elif field_issue_paths is not None:
+            rows = load_field_issues(
+                field_issue_paths,
+                product=self.product,
+                subproduct=self.subproduct,
+                workers=self.extractor.config.workers,
+            )
+        else:
+            raise ValueError("generate() needs field_issues_df or field_issue_paths.")
 
         # tune thresholds to match your old behavior
         self.context.top_k = top_k
@@ -167,6 +447,8 @@ class DFMEAPipeline:
             entries = self.context.generate(field_issues=rows, focus=focus) or []
         except TypeError:
             entries = self.context.generate(field_issues=rows) or []
+        if return_counts:
+            return {"entries": entries, "counts": self.context.cache_stats.as_counts()}
         return entries
 
     # ---------------- Writing ---------------- #
@@ -0,0 +1,258 @@
+# server/pipeline/index_manifest.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MANIFEST_VERSION = 1
+
+# Durable pipeline state lives under the app's data dir, never the OS temp dir: a
+# manifest wiped by a tmp cleaner or container restart makes the next incremental
+# run re-index everything and leaves the old points orphaned. Mount it in containers.
+DATA_DIR = os.getenv("DFMEA_DATA_DIR") or os.path.join(
+    os.getenv("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share"), "dfmea"
+)
+DEFAULT_MANIFEST_DIR = os.path.join(DATA_DIR, "index_manifests")
+
+# Stable namespace for point IDs (any fixed UUID works; never change it)
+_POINT_NS = uuid.UUID("6f1c2a7e-3d4b-5c6d-8e9f-0a1b2c3d4e5f")
+
+
+@dataclass
+class IndexManifestConfig:
+    manifest_dir: str = os.getenv("DFMEA_INDEX_MANIFEST_DIR", DEFAULT_MANIFEST_DIR)
+
+
+@dataclass
+class IndexPlan:
+    """Source files of one index() call, bucketed against the manifest (keys from file_key())."""
+    added: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    paths: Dict[str, str] = field(default_factory=dict)     # key -> path (added/updated/unchanged)
+    hashes: Dict[str, str] = field(default_factory=dict)    # key -> sha256 of the current file
+
+    @property
+    def to_process(self) -> List[str]:
+        return self.added + self.updated
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "added": len(self.added),
+            "updated": len(self.updated),
+            "deleted": len(self.deleted),
+            "unchanged": len(self.unchanged),
+        }
+
+
+def file_key(kind: str, path: str) -> str:
+    """Manifest key of a source file: its role (kb|field|prd) + absolute path."""
+    return f"{kind}:{os.path.abspath(path)}"
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.blake2b((text or "").encode("utf-8"), digest_size=16).hexdigest()
+
+
+def payload_hash(payload: Dict[str, Any]) -> str:
+    return chunk_hash(json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False))
+
+
+class IndexManifest:
+    """
+    Persistent record of what DFMEAPipeline.index() has written for one
+    (collection, product, subproduct): per source file, its content hash, the hashes
+    of the chunks it produced (in order), the hashes of their payloads and the
+    vector-store point IDs written.
+
+    Point IDs are deterministic (uuid5 of scope + file + chunk hash + occurrence), so
+    an unchanged chunk keeps its ID across runs and only new chunks need embedding.
+    The manifest is only saved after the store has been updated; if it is lost, the
+    next run re-embeds everything and overwrites the same IDs instead of duplicating.
+    """
+
+    def __init__(
+        self,
+        *,
+        collection: str,
+        product: str,
+        subproduct: str,
+        cfg: Optional[IndexManifestConfig] = None,
+    ):
+        self.cfg = cfg or IndexManifestConfig()
+        self.collection = collection
+        self.product = product
+        self.subproduct = subproduct
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    # ---------- persistence ----------
+
+    @property
+    def path(self) -> str:
+        scope = "__".join(_slug(s) for s in (self.collection, self.product, self.subproduct))
+        return os.path.join(self.cfg.manifest_dir, f"{scope}.json")
+
+    def load(self) -> None:
+        self.files = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"[IndexManifest] Ignoring unreadable manifest {self.path}: {type(e).__name__}: {e}")
+            return
+        if data.get("version") == MANIFEST_VERSION:
+            self.files = data.get("files") or {}
+
+    def save(self) -> None:
+        os.makedirs(self.cfg.manifest_dir, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "collection": self.collection,
+            "product": self.product,
+            "subproduct": self.subproduct,
+            "files": self.files,
+        }
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, indent=1)
+        os.replace(tmp, self.path)
+
+    # ---------- planning ----------
+
+    def plan(self, sources: Iterable[Tuple[str, str]]) -> IndexPlan:
+        """
+        Compare (kind, path) sources against the manifest. Files missing on disk are
+        ignored (they count as deleted if the manifest has them).
+        """
+        plan = IndexPlan()
+        for kind, path in sources:
+            if not path or not os.path.exists(path):
+                continue
+            key = file_key(kind, path)
+            if key in plan.paths:
+                continue
+            digest = file_sha256(path)
+            plan.paths[key] = path
+            plan.hashes[key] = digest
+            old = self.files.get(key)
+            if old is None:
+                plan.added.append(key)
+            elif old.get("sha256") != digest:
+                plan.updated.append(key)
+            else:
+                plan.unchanged.append(key)
+        plan.deleted = [k for k in self.files if k not in plan.paths]
+        return plan
+
+    def point_ids(self, key: str, hashes: List[str]) -> List[str]:
+        """Deterministic point ID per chunk; repeated chunk text in one file gets distinct IDs."""
+        seen: Dict[str, int] = {}
+        out: List[str] = []
+        for h in hashes:
+            n = seen.get(h, 0)
+            seen[h] = n + 1
+            name = f"{self.collection}|{self.product}|{self.subproduct}|{key}|{h}|{n}"
+            out.append(str(uuid.uuid5(_POINT_NS, name)))
+        return out
+
+    def diff_file(self, key: str, hashes: List[str]) -> Tuple[List[str], List[str], List[str]]:
+        """
+        For a re-chunked file: (point ID per chunk, IDs already in the store and still
+        wanted, IDs in the store that no longer correspond to any chunk).
+        """
+        ids = self.point_ids(key, hashes)
+        written = set((self.files.get(key) or {}).get("points") or [])
+        wanted = set(ids)
+        kept = [i for i in ids if i in written]
+        stale = sorted(written - wanted)
+        return ids, kept, stale
+
+    def changed_payloads(self, key: str, ids: List[str], payloads: List[str]) -> List[str]:
+        """
+        Written point IDs of a re-chunked file whose payload hash differs from the one
+        recorded (the chunk is unchanged but its row moved, so idx/chunk_id did).
+        Points recorded without payload hashes always count as changed.
+        """
+        rec = self.files.get(key) or {}
+        written = set(rec.get("points") or [])
+        before = dict(zip(self.point_ids(key, rec.get("chunks") or []), rec.get("payloads") or []))
+        return [pid for pid, h in zip(ids, payloads) if pid in written and before.get(pid) != h]
+
+    def missing_points(self) -> Dict[str, str]:
+        """Point ID -> file key for recorded chunks whose point was never written."""
+        out: Dict[str, str] = {}
+        for key, rec in self.files.items():
+            written = set(rec.get("points") or [])
+            for pid in self.point_ids(key, rec.get("chunks") or []):
+                if pid not in written:
+                    out[pid] = key
+        return out
+
+    def stale_points(self, keys: Iterable[str]) -> List[str]:
+        out: List[str] = []
+        for key in keys:
+            out.extend((self.files.get(key) or {}).get("points") or [])
+        return out
+
+    # ---------- updates (call save() once the store reflects them) ----------
+
+    def record(
+        self,
+        key: str,
+        *,
+        path: str,
+        sha256: str,
+        chunks: List[str],
+        points: List[str],
+        payloads: Optional[List[str]] = None,
+    ) -> None:
+        kind = key.split(":", 1)[0]
+        self.files[key] = {"kind": kind, "path": path, "sha256": sha256, "chunks": chunks, "points": points}
+        if payloads is not None:
+            self.files[key]["payloads"] = payloads
+
+    def add_points(self, points: Iterable[str]) -> int:
+        """Mark points written after the fact (dead-letter replay); returns how many matched."""
+        missing = self.missing_points()
+        by_key: Dict[str, set] = {}
+        for pid in points:
+            if pid in missing:
+                by_key.setdefault(missing[pid], set()).add(pid)
+        for key, new in by_key.items():
+            rec = self.files[key]
+            have = set(rec.get("points") or []) | new
+            rec["points"] = [pid for pid in self.point_ids(key, rec["chunks"]) if pid in have]
+        return sum(len(v) for v in by_key.values())
+
+    def forget(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self.files.pop(key, None)
+
+    def reset(self) -> None:
+        """Forget every file and remove the saved manifest (full re-index of the scope)."""
+        self.files = {}
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _slug(s: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", s or "") or "_"
@@ -0,0 +1,157 @@
+# server/pipeline/streaming.py
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Max items waiting between two stages (rows, chunks or embedded batches).
+STREAM_QUEUE_SIZE = int(os.getenv("DFMEA_STREAM_QUEUE_SIZE", "64"))
+
+_DONE = object()
+_POLL_SEC = 0.2
+
+
+@dataclass
+class StageStats:
+    name: str
+    items: int = 0          # items the stage emitted
+    busy_sec: float = 0.0   # time spent working (excludes waiting on either queue)
+    wall_sec: float = 0.0   # first input to last output
+
+    def as_dict(self) -> Dict[str, Any]:
+        rate = self.items / self.busy_sec if self.busy_sec else 0.0
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "busy_sec": round(self.busy_sec, 3),
+            "wall_sec": round(self.wall_sec, 3),
+            "items_per_sec": round(rate, 1),
+        }
+
+
+class _Stop(Exception):
+    pass
+
+
+class BoundedPipeline:
+    """
+    Chain of generator stages, each in its own thread, connected by bounded queues.
+
+    A stage is fn(iterator) -> iterator. A full queue blocks the producer
+    (backpressure), so at most `maxsize` items wait between any two stages and memory
+    stays flat however large the input is. The first exception in any stage stops all
+    stages and is re-raised from run().
+
+        pipe = BoundedPipeline(maxsize=32)
+        pipe.add("chunk", chunker.iter_chunks)
+        pipe.add("embed", embedder.iter_embed)
+        pipe.add("upsert", lambda batches: (store.upsert(b) for b in batches))
+        n_batches, stats = pipe.run(rows)
+    """
+
+    def __init__(self, maxsize: int = STREAM_QUEUE_SIZE):
+        self.maxsize = max(1, int(maxsize))
+        self.stages: List[Tuple[str, Callable[[Iterator[Any]], Iterable[Any]]]] = []
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+
+    def add(self, name: str, fn: Callable[[Iterator[Any]], Iterable[Any]]) -> "BoundedPipeline":
+        self.stages.append((name, fn))
+        return self
+
+    def run(self, source: Iterable[Any], *, sink: Optional[Callable[[Any], None]] = None) -> Tuple[int, List[StageStats]]:
+        """
+        Feed `source` through all stages. Outputs of the last stage go to `sink` (if
+        given) as they arrive. Returns (number of final outputs, per-stage stats); the
+        first stage's stats describe reading the source.
+        """
+        self._stop.clear()
+        self._errors = []
+        queues = [queue.Queue(maxsize=self.maxsize) for _ in range(len(self.stages) + 1)]
+        stats = [StageStats("source")] + [StageStats(name) for name, _ in self.stages]
+
+        threads = [threading.Thread(
+            target=self._pump, args=(lambda _: iter(source), None, queues[0], stats[0]),
+            name="stream-source", daemon=True,
+        )]
+        for i, (name, fn) in enumerate(self.stages):
+            threads.append(threading.Thread(
+                target=self._pump, args=(fn, queues[i], queues[i + 1], stats[i + 1]),
+                name=f"stream-{name}", daemon=True,
+            ))
+        for t in threads:
+            t.start()
+
+        n = 0
+        try:
+            for item in self._drain(queues[-1], None):
+                if sink is not None:
+                    sink(item)
+                n += 1
+        except BaseException as e:
+            self._fail(e)
+        for t in threads:
+            t.join()
+        if self._errors:
+            raise self._errors[0]
+        return n, stats
+
+    # ---------- internals ----------
+
+    def _fail(self, e: BaseException) -> None:
+        if not isinstance(e, _Stop):
+            self._errors.append(e)
+        self._stop.set()
+
+    def _put(self, q: queue.Queue, item: Any) -> None:
+        while True:
+            if self._stop.is_set():
+                raise _Stop()
+            try:
+                q.put(item, timeout=_POLL_SEC)
+                return
+            except queue.Full:
+                continue
+
+    def _drain(self, q: queue.Queue, waited: Optional[List[float]]) -> Iterator[Any]:
+        while True:
+            t0 = time.perf_counter()
+            try:
+                item = q.get(timeout=_POLL_SEC)
+            except queue.Empty:
+                if self._stop.is_set():
+                    raise _Stop()
+                continue
+            finally:
+                if waited is not None:
+                    waited[0] += time.perf_counter() - t0
+            if item is _DONE:
+                return
+            yield item
+
+    def _pump(self, fn, q_in: Optional[queue.Queue], q_out: queue.Queue, st: StageStats) -> None:
+        waited = [0.0]
+        start = None
+        try:
+            out = iter(fn(self._drain(q_in, waited) if q_in is not None else None))
+            while True:
+                t0 = time.perf_counter()
+                w0 = waited[0]
+                try:
+                    item = next(out)
+                except StopIteration:
+                    st.busy_sec += time.perf_counter() - t0 - (waited[0] - w0)
+                    break
+                st.busy_sec += time.perf_counter() - t0 - (waited[0] - w0)
+                if start is None:
+                    start = t0
+                st.items += 1
+                self._put(q_out, item)
+                st.wall_sec = time.perf_counter() - start
+            self._put(q_out, _DONE)
+        except BaseException as e:
+            self._fail(e)
@@ -0,0 +1,136 @@
+# server/utils/dim_reduction.py
+from __future__ import annotations
+
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+METHODS = ("native", "api", "truncate", "pca")
+
+
+@dataclass
+class DimReductionConfig:
+    dims: int = int(os.getenv("EMBED_DIMENSIONS", "0"))              # 0 = the model's native size
+    method: str = os.getenv("EMBED_DIM_METHOD", "auto").lower()      # auto | api | truncate | pca
+    pca_path: str = os.getenv("EMBED_PCA_PATH", "")                  # .npz from fit_pca() (method=pca)
+
+
+class DimReduction:
+    """
+    How stored vectors are shrunk below the model's native size.
+
+      native   : no reduction
+      api      : the backend returns `dims`-sized vectors (Azure text-embedding-3
+                 `dimensions`); nothing to do locally
+      truncate : keep the first `dims` components and re-normalize (Matryoshka-trained
+                 models put most information first)
+      pca      : center and project on a fitted PCA basis (fit_pca), then re-normalize;
+                 works for any model at the cost of a fit on a corpus sample
+
+    Queries must go through the same reduction as the collection's points, so
+    `as_dict()` is recorded with the collection (see VectorStoreAgent).
+    """
+
+    def __init__(self, method: str = "native", dims: int = 0, pca_path: str = ""):
+        if method not in METHODS:
+            raise ValueError(f"Unknown dimension reduction {method!r} ({' | '.join(METHODS)})")
+        if method != "native" and dims <= 0:
+            raise ValueError(f"Dimension reduction {method!r} needs dims > 0")
+        self.method = method
+        self.dims = dims if method != "native" else 0
+        self.pca_path = pca_path
+        self._mean: Optional[np.ndarray] = None
+        self._basis: Optional[np.ndarray] = None
+        if method == "pca":
+            if not pca_path:
+                raise ValueError("Dimension reduction 'pca' needs EMBED_PCA_PATH (see fit_pca)")
+            with np.load(pca_path) as f:
+                self._mean, self._basis = f["mean"], f["basis"][:dims]
+            if self._basis.shape[0] < dims:
+                raise ValueError(f"{pca_path} has only {self._basis.shape[0]} components, {dims} requested")
+
+    @classmethod
+    def from_config(cls, cfg: Optional[DimReductionConfig] = None, *, remote: bool = True) -> "DimReduction":
+        cfg = cfg or DimReductionConfig()
+        if cfg.dims <= 0:
+            return cls()
+        method = cfg.method
+        if method == "auto":
+            # hosted models take `dimensions`; local ones are truncated here
+            method = "api" if remote else "truncate"
+        return cls(method, cfg.dims, cfg.pca_path)
+
+    @property
+    def request_dims(self) -> int:
+        """Size to ask the backend for (0 = native); also the embedding-cache key, so
+        locally reduced vectors share the cached full-size ones."""
+        return self.dims if self.method == "api" else 0
+
+    def apply(self, vectors: np.ndarray) -> np.ndarray:
+        if self.method in ("native", "api") or not len(vectors):
+            return vectors
+        if self.method == "truncate":
+            out = np.array(vectors[:, : self.dims], dtype=np.float32)
+        else:
+            out = ((vectors - self._mean) @ self._basis.T).astype(np.float32)
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out
+
+    def as_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"method": self.method, "dims": self.dims}
+        if self.method == "pca":
+            out["pca_path"] = os.path.abspath(self.pca_path)
+        return out
+
+    def __repr__(self) -> str:
+        return f"DimReduction({self.method}, dims={self.dims})"
+
+
+def fit_pca(vectors: np.ndarray, dims: int, path: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    Fit a PCA basis (top `dims` right-singular vectors of the centered sample) on
+    full-size vectors; saves {"mean", "basis", "explained"} to `path` (.npz) if given.
+    """
+    x = np.asarray(vectors, dtype=np.float64)
+    if x.shape[0] < 2 or dims > x.shape[1]:
+        raise ValueError(f"Cannot fit {dims} components on a {x.shape[0]} x {x.shape[1]} sample")
+    mean = x.mean(axis=0)
+    _, s, vt = np.linalg.svd(x - mean, full_matrices=False)
+    var = s ** 2
+    fitted = {
+        "mean": mean.astype(np.float32),
+        "basis": vt[:dims].astype(np.float32),
+        "explained": (var[:dims].sum() / max(var.sum(), 1e-12)).astype(np.float32),
+    }
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez(path, **fitted)
+    return fitted
+
+
+# ---------- collection profile ----------
+
+def profile_path(profile_dir: str, collection: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", collection or "") or "_"
+    return os.path.join(profile_dir, f"{name}.collection.json")
+
+
+def load_profile(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def save_profile(path: str, profile: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(profile, fh, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
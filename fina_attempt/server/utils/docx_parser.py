@@ -3,7 +3,9 @@ from __future__ import annotations
 import os
 import re
 import io
-from typing import Dict, Iterator, List, Optional, Union
+import posixpath
+import zipfile
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 try:
     from docx import Document  # python-docx
@@ -12,6 +14,8 @@ except Exception as e:
         "python-docx is required for DOCX parsing. Install with: pip install python-docx"
     ) from e
 
+from lxml import etree  # ships with python-docx
+
 # Detect common requirement ID patterns seen in PRDs
 REQ_ID_REGEX = re.compile(
     r"\b(?:Quasar[-_ ]?\d{3,6}|REQ[-_ ]?\d{2,6}|QSR[-_ ]?\d{2,6})\b",
@@ -41,17 +45,18 @@ def _iter_paragraph_text(doc: Document) -> Iterator[str]:
             yield t
 
 def _iter_table_text(doc: Document) -> Iterator[str]:
+    # python-docx repeats a merged cell at every grid position it covers, so work on the
+    # underlying <w:tr>/<w:tc> elements instead (same logic as the streaming path)
     for tbl in doc.tables:
-        for r in tbl.rows:
-            for c in r.cells:
-                t = _clean(c.text)
-                if not _is_noise(t):
-                    yield t
+        rows = _TableRows()
+        for tr in tbl._tbl.tr_lst:
+            yield from rows.add(tr)
+        yield from rows.finish()
 
 def extract_docx_blocks(source: Union[str, io.BytesIO], include_tables: bool = True) -> List[str]:
     """
-    Return a flat list of text blocks from paragraphs (+ tables if enabled).
-    Accepts a file path or a BytesIO stream.
+    Return a flat list of text blocks from paragraphs (+ tables if enabled, one
+    "Header: value | ..." block per table row). Accepts a file path or a BytesIO stream.
     """
     if source is None:
         return []
@@ -75,10 +80,326 @@ def extract_docx_blocks(source: Union[str, io.BytesIO], include_tables: bool = T
         prev = b
     return deduped
 
+# ---------- streaming extraction (no python-docx object model) ----------
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_BODY = _W + "body"
+_W_P = _W + "p"
+_W_R = _W + "r"
+_W_HYPERLINK = _W + "hyperlink"
+_W_TBL = _W + "tbl"
+_W_TR = _W + "tr"
+_W_TC = _W + "tc"
+_W_VAL = _W + "val"
+_W_TYPE = _W + "type"
+
+# run inner-content -> text, mirroring python-docx's Run.text
+_RUN_TEXT = {
+    _W + "tab": "\t",
+    _W + "ptab": "\t",
+    _W + "cr": "\n",
+    _W + "noBreakHyphen": "-",
+}
+
+_OFFICE_DOC_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+_PKG_RELS = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+
+
+def _main_part_name(zf: zipfile.ZipFile) -> str:
+    """Resolve the main document part via _rels/.rels (usually word/document.xml)."""
+    try:
+        rels = etree.fromstring(zf.read("_rels/.rels"))
+        for rel in rels.iter(_PKG_RELS):
+            if rel.get("Type") == _OFFICE_DOC_REL:
+                return posixpath.normpath(rel.get("Target", "").lstrip("/"))
+    except KeyError:
+        pass
+    return "word/document.xml"
+
+
+def _run_text(r) -> str:
+    parts: List[str] = []
+    for e in r:
+        tag = e.tag
+        if tag == _W + "t":
+            parts.append(e.text or "")
+        elif tag == _W + "br":
+            # line breaks become newlines; page/column breaks carry no text
+            if e.get(_W_TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif tag in _RUN_TEXT:
+            parts.append(_RUN_TEXT[tag])
+    return "".join(parts)
+
+
+def _paragraph_text(p) -> str:
+    parts: List[str] = []
+    for e in p:
+        if e.tag == _W_R:
+            parts.append(_run_text(e))
+        elif e.tag == _W_HYPERLINK:
+            parts.extend(_run_text(r) for r in e if r.tag == _W_R)
+    return "".join(parts)
+
+
+def _cell_text(tc) -> str:
+    return "\n".join(_paragraph_text(p) for p in tc if p.tag == _W_P)
+
+
+def _prop_int(el, prop_tag: str, child_tag: str, default: int) -> int:
+    props = el.find(prop_tag)
+    node = props.find(child_tag) if props is not None else None
+    if node is None:
+        return default
+    try:
+        return int(node.get(_W_VAL, default))
+    except ValueError:
+        return default
+
+
+def _vmerge(tc) -> Optional[str]:
+    props = tc.find(_W + "tcPr")
+    node = props.find(_W + "vMerge") if props is not None else None
+    if node is None:
+        return None
+    return node.get(_W_VAL, "continue")
+
+
+def _row_cells(tr) -> List[Tuple[int, str, bool]]:
+    """
+    One (grid offset, text, continues_above) per <w:tc> of a row — i.e. per underlying
+    cell, however many grid columns it spans. continues_above marks vMerge="continue"
+    cells, whose content belongs to the cell above.
+    """
+    cells: List[Tuple[int, str, bool]] = []
+    offset = _prop_int(tr, _W + "trPr", _W + "gridBefore", 0)
+    for tc in tr:
+        if tc.tag != _W_TC:
+            continue
+        span = max(1, _prop_int(tc, _W + "tcPr", _W + "gridSpan", 1))
+        cont = _vmerge(tc) == "continue"
+        cells.append((offset, "" if cont else _cell_text(tc), cont))
+        offset += span
+    return cells
+
+
+_OFF = ("0", "false", "off")
+
+
+def _is_repeat_header(tr) -> bool:
+    """Row marked "repeat as header row at the top of each page" (w:tblHeader)."""
+    props = tr.find(_W + "trPr")
+    node = props.find(_W + "tblHeader") if props is not None else None
+    return node is not None and node.get(_W_VAL, "true") not in _OFF
+
+
+def _is_emphasized(tc) -> bool:
+    """Cell shaded, or every run with text in it bold — typical header-cell formatting."""
+    props = tc.find(_W + "tcPr")
+    shd = props.find(_W + "shd") if props is not None else None
+    if shd is not None and shd.get(_W + "fill", "auto").lower() not in ("auto", "ffffff"):
+        return True
+    runs = [r for r in tc.iter(_W_R) if _run_text(r).strip()]
+    for r in runs:
+        rpr = r.find(_W + "rPr")
+        b = rpr.find(_W + "b") if rpr is not None else None
+        if b is None or b.get(_W_VAL, "true") in _OFF:
+            return False
+    return bool(runs)
+
+
+def _row_emphasized(tr) -> bool:
+    cells = [tc for tc in tr if tc.tag == _W_TC and _cell_text(tc).strip()]
+    return bool(cells) and all(_is_emphasized(tc) for tc in cells)
+
+
+class _TableRows:
+    """
+    Turns the rows of one table into one text block per logical row.
+
+    The first row is the header when it looks like one: marked as a repeating header
+    row, formatted unlike the row below it (bold/shaded), or — unmarked — the table
+    is wider than two columns. Every later row then becomes "Header: value | Header:
+    value" with each underlying cell read once (spanned and vertically merged cells
+    are not repeated); a table with no data rows yields its header cells as a single
+    block. An unmarked two-column table is a key/value list ("Field | Value"): every
+    row, the first included, becomes "Field: value".
+    """
+
+    def __init__(self):
+        self.header: Optional[List[Tuple[int, str]]] = None
+        self.kv = False
+        # row 0 is held back until the next row shows whether it is a header
+        self.first: Optional[Tuple[List[Tuple[int, str, bool]], bool, bool]] = None
+        self.key = ""
+        self.rows = 0
+
+    def _key(self, offset: int) -> str:
+        key = ""
+        for start, name in self.header or []:
+            if start > offset:
+                break
+            key = name
+        return key
+
+    def record(self, cells: List[Tuple[int, str, bool]]) -> Dict[str, str]:
+        """Header -> value for one data row (merged header cells join their values with ' / ')."""
+        rec: Dict[str, str] = {}
+        for offset, raw, cont in cells:
+            t = _clean(raw)
+            if cont or not t:
+                continue
+            key = self._key(offset) or f"Column {offset + 1}"
+            rec[key] = f"{rec[key]} / {t}" if key in rec else t
+        return rec
+
+    def pair(self, cells: List[Tuple[int, str, bool]]) -> str:
+        """One key/value row as "Field: value" (a key merged down carries over)."""
+        if cells and cells[0][2]:
+            key, values = self.key, cells[1:]
+        else:
+            key, values = (_clean(cells[0][1]), cells[1:]) if cells else ("", [])
+            self.key = key
+        vals = [v for v in (_clean(raw) for _, raw, cont in values if not cont) if v]
+        if not vals:
+            return key
+        return f"{key}: {' / '.join(vals)}" if key else " / ".join(vals)
+
+    def _row(self, cells: List[Tuple[int, str, bool]]) -> Iterator[str]:
+        self.rows += 1
+        if self.kv:
+            t = self.pair(cells)
+        else:
+            t = " | ".join(f"{k}: {v}" for k, v in self.record(cells).items())
+        if not _is_noise(t):
+            yield t
+
+    def _resolve(self, next_emphasized: bool) -> Iterator[str]:
+        cells, repeat, emphasized = self.first
+        self.first = None
+        if repeat or (emphasized and not next_emphasized) or len(cells) != 2:
+            self.header = [(offset, _clean(raw)) for offset, raw, _ in cells]
+        else:
+            self.kv = True
+            yield from self._row(cells)
+
+    def add(self, tr) -> Iterator[str]:
+        cells = _row_cells(tr)
+        if self.header is None and not self.kv and self.first is None:
+            self.first = (cells, _is_repeat_header(tr), _row_emphasized(tr))
+            return
+        if self.first is not None:
+            yield from self._resolve(_row_emphasized(tr))
+        yield from self._row(cells)
+
+    def finish(self) -> Iterator[str]:
+        if self.first is not None:
+            yield from self._resolve(False)
+        if self.header and not self.rows:
+            t = " | ".join(name for _, name in self.header if name)
+            if not _is_noise(t):
+                yield t
+
+
+def _iter_body_elements(zf: zipfile.ZipFile, part: str) -> Iterator[Tuple[str, object]]:
+    """
+    Incrementally parse the document part and yield ("p", elem) for body-level paragraphs
+    and ("tr", elem) for rows of body-level tables; ("tbl", None) marks the end of a table.
+    Elements are cleared once consumed, so memory stays bounded by the largest row.
+    """
+    depth: List[str] = []
+    with zf.open(part) as fh:
+        for event, el in etree.iterparse(fh, events=("start", "end"), huge_tree=True):
+            if event == "start":
+                depth.append(el.tag)
+                continue
+            depth.pop()
+            parent = depth[-1] if depth else None
+            if parent == _W_BODY:
+                if el.tag == _W_P:
+                    yield "p", el
+                elif el.tag == _W_TBL:
+                    yield "tbl", None
+            elif el.tag == _W_TR and parent == _W_TBL and len(depth) >= 2 and depth[-2] == _W_BODY:
+                yield "tr", el
+            else:
+                continue
+            el.clear(keep_tail=False)
+            prev = el.getprevious()
+            while prev is not None:
+                el.getparent().remove(prev)
+                prev = el.getprevious()
+
+
+def _stream_paragraph_text(zf: zipfile.ZipFile, part: str) -> Iterator[str]:
+    for kind, el in _iter_body_elements(zf, part):
+        if kind == "p":
+            t = _clean(_paragraph_text(el))
+            if not _is_noise(t):
+                yield t
+
+
+def _stream_table_text(zf: zipfile.ZipFile, part: str) -> Iterator[str]:
+    rows = _TableRows()
+    for kind, el in _iter_body_elements(zf, part):
+        if kind == "tbl":
+            yield from rows.finish()
+            rows = _TableRows()
+        elif kind == "tr":
+            yield from rows.add(el)
+
+
+def iter_docx_blocks(source: Union[str, io.BytesIO], include_tables: bool = True) -> Iterator[str]:
+    """
+    Streaming twin of extract_docx_blocks(): same blocks in the same order, but reads the
+    document XML incrementally instead of loading the python-docx object model.
+    Paragraphs come first, then one block per table row (two passes over the zip member).
+    """
+    if source is None:
+        return
+    if isinstance(source, str):
+        if not os.path.exists(source):
+            return
+    else:
+        source.seek(0)
+
+    with zipfile.ZipFile(source) as zf:
+        part = _main_part_name(zf)
+        prev = None
+        for b in _stream_paragraph_text(zf, part):
+            if b != prev:
+                yield b
+            prev = b
+        if include_tables:
+            for b in _stream_table_text(zf, part):
+                if b != prev:
+                    yield b
+                prev = b
+
+
 def detect_requirement_id(text: str) -> Optional[str]:
     m = REQ_ID_REGEX.search(text or "")
     return m.group(0) if m else None
 
+
+def _resolve_file_name(source: Union[str, io.BytesIO], file_label: Optional[str]) -> str:
+    file_name = file_label or (source if isinstance(source, str) else "uploaded.docx")
+    if isinstance(file_name, str):
+        file_name = os.path.basename(file_name)
+    return file_name
+
+
+def _block_row(t: str, i: int, *, product: str, subproduct: str, file_name: str) -> Dict:
+    return {
+        "product": product,
+        "subproduct": subproduct,
+        "source_type": "prd",
+        "file": file_name,
+        "idx": i,
+        "text": t,
+        "requirement_id": detect_requirement_id(t),
+    }
+
 def parse_docx_to_rows(
     source: Union[str, io.BytesIO],
     *,
@@ -96,25 +417,31 @@ def parse_docx_to_rows(
     # Backward-compat param mapping
     if source_name and not file_label:
         file_label = source_name
-
-    file_name = file_label or (source if isinstance(source, str) else "uploaded.docx")
-    if isinstance(file_name, str):
-        file_name = os.path.basename(file_name)
+    file_name = _resolve_file_name(source, file_label)
 
     blocks = extract_docx_blocks(source, include_tables=include_tables)
-    out: List[Dict] = []
-    for i, t in enumerate(blocks):
-        rid = detect_requirement_id(t)
-        out.append(
-            {
-                "product": product,
-                "subproduct": subproduct,
-                "source_type": "prd",
-                "file": file_name,
-                "idx": i,
-                "text": t,
-                "requirement_id": rid,
-            }
-        )
-    return out
+    return [
+        _block_row(t, i, product=product, subproduct=subproduct, file_name=file_name)
+        for i, t in enumerate(blocks)
+    ]
+
+def iter_docx_rows(
+    source: Union[str, io.BytesIO],
+    *,
+    product: str = "unknown",
+    subproduct: str = "unknown",
+    file_label: Optional[str] = None,
+    include_tables: bool = True,
+    source_name: Optional[str] = None,
+) -> Iterator[Dict]:
+    """
+    Generator version of parse_docx_to_rows() backed by iter_docx_blocks().
+    Yields identical rows without ever holding the whole document in memory.
+    """
+    if source_name and not file_label:
+        file_label = source_name
+    file_name = _resolve_file_name(source, file_label)
+
+    for i, t in enumerate(iter_docx_blocks(source, include_tables=include_tables)):
+        yield _block_row(t, i, product=product, subproduct=subproduct, file_name=file_name)
 
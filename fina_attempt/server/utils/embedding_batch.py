@@ -0,0 +1,217 @@
+# server/utils/embedding_batch.py
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+_MISSING = object()
+
+_ROW_KEYS = ("text", "embedding", "vector", "metadata", "tokens")
+
+
+class EmbeddingBatch:
+    """
+    Embedded records in columnar form.
+
+        vectors  : float32 ndarray (N x D), C-contiguous
+        texts    : list[str]
+        tokens   : int32 ndarray (N,)
+        ids      : list of point IDs (None = let the store assign one)
+        columns  : metadata as {key: [value per row]}; rows lacking a key hold a sentinel
+
+    Indexing yields EmbeddingRow views (no copies). A row also reads like the old
+    record dict ({"text","embedding","vector","metadata","tokens"[, "id"]}), converting
+    its vector to a list only when accessed that way, so list-of-dict callers keep
+    working. Slicing returns a batch sharing the same vector memory.
+    """
+
+    __slots__ = ("vectors", "texts", "tokens", "ids", "columns")
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        texts: List[str],
+        metadata: Union[Sequence[Dict[str, Any]], Dict[str, List[Any]], None] = None,
+        tokens: Optional[Sequence[int]] = None,
+        ids: Optional[List[Any]] = None,
+    ):
+        n = len(texts)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2:
+            vectors = vectors.reshape(n, -1) if n else np.zeros((0, 0), np.float32)
+        if vectors.shape[0] != n:
+            raise ValueError(f"{vectors.shape[0]} vector(s) for {n} text(s)")
+        self.vectors = vectors
+        self.texts = list(texts)
+        self.tokens = np.asarray(tokens if tokens is not None else np.zeros(n), dtype=np.int32)
+        self.ids = list(ids) if ids is not None else [None] * n
+        if isinstance(metadata, dict):
+            self.columns = metadata
+        else:
+            self.columns = _to_columns(metadata or [{} for _ in range(n)])
+
+    # ---------- construction ----------
+
+    @classmethod
+    def empty(cls, dim: int = 0) -> "EmbeddingBatch":
+        return cls(np.zeros((0, dim), np.float32), [])
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping[str, Any]]) -> "EmbeddingBatch":
+        """From old-style dicts ({"text", "vector"|"embedding", "metadata", "tokens", "id"?})."""
+        recs = list(records)
+        if not recs:
+            return cls.empty()
+        vecs = [r.get("vector") if r.get("vector") is not None else r.get("embedding") for r in recs]
+        return cls(
+            np.asarray(vecs, dtype=np.float32),
+            [r.get("text", "") for r in recs],
+            [r.get("metadata") or {} for r in recs],
+            [r.get("tokens", 0) for r in recs],
+            [r.get("id") for r in recs],
+        )
+
+    @classmethod
+    def concat(cls, batches: Iterable["EmbeddingBatch"]) -> "EmbeddingBatch":
+        parts = [b for b in batches if len(b)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+        keys: List[str] = []
+        for b in parts:
+            keys.extend(k for k in b.columns if k not in keys)
+        columns = {
+            k: [v for b in parts for v in b.columns.get(k, [_MISSING] * len(b))]
+            for k in keys
+        }
+        return cls(
+            np.concatenate([b.vectors for b in parts]),
+            [t for b in parts for t in b.texts],
+            columns,
+            np.concatenate([b.tokens for b in parts]),
+            [i for b in parts for i in b.ids],
+        )
+
+    # ---------- access ----------
+
+    @property
+    def dim(self) -> int:
+        return int(self.vectors.shape[1]) if self.vectors.ndim == 2 else 0
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.vectors.nbytes + self.tokens.nbytes)
+
+    def meta(self, i: int) -> Dict[str, Any]:
+        """Metadata dict of row i (a fresh dict; edits do not write back)."""
+        return {k: col[i] for k, col in self.columns.items() if col[i] is not _MISSING}
+
+    def payloads(self) -> Iterator[Dict[str, Any]]:
+        """Vector-store payload per row: {"text", **metadata}."""
+        for i, text in enumerate(self.texts):
+            yield {"text": text, **self.meta(i)}
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """The old list-of-dicts shape (vectors as Python lists)."""
+        return [row.to_dict() for row in self]
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __iter__(self) -> Iterator["EmbeddingRow"]:
+        for i in range(len(self.texts)):
+            yield EmbeddingRow(self, i)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return EmbeddingBatch(
+                self.vectors[i],
+                self.texts[i],
+                {k: col[i] for k, col in self.columns.items()},
+                self.tokens[i],
+                self.ids[i],
+            )
+        n = len(self.texts)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(i)
+        return EmbeddingRow(self, i)
+
+    def __repr__(self) -> str:
+        return f"EmbeddingBatch(n={len(self)}, dim={self.dim})"
+
+
+class EmbeddingRow(Mapping):
+    """One row of an EmbeddingBatch. Attributes are zero-copy; mapping access is the old record shape."""
+
+    __slots__ = ("_batch", "_i")
+
+    def __init__(self, batch: EmbeddingBatch, i: int):
+        self._batch = batch
+        self._i = i
+
+    @property
+    def vector(self) -> np.ndarray:
+        return self._batch.vectors[self._i]
+
+    @property
+    def text(self) -> str:
+        return self._batch.texts[self._i]
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self._batch.meta(self._i)
+
+    @property
+    def tokens(self) -> int:
+        return int(self._batch.tokens[self._i])
+
+    @property
+    def id(self) -> Any:
+        return self._batch.ids[self._i]
+
+    def _keys(self) -> tuple:
+        return _ROW_KEYS + ("id",) if self.id is not None else _ROW_KEYS
+
+    def __getitem__(self, key: str) -> Any:
+        if key in ("vector", "embedding"):
+            return self.vector.tolist()
+        if key == "id" and self.id is None:
+            raise KeyError(key)
+        if key in _ROW_KEYS or key == "id":
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        # only the point ID is assignable (incremental indexing sets deterministic IDs)
+        if key != "id":
+            raise TypeError(f"EmbeddingRow field {key!r} is read-only")
+        self._batch.ids[self._i] = value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys())
+
+    def __len__(self) -> int:
+        return len(self._keys())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: self[k] for k in self._keys()}
+
+    def __repr__(self) -> str:
+        return f"EmbeddingRow({self._i}, text={self.text[:40]!r})"
+
+
+def _to_columns(metas: Sequence[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    n = len(metas)
+    columns: Dict[str, List[Any]] = {}
+    for i, m in enumerate(metas):
+        for k, v in (m or {}).items():
+            col = columns.get(k)
+            if col is None:
+                col = columns[k] = [_MISSING] * n
+            col[i] = v
+    return columns
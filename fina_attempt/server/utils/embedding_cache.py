@@ -0,0 +1,206 @@
+# server/utils/embedding_cache.py
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "dfmea_embed_cache", "embeddings.sqlite")
+
+# SQLite's default limit on host parameters is 999 on older builds
+_IN_CHUNK = 500
+# Evict down to this fraction of max_bytes so eviction doesn't run on every put
+_EVICT_TO = 0.9
+
+
+@dataclass
+class EmbeddingCacheConfig:
+    enabled: bool = os.getenv("DFMEA_EMBED_CACHE", "1") == "1"
+    path: str = os.getenv("DFMEA_EMBED_CACHE_PATH", DEFAULT_CACHE_PATH)
+    max_bytes: int = int(float(os.getenv("DFMEA_EMBED_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+
+
+@dataclass
+class EmbeddingCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    def as_counts(self) -> Dict[str, int]:
+        return {"embed_cache_hits": self.hits, "embed_cache_misses": self.misses}
+
+
+class EmbeddingCache:
+    """
+    Persistent text -> vector cache shared by every collection and subproduct.
+
+    Key   = (deployment, dimensions, sha256(text)); dimensions 0 = the model's native size
+    Value = the vector as a packed float32 blob, in one SQLite table (WAL mode, so
+            several indexing processes can share the file).
+
+    The table is bounded by `max_bytes` of vector data; least-recently-used rows (a hit
+    refreshes its timestamp) are evicted first. Any SQLite problem is treated as a miss
+    and logged once, so the cache can never fail an indexing run.
+    """
+
+    def __init__(self, cfg: Optional[EmbeddingCacheConfig] = None):
+        self.cfg = cfg or EmbeddingCacheConfig()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._bytes = 0
+        self._warned = False
+        if self.cfg.enabled:
+            try:
+                self._open()
+            except Exception as e:
+                self._fail("open", e)
+
+    # ---------- keys ----------
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.sha256((text or "").encode("utf-8")).digest()
+
+    # ---------- public api ----------
+
+    def get_many(
+        self,
+        model: str,
+        dims: int,
+        texts: Sequence[str],
+        stats: Optional[EmbeddingCacheStats] = None,
+    ) -> List[Optional[np.ndarray]]:
+        """Cached float32 vector per text (None on a miss), in input order."""
+        out: List[Optional[np.ndarray]] = [None] * len(texts)
+        if self._conn is not None and texts:
+            keys = [self.key(t) for t in texts]
+            found: Dict[bytes, bytes] = {}
+            try:
+                with self._lock:
+                    for i in range(0, len(keys), _IN_CHUNK):
+                        part = list(set(keys[i:i + _IN_CHUNK]))
+                        rows = self._conn.execute(
+                            f"SELECT sha, vec FROM vectors WHERE model = ? AND dims = ? "
+                            f"AND sha IN ({','.join('?' * len(part))})",
+                            (model, int(dims), *part),
+                        ).fetchall()
+                        found.update(rows)
+                    if found:
+                        now = time.time()
+                        self._conn.executemany(
+                            "UPDATE vectors SET used = ? WHERE model = ? AND dims = ? AND sha = ?",
+                            [(now, model, int(dims), k) for k in found],
+                        )
+                        self._conn.commit()
+            except Exception as e:
+                self._fail("read", e)
+                found = {}
+            for i, k in enumerate(keys):
+                blob = found.get(k)
+                if blob is not None:
+                    out[i] = np.frombuffer(blob, dtype=np.float32)
+        if stats is not None:
+            hits = sum(v is not None for v in out)
+            stats.hits += hits
+            stats.misses += len(out) - hits
+        return out
+
+    def put_many(self, model: str, dims: int, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> int:
+        """Store vectors for texts; returns how many rows were written."""
+        if self._conn is None or not texts:
+            return 0
+        now = time.time()
+        rows = []
+        for t, v in zip(texts, vectors):
+            blob = np.asarray(v, dtype=np.float32).tobytes()
+            rows.append((model, int(dims), self.key(t), blob, len(blob), now))
+        try:
+            with self._lock:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO vectors (model, dims, sha, vec, bytes, used) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.commit()
+                written = self._conn.total_changes - before
+                if written:
+                    # rows of one call share a vector size; existing keys were ignored
+                    self._bytes += written * rows[0][4]
+                if self._bytes > self.cfg.max_bytes:
+                    self._evict()
+        except Exception as e:
+            self._fail("write", e)
+            return 0
+        return written
+
+    def clear(self) -> None:
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM vectors")
+            self._conn.commit()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        if self._conn is None:
+            return 0
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    # ---------- internals ----------
+
+    def _open(self) -> None:
+        os.makedirs(os.path.dirname(self.cfg.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.cfg.path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            " model TEXT NOT NULL, dims INTEGER NOT NULL, sha BLOB NOT NULL,"
+            " vec BLOB NOT NULL, bytes INTEGER NOT NULL, used REAL NOT NULL,"
+            " UNIQUE (model, dims, sha))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS vectors_used ON vectors (used)")
+        conn.commit()
+        self._bytes = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM vectors").fetchone()[0]
+        self._conn = conn
+
+    def _evict(self) -> None:
+        # caller holds the lock; re-read the total, other processes may have written
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM vectors").fetchone()[0]
+        target = int(self.cfg.max_bytes * _EVICT_TO)
+        if self._bytes <= target:
+            return
+        drop, freed = [], 0
+        for rowid, size in self._conn.execute("SELECT rowid, bytes FROM vectors ORDER BY used"):
+            drop.append((rowid,))
+            freed += size
+            if self._bytes - freed <= target:
+                break
+        self._conn.executemany("DELETE FROM vectors WHERE rowid = ?", drop)
+        self._conn.commit()
+        self._bytes -= freed
+
+    def _fail(self, what: str, e: Exception) -> None:
+        if not self._warned:
+            print(f"[EmbeddingCache] {what} failed, treating as a miss: {type(e).__name__}: {e}")
+            self._warned = True
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide EmbeddingCache built from env config."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
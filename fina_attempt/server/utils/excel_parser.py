@@ -1,22 +1,58 @@
 # server/utils/excel_parser.py
 from __future__ import annotations
 
+import codecs
 import io
 import os
-from typing import Iterable, List, Dict, Any, Optional, Tuple
+from collections import defaultdict
+from typing import Callable, Iterable, Iterator, List, Dict, Any, Optional
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from lxml import etree  # ships with python-docx
+from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet._reader import ROW_TAG, WorkSheetParser
+from openpyxl.xml.constants import SHEET_MAIN_NS
+
+# Columns df_to_field_issue_rows() may read (lower-cased); kept by CSV column projection.
+FIELD_ISSUE_COLS = ("product", "subsystem", "sub_product", "subproduct", "component",
+                    "fault_code", "code", "fault_type", "type")
+
+# pd.read_csv's default na_values: cells every text loader reads as missing.
+NA_STRINGS = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+})
+
+# Arrow CSV streaming: size of each read block, and the file size from which
+# loaders switch to it automatically (DFMEA_CSV_ENGINE=auto).
+CSV_BLOCK_BYTES = int(float(os.getenv("DFMEA_CSV_BLOCK_MB", "16")) * 1024 * 1024)
+CSV_STREAM_MIN_BYTES = int(float(os.getenv("DFMEA_CSV_STREAM_MB", "64")) * 1024 * 1024)
+CSV_ENGINE = os.getenv("DFMEA_CSV_ENGINE", "auto").lower()   # auto | arrow | pandas
+CSV_FALLBACK_ENCODING = "latin-1"  # non-UTF-8 exports, as _read_csv_safely retries
+CSV_BLOCK_BYTES_MAX = 1 << 30      # cap when a multi-line record outgrows the block
+
+# Read-only XLSX streaming: rows per emitted frame, and the file size from which
+# loaders switch to it automatically (DFMEA_XLSX_ENGINE=auto).
+XLSX_BATCH_ROWS = int(os.getenv("DFMEA_XLSX_BATCH_ROWS", "20000"))
+XLSX_STREAM_MIN_BYTES = int(float(os.getenv("DFMEA_XLSX_STREAM_MB", "4")) * 1024 * 1024)
+XLSX_ENGINE = os.getenv("DFMEA_XLSX_ENGINE", "auto").lower()  # auto | stream | pandas
 
 
 # ---------- public api ----------
 
-def parse_excel_or_csv(path: str, sheet: str | int | None = None) -> pd.DataFrame:
+def parse_excel_or_csv(path: str, sheet: str | int | None = None, *, as_text: bool = False) -> pd.DataFrame:
     """
     Load a CSV/XLSX/XLS into a pandas DataFrame with light cleanup.
 
     - Picks a sensible sheet in Excel if 'sheet' is None:
         * 'Sheet1' if present, else the first visible sheet
-    - Trims column names and keeps dtypes as pandas infers.
+    - Trims column names and keeps dtypes as pandas infers, or with as_text=True
+      reads every cell as its text (missing → NaN), which is what the streaming
+      CSV/XLSX readers produce.
     - Returns an empty DataFrame if file not found.
 
     Raises ValueError for unsupported extensions.
@@ -25,11 +61,12 @@ def parse_excel_or_csv(path: str, sheet: str | int | None = None) -> pd.DataFram
         return pd.DataFrame()
 
     low = path.lower()
+    kw = {"dtype": str} if as_text else {}
     try:
         if low.endswith(".csv"):
-            df = _read_csv_safely(path)
+            df = _read_csv_safely(path, **kw)
         elif low.endswith(".xlsx") or low.endswith(".xls"):
-            df = _read_excel_safely(path, sheet=sheet)
+            df = _read_excel_safely(path, sheet=sheet, **kw)
         else:
             raise ValueError(f"Unsupported file type: {path}")
     except Exception as e:
@@ -52,11 +89,7 @@ def detect_preferred_text_column(
     """
     if df is None or df.empty:
         return None
-    lower_map = {str(c).strip().lower(): c for c in df.columns}
-    for key in preferences:
-        if key.lower() in lower_map:
-            return lower_map[key.lower()]
-    return None
+    return _match_column(df.columns, preferences)
 
 
 def df_to_normalized_rows(
@@ -84,60 +117,610 @@ def df_to_normalized_rows(
     if df is None or df.empty:
         return []
 
-    out: List[Dict[str, Any]] = []
     pref = detect_preferred_text_column(df, text_pref_cols)
-
-    for i, row in df.iterrows():
-        if pref is not None:
-            val = row.get(pref)
-            text = str(val) if pd.notna(val) else ""
+    if pref is not None:
+        col = df[pref]
+        keep = col.notna().to_numpy()
+        texts = column_as_str(col[keep]).str.strip()
+    else:
+        # fallback: stringify each row dict (stable col order), boxing values the same
+        # way iterrows() does: numeric-only frames upcast to one numpy dtype, anything
+        # else becomes pandas/Python scalars
+        cols = list(df.columns)
+        if all(dt.kind in "biufc" for dt in df.dtypes):
+            values = df.to_numpy()
         else:
-            # fallback: stringify the row dict (stable col order)
-            text = str({c: row.get(c) for c in df.columns})
+            values = df.astype(object).to_numpy()
+        texts = pd.Series(
+            [str(dict(zip(cols, vals))).strip() for vals in values],
+            index=df.index,
+            dtype=object,
+        )
 
-        text = (text or "").strip()
-        if not text:
-            continue
+    texts = texts[texts != ""]
+    if texts.empty:
+        return []
 
-        out.append({
+    base = os.path.basename(file_name)
+    return [
+        {
             "product": product,
             "subproduct": subproduct,
             "source_type": source_type,
-            "file": os.path.basename(file_name),
-            "idx": int(i),
-            "text": text,
-        })
-    return out
+            "file": base,
+            "idx": i,
+            "text": t,
+        }
+        for i, t in zip(texts.index.astype("int64").tolist(), texts.tolist())
+    ]
+
+
+def df_to_field_issue_rows(
+    df: pd.DataFrame,
+    *,
+    product: str,
+    subproduct: str,
+    product_key: Optional[str] = None,
+    subsystem_key: Optional[str] = None,
+    component_key: Optional[str] = None,
+    fault_code_key: Optional[str] = None,
+    fault_type_key: Optional[str] = None,
+) -> List[Dict[str, str]]:
+    """
+    Map a Field Reported Issues table to ContextAgent.generate() rows:
+      {"product", "subsystem", "component", "fault_code", "fault_type"}
+
+    Keys not given are guessed from the column names. Each field is resolved once over
+    its whole column; missing columns/values fall back to product/subproduct
+    (or "" for the fault fields).
+    """
+    if df is None or df.empty:
+        return []
+
+    cols = {str(c).lower(): c for c in df.columns}
+    product_key = product_key or cols.get("product")
+    subsystem_key = subsystem_key or cols.get("subsystem") or cols.get("sub_product") or cols.get("subproduct")
+    component_key = component_key or cols.get("component") or subsystem_key  # default to subsystem if missing
+    fault_code_key = fault_code_key or cols.get("fault_code") or cols.get("code")
+    fault_type_key = fault_type_key or cols.get("fault_type") or cols.get("type")
+
+    n = len(df)
+
+    def _column(key: Optional[str], default: str) -> List[str]:
+        if not key:
+            return [default] * n
+        col = df[key]
+        return column_as_str(col).where(col.notna(), default).tolist()
+
+    keys = ("product", "subsystem", "component", "fault_code", "fault_type")
+    columns = (
+        _column(product_key, product),
+        _column(subsystem_key, subproduct),
+        _column(component_key, subproduct),
+        _column(fault_code_key, ""),
+        _column(fault_type_key, ""),
+    )
+    return [dict(zip(keys, vals)) for vals in zip(*columns)]
+
+
+def column_as_str(col: pd.Series) -> pd.Series:
+    """
+    Vectorized str(value) over a column.
+
+    astype(str) matches Python's str() for text/number/bool dtypes; anything else
+    (datetimes, categoricals, ...) goes through map(str) so values render exactly as
+    the boxed scalars would (e.g. '2024-01-01 00:00:00', not '2024-01-01').
+    """
+    kind = col.dtype.kind
+    if kind in "OSUbiuf" or pd.api.types.is_string_dtype(col.dtype):
+        return col.astype(str)
+    return col.map(str).astype(object)
+
+
+# ---------- streaming CSV (pyarrow) ----------
+
+def use_arrow_csv(path: str) -> bool:
+    """Whether CSV loaders should stream `path` through Arrow (see DFMEA_CSV_ENGINE)."""
+    if CSV_ENGINE == "arrow":
+        return True
+    if CSV_ENGINE != "auto":
+        return False
+    try:
+        return os.path.getsize(path) >= CSV_STREAM_MIN_BYTES
+    except OSError:
+        return False
+
+
+def _rewind(source) -> None:
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+
+def _open_csv(source, encoding: str, *, block_size: int, names=None, skip_rows: int = 0, convert_options=None):
+    # `names` replace the header row, which is then skipped as a parsed record (a line
+    # count would cut a quoted multi-line header)
+    return pa_csv.open_csv(
+        source,
+        read_options=pa_csv.ReadOptions(
+            block_size=block_size, encoding=encoding, column_names=names,
+            skip_rows_after_names=skip_rows + (1 if names else 0),
+        ),
+        # quoted cells (notes, descriptions) may span lines, and blocks may end inside one
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=convert_options,
+    )
+
+
+def _csv_encoding(source) -> str:
+    """
+    UTF-8, or latin-1 when any byte of the file is not valid UTF-8: decided for the whole
+    file up front, as _read_csv_safely's retry does, so every row is decoded the same way.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    fh = source if hasattr(source, "read") else open(source, "rb")
+    try:
+        _rewind(fh)
+        while True:
+            block = fh.read(CSV_BLOCK_BYTES)
+            decoder.decode(block, final=not block)
+            if not block:
+                return "utf8"
+    except UnicodeDecodeError:
+        return CSV_FALLBACK_ENCODING
+    finally:
+        if fh is not source:
+            fh.close()
+
+
+def _csv_names(source, encoding: str) -> List[str]:
+    """Header row, with blank and duplicate fields named as pd.read_csv names them."""
+    _rewind(source)
+    reader = _open_csv(source, encoding, block_size=1 << 20)
+    try:
+        return _pandas_column_names(list(reader.schema.names))
+    finally:
+        reader.close()
+
+
+def csv_header(source) -> List[str]:
+    """Column names of a CSV (path or binary handle), decoded as the rows will be."""
+    return _csv_names(source, _csv_encoding(source))
+
+
+def projected_columns(
+    header: Iterable[str],
+    text_pref_cols: Iterable[str] = (),
+    extra_cols: Iterable[str] = FIELD_ISSUE_COLS,
+) -> Optional[List[str]]:
+    """
+    Columns of `header` the pipeline actually reads: the preferred text column plus any
+    product/subsystem/component/fault column. None when there is no preferred text
+    column, because the fallback text is built from the whole row.
+    """
+    header = list(header)
+    pref = _match_column(header, text_pref_cols) if text_pref_cols else None
+    if text_pref_cols and pref is None:
+        return None
+    wanted = {str(c).lower() for c in extra_cols}
+    keep = [pref] if pref is not None else []
+    keep += [c for c in header if c != pref and str(c).strip().lower() in wanted]
+    return keep
+
+
+def iter_csv_batches(
+    source,
+    *,
+    select: Optional[Callable[[List[str]], Optional[List[str]]]] = None,
+    block_size: int = CSV_BLOCK_BYTES,
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream a CSV as DataFrames of roughly `block_size` bytes each, via Arrow's
+    incremental reader. `select(header)` may return the subset of column names to
+    decode (None keeps all). Frames carry a running RangeIndex, i.e. the same row
+    numbers a single pd.read_csv would give.
+
+    Every column is read as text, exactly as parse_excel_or_csv(as_text=True) reads
+    it: the raw field, NA_STRINGS → NaN, and the file decoded as UTF-8 or, when any
+    of it is not, as latin-1. So types never have to be inferred across batches and
+    the rows do not depend on which loader read the file.
+
+    Reading restarts from the first row not yet yielded when a record straddles more
+    blocks than Arrow can stitch (long multi-line cells: the block size doubles).
+    """
+    encoding = _csv_encoding(source)
+    header = _csv_names(source, encoding)
+    columns = select(header) if select is not None else None
+    columns = header if columns is None else columns
+    convert = pa_csv.ConvertOptions(
+        include_columns=columns,
+        column_types={c: pa.string() for c in columns},
+        null_values=sorted(NA_STRINGS),
+        strings_can_be_null=True,
+    )
+    offset = 0
+    while True:
+        _rewind(source)
+        reader = None
+        try:
+            reader = _open_csv(source, encoding, block_size=block_size, names=header, skip_rows=offset,
+                               convert_options=convert)
+            for batch in reader:
+                if batch.num_rows == 0:
+                    continue
+                df = batch.to_pandas()
+                df = df.where(df.notna(), np.nan)  # None → NaN, as pandas leaves missing text
+                df.columns = [str(c).strip() for c in df.columns]
+                df.index = pd.RangeIndex(offset, offset + len(df))
+                offset += len(df)
+                yield df
+            return
+        except pa.ArrowInvalid as e:
+            if "straddl" in str(e) and block_size < CSV_BLOCK_BYTES_MAX:
+                block_size *= 2
+            else:
+                raise
+        finally:
+            if reader is not None:
+                reader.close()
+
+
+def iter_csv_normalized_rows(
+    path: str,
+    *,
+    product: str,
+    subproduct: str,
+    source_type: str,
+    file_name: Optional[str] = None,
+    text_pref_cols: Iterable[str] = ("text", "notes", "description", "failure_mode", "failure mode", "issue", "symptom"),
+    block_size: int = CSV_BLOCK_BYTES,
+) -> Iterator[Dict[str, Any]]:
+    """
+    df_to_normalized_rows() over a CSV streamed batch by batch: memory stays bounded by
+    `block_size` (plus the projected columns of one batch) whatever the file size.
+    """
+    text_pref_cols = tuple(text_pref_cols)
+    select = lambda header: projected_columns(header, text_pref_cols, extra_cols=())
+    for df in iter_csv_batches(path, select=select, block_size=block_size):
+        yield from df_to_normalized_rows(
+            df,
+            product=product,
+            subproduct=subproduct,
+            source_type=source_type,
+            file_name=file_name or path,
+            text_pref_cols=text_pref_cols,
+        )
+
+
+def iter_csv_field_issue_rows(
+    path: str,
+    *,
+    product: str,
+    subproduct: str,
+    block_size: int = CSV_BLOCK_BYTES,
+) -> Iterator[Dict[str, str]]:
+    """df_to_field_issue_rows() over a CSV streamed batch by batch (field-issue columns only)."""
+    # no field-issue columns: still read one (narrow) column so every row gets its defaults
+    select = lambda header: projected_columns(header) or header[:1]
+    for df in iter_csv_batches(path, select=select, block_size=block_size):
+        yield from df_to_field_issue_rows(df, product=product, subproduct=subproduct)
+
+
+# ---------- streaming Excel (openpyxl read-only) ----------
+
+def use_xlsx_stream(path: str) -> bool:
+    """Whether table loaders should stream `path` with the read-only reader (see DFMEA_XLSX_ENGINE)."""
+    if not path.lower().endswith((".xlsx", ".xlsm")):
+        return False  # read-only mode cannot open legacy .xls
+    if XLSX_ENGINE == "stream":
+        return True
+    if XLSX_ENGINE != "auto":
+        return False
+    try:
+        return os.path.getsize(path) >= XLSX_STREAM_MIN_BYTES
+    except OSError:
+        return False
+
+
+def xlsx_sheet_names(path: str, *, visible_only: bool = True) -> List[str]:
+    wb = load_workbook(path, read_only=True)
+    try:
+        return [ws.title for ws in wb.worksheets if not visible_only or ws.sheet_state == "visible"]
+    finally:
+        wb.close()
+
+
+def iter_xlsx_batches(
+    path: str,
+    *,
+    sheet: str | int | None = None,
+    select: Optional[Callable[[List[str]], Optional[List[str]]]] = None,
+    batch_rows: int = XLSX_BATCH_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream one worksheet as DataFrames of up to `batch_rows` rows, using openpyxl's
+    read-only mode and its own cell parser.
+
+    The header row (first non-blank row) is resolved first; `select(header)` may then
+    return the subset of column names to keep (None keeps all). From there on, cells
+    outside the kept columns are dropped before openpyxl converts them, which is where
+    read_excel spends most of its time on wide sheets. Blank rows are skipped and not
+    counted, as pd.read_excel does, so index values line up with it.
+
+    Values are text, exactly as parse_excel_or_csv(as_text=True) reads them: str() of
+    the cell value ("7" for an integral number, "2024-01-01 00:00:00" for a date),
+    NA_STRINGS → NaN. So they are independent of where batch boundaries fall.
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = _pick_worksheet(wb, sheet)
+        with ws._get_source() as src:
+            parser = _ProjectedSheetParser(
+                src,
+                ws._shared_strings,
+                data_only=True,
+                epoch=wb.epoch,
+                date_formats=wb._date_formats,
+                timedelta_formats=wb._timedelta_formats,
+            )
+            rows = parser.parse()
+
+            header: Optional[List[str]] = None
+            for _, cells in rows:
+                if not parser.row_blank:
+                    header = _header_names(cells)
+                    break
+            if not header:
+                return
+
+            names = select(header) if select is not None else None
+            if names is None:
+                names, cols = header, list(range(1, len(header) + 1))  # names may repeat once stripped
+            else:
+                cols = [header.index(n) + 1 for n in names]
+            if not names:
+                return
+            parser.keep = {get_column_letter(c) for c in cols}
+
+            offset = 0
+            buf: List[List[Any]] = [[] for _ in cols]
+            for _, cells in rows:
+                if parser.row_blank:
+                    continue
+                by_col = {c["column"]: _xlsx_text(c) for c in cells}
+                for out, c in zip(buf, cols):
+                    out.append(by_col.get(c))
+                if len(buf[0]) >= batch_rows:
+                    yield _xlsx_frame(names, buf, offset)
+                    offset += len(buf[0])
+                    buf = [[] for _ in cols]
+            if buf[0]:
+                yield _xlsx_frame(names, buf, offset)
+    finally:
+        wb.close()
+
+
+def iter_xlsx_normalized_rows(
+    path: str,
+    *,
+    product: str,
+    subproduct: str,
+    source_type: str,
+    file_name: Optional[str] = None,
+    text_pref_cols: Iterable[str] = ("text", "notes", "description", "failure_mode", "failure mode", "issue", "symptom"),
+    sheet: str | int | None = None,
+    batch_rows: int = XLSX_BATCH_ROWS,
+) -> Iterator[Dict[str, Any]]:
+    """df_to_normalized_rows() over one worksheet, streamed and projected to the text column."""
+    text_pref_cols = tuple(text_pref_cols)
+    select = lambda header: projected_columns(header, text_pref_cols, extra_cols=())
+    for df in iter_xlsx_batches(path, sheet=sheet, select=select, batch_rows=batch_rows):
+        yield from df_to_normalized_rows(
+            df,
+            product=product,
+            subproduct=subproduct,
+            source_type=source_type,
+            file_name=file_name or path,
+            text_pref_cols=text_pref_cols,
+        )
+
+
+def iter_xlsx_field_issue_rows(
+    path: str,
+    *,
+    product: str,
+    subproduct: str,
+    sheet: str | int | None = None,
+    batch_rows: int = XLSX_BATCH_ROWS,
+) -> Iterator[Dict[str, str]]:
+    """df_to_field_issue_rows() over one worksheet, streamed and projected to the field-issue columns."""
+    select = lambda header: projected_columns(header) or header[:1]
+    for df in iter_xlsx_batches(path, sheet=sheet, select=select, batch_rows=batch_rows):
+        yield from df_to_field_issue_rows(df, product=product, subproduct=subproduct)
 
 
 # ---------- internals ----------
 
+def _match_column(columns: Iterable[Any], preferences: Iterable[str]) -> Optional[Any]:
+    """First of `preferences` present in `columns` (case/whitespace-insensitive), as spelled there."""
+    lower_map: Dict[str, Any] = {}
+    for c in columns:
+        lower_map.setdefault(str(c).strip().lower(), c)
+    for key in preferences:
+        if key.lower() in lower_map:
+            return lower_map[key.lower()]
+    return None
+
+
+def _pick_worksheet(wb, sheet: str | int | None):
+    """Named/indexed sheet, else 'Sheet1' if present, else the first visible sheet."""
+    if isinstance(sheet, int):
+        return wb.worksheets[sheet]
+    if sheet is not None:
+        return wb[sheet]
+    if "Sheet1" in wb.sheetnames:
+        return wb["Sheet1"]
+    for ws in wb.worksheets:
+        if ws.sheet_state == "visible":
+            return ws
+    return wb.worksheets[0]
+
+
+_ROW_DIGITS = "0123456789"
+_row_has_value = etree.XPath("boolean(m:c/m:v[string()] | m:c/m:is)", namespaces={"m": SHEET_MAIN_NS})
+
+
+class _ProjectedSheetParser(WorkSheetParser):
+    """
+    openpyxl's worksheet parser, cut down to cell values: lxml only reports <row>
+    elements (instead of an event per cell/value element), and cells whose column
+    letter is not in `keep` are discarded before openpyxl converts them. `row_blank`
+    tells whether the row just parsed had any value at all (in any column).
+    """
+
+    keep: Optional[set] = None
+    row_blank: bool = True
+
+    def parse(self):
+        for _, el in etree.iterparse(self.source, tag=ROW_TAG, resolve_entities=False, huge_tree=True):
+            row = self.parse_row(el)
+            el.clear()
+            # drop already-processed rows so the tree never grows
+            while el.getprevious() is not None:
+                del el.getparent()[0]
+            yield row
+
+    def parse_row(self, row):
+        self.row_blank = not _row_has_value(row)
+        keep = self.keep
+        # cells without an explicit reference are located by position, so parse those rows whole
+        if keep is None or not (len(row) and row[0].get("r")):
+            return super().parse_row(row)
+        return row.get("r"), [self.parse_cell(el) for el in row if el.get("r").rstrip(_ROW_DIGITS) in keep]
+
+
+def _header_names(cells: List[Dict[str, Any]]) -> List[str]:
+    """Header cells as column names, as parse_excel_or_csv names them (trailing blanks dropped)."""
+    by_col = {c["column"]: _xlsx_value(c) for c in cells}
+    values = [by_col.get(i) for i in range(1, max(by_col, default=0) + 1)]
+    while values and values[-1] is None:
+        values.pop()
+    names = _pandas_column_names(["" if v is None else str(v) for v in values])
+    return [n.strip() for n in names]
+
+
+def _pandas_column_names(raw: List[str]) -> List[str]:
+    """
+    Header fields named as pandas' readers name them: blanks become 'Unnamed: i', then
+    duplicates get '.1', '.2', ... skipping names already in the header (named
+    columns claim their names before unnamed ones).
+    """
+    names = [f"Unnamed: {i}" if c == "" else c for i, c in enumerate(raw)]
+    unnamed = [i for i, c in enumerate(raw) if c == ""]
+    counts: Dict[str, int] = defaultdict(int)
+    for i in [i for i in range(len(names)) if i not in unnamed] + unnamed:
+        col = old = names[i]
+        cur = counts[col]
+        while cur > 0:
+            counts[old] = cur + 1
+            col = f"{old}.{cur}"
+            cur = cur + 1 if col in names else counts[col]
+        names[i] = col
+        counts[col] = cur + 1
+    return names
+
+
+def _xlsx_value(cell: Dict[str, Any]) -> Any:
+    """Parsed cell value as pd.read_excel would box it: ''/errors → missing, integral floats → int."""
+    v = cell["value"]
+    if v is None or v == "" or cell["data_type"] == "e":
+        return None
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+
+def _xlsx_text(cell: Dict[str, Any]) -> Optional[str]:
+    """Data cell as pd.read_excel(dtype=str) reads it: str() of the value, missing → None."""
+    v = _xlsx_value(cell)
+    if v is None:
+        return None
+    v = str(v)
+    return None if v in NA_STRINGS else v
+
+
+def _xlsx_frame(names: List[str], columns: List[List[Any]], offset: int) -> pd.DataFrame:
+    n = len(columns[0]) if columns else 0
+    index = pd.RangeIndex(offset, offset + n)
+    df = pd.DataFrame(
+        {i: pd.Series(col, index=index, dtype=object) for i, col in enumerate(columns)},
+        index=index,
+    )
+    df.columns = names
+    return df.where(df.notna(), np.nan)
+
+
+def _read_excel_safely(path: str, sheet: str | int | None = None, **kw) -> pd.DataFrame:
+    """pd.read_excel on the requested sheet, else 'Sheet1' if present, else the first sheet."""
+    with pd.ExcelFile(path) as xls:
+        if sheet is None:
+            names = xls.sheet_names
+            sheet = "Sheet1" if "Sheet1" in names else (names[0] if names else 0)
+        return pd.read_excel(xls, sheet_name=sheet, **kw)
+
+
+def _read_csv_safely(path: str, **kw) -> pd.DataFrame:
+    """pd.read_csv with a latin-1 retry for exports that are not UTF-8."""
+    try:
+        return pd.read_csv(path, **kw)
+    except UnicodeDecodeError:
+        return pd.read_csv(path, encoding="latin-1", **kw)
+
 # server/utils/excel_parser.py
 import io
 import pandas as pd
 
-def read_csv_safe(content: bytes) -> pd.DataFrame:
-    if not content or (isinstance(content, (bytes, bytearray)) and len(content) == 0):
+def _content_source(content):
+    """bytes → BytesIO; a path or an open binary handle is passed through to pandas as-is."""
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        return io.BytesIO(content)
+    if hasattr(content, "seek"):
+        content.seek(0)
+    return content
+
+def _is_empty_content(content) -> bool:
+    if content is None:
+        return True
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        return len(content) == 0
+    if isinstance(content, str):
+        return not content or not os.path.exists(content) or os.path.getsize(content) == 0
+    return False
+
+def read_csv_safe(content) -> pd.DataFrame:
+    """Read CSV from bytes, a file path or a binary handle (spooled uploads)."""
+    if _is_empty_content(content):
         raise ValueError("Empty CSV file.")
-    bio = io.BytesIO(content)
     try:
-        df = pd.read_csv(bio)
+        try:
+            df = pd.read_csv(_content_source(content))
+        except UnicodeDecodeError:
+            # Excel exports are often cp1252 / latin-1
+            df = pd.read_csv(_content_source(content), encoding="latin-1")
         if df.empty or len(df.columns) == 0:
             raise ValueError("CSV has no columns or rows.")
         return df
     except Exception:
         # try excel fallback (sometimes mislabeled)
-        bio.seek(0)
-        df = pd.read_excel(bio)
+        df = pd.read_excel(_content_source(content))
         if df.empty or len(df.columns) == 0:
             raise ValueError("Converted Excel has no columns or rows.")
         return df
 
-def read_excel_safe(content: bytes) -> pd.DataFrame:
-    if not content or (isinstance(content, (bytes, bytearray)) and len(content) == 0):
+def read_excel_safe(content) -> pd.DataFrame:
+    """Read XLSX from bytes, a file path or a binary handle (spooled uploads)."""
+    if _is_empty_content(content):
         raise ValueError("Empty Excel file.")
-    bio = io.BytesIO(content)
-    df = pd.read_excel(bio)
+    df = pd.read_excel(_content_source(content))
     if df.empty or len(df.columns) == 0:
         raise ValueError("Excel has no columns or rows.")
     return df
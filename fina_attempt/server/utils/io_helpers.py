@@ -1,16 +1,31 @@
 # server/utils/io_helpers.py
 from __future__ import annotations
 
+import hashlib
+import io
 import os
 import re
 import tempfile
-from typing import Iterable, List, Optional, Tuple
+import zipfile
+from dataclasses import dataclass
+from typing import BinaryIO, Iterable, List, Optional, Tuple, Union
 
 from fastapi import UploadFile
 
 
 SAFE_CHARS = re.compile(r"[^A-Za-z0-9._\- ]+")
 
+# Upload intake limits (MB) — see intake_uploads()
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+UPLOAD_SPOOL_MAX_MEMORY = int(float(os.getenv("DFMEA_UPLOAD_SPOOL_MB", "8")) * 1024 * 1024)
+MAX_UPLOAD_FILE_BYTES = int(float(os.getenv("DFMEA_MAX_UPLOAD_FILE_MB", "256")) * 1024 * 1024)
+MAX_UPLOAD_REQUEST_BYTES = int(float(os.getenv("DFMEA_MAX_UPLOAD_REQUEST_MB", "1024")) * 1024 * 1024)
+
+ZIP_MAGIC = b"PK\x03\x04"
+OLE_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+# C0 control bytes that never appear in text files (tab/LF/VT/FF/CR and ESC aside)
+BINARY_BYTES = re.compile(rb"[\x00-\x08\x0e-\x1a\x1c-\x1f]")
+
 
 # ---------- Path/name helpers ----------
 
@@ -106,3 +121,185 @@ def save_bytes(
     tf.flush()
     tf.close()
     return tf.name
+
+
+# ---------- Upload intake (single pass, spooled) ----------
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds the per-file or per-request size limit."""
+
+
+@dataclass
+class SpooledUpload:
+    """
+    One upload read exactly once: small files stay in memory (`data`), larger ones are
+    spilled to a temp file (`path`). Both are picklable, so either can be handed to a
+    parse worker process via source().
+    """
+    filename: str
+    kind: str          # docx | xlsx | csv | doc | xls | empty | unknown (from magic bytes)
+    size: int
+    sha256: str
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+    def source(self) -> Union[bytes, str]:
+        """Raw bytes (in-memory uploads) or a temp-file path (spilled uploads)."""
+        return self.path if self.path else (self.data or b"")
+
+    def open(self) -> BinaryIO:
+        return open(self.path, "rb") if self.path else io.BytesIO(self.data or b"")
+
+    def close(self) -> None:
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+        self.data = None
+
+
+def _looks_like_text(head: bytes) -> bool:
+    # UTF-8 and single-byte exports (cp1252 / latin-1 from Excel) alike; only the
+    # encoding-independent control bytes tell binary data apart
+    return not BINARY_BYTES.search(head)
+
+
+def _zip_kind(fh: BinaryIO) -> str:
+    try:
+        with zipfile.ZipFile(fh) as zf:
+            names = zf.namelist()
+    except zipfile.BadZipFile:
+        return "unknown"
+    if any(n.startswith("word/") for n in names):
+        return "docx"
+    if any(n.startswith("xl/") for n in names):
+        return "xlsx"
+    return "unknown"
+
+
+def detect_upload_kind(head: bytes, name: str = "", fh: Optional[BinaryIO] = None) -> str:
+    """
+    Classify an upload by magic bytes: ZIP → docx/xlsx (by package content, or by
+    extension if no handle is given), OLE → legacy doc (xls if so named), text → csv
+    when the name is a table file (.csv, or a CSV saved as .xls/.xlsx) or has no
+    extension. Other text (.txt, .json, .md, ...) is "unknown", not parsed as a table.
+    """
+    if not head:
+        return "empty"
+    if head.startswith(ZIP_MAGIC):
+        if fh is not None:
+            return _zip_kind(fh)
+        return "xlsx" if is_excel(name) else "docx" if is_docx(name) else "unknown"
+    if head.startswith(OLE_MAGIC):
+        return "xls" if (name or "").lower().endswith(".xls") else "doc"
+    if _looks_like_text(head):
+        has_ext = bool(os.path.splitext(name or "")[1])
+        return "csv" if is_csv(name) or is_excel(name) or not has_ext else "unknown"
+    return "unknown"
+
+
+def intake_upload(
+    uf: UploadFile,
+    *,
+    max_file_bytes: int = MAX_UPLOAD_FILE_BYTES,
+    budget_bytes: Optional[int] = None,
+    spool_max_memory: int = UPLOAD_SPOOL_MAX_MEMORY,
+    dirpath: Optional[str] = None,
+) -> SpooledUpload:
+    """
+    Read one UploadFile once, in bounded chunks: hash it, sniff its type and spool it
+    (memory up to `spool_max_memory`, then a temp file). Raises UploadTooLarge as soon
+    as the file passes `max_file_bytes` or the remaining request `budget_bytes`.
+    """
+    fname = uf.filename or ""
+    limit = max_file_bytes if budget_bytes is None else min(max_file_bytes, budget_bytes)
+    h = hashlib.sha256()
+    buf = bytearray()
+    tf = None
+    head = b""
+    size = 0
+
+    try:
+        try:
+            uf.file.seek(0, io.SEEK_SET)
+        except Exception:
+            pass
+        while True:
+            chunk = uf.file.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > limit:
+                which = "per-request" if budget_bytes is not None and budget_bytes < max_file_bytes else "per-file"
+                raise UploadTooLarge(f"'{fname or '(unnamed)'}' exceeds the {which} upload limit ({limit // (1024 * 1024)} MB).")
+            if len(head) < 4096:
+                head += chunk[: 4096 - len(head)]
+            h.update(chunk)
+            if tf is None and len(buf) + len(chunk) > spool_max_memory:
+                tf = tempfile.NamedTemporaryFile(
+                    delete=False, prefix="dfmea_upload_", suffix=choose_ext_from_name(fname), dir=dirpath
+                )
+                tf.write(buf)
+                buf = bytearray()
+            if tf is not None:
+                tf.write(chunk)
+            else:
+                buf += chunk
+    except BaseException:
+        if tf is not None:
+            tf.close()
+            os.remove(tf.name)
+        raise
+
+    up = SpooledUpload(filename=fname, kind="empty", size=size, sha256=h.hexdigest())
+    if tf is not None:
+        tf.close()
+        up.path = tf.name
+    else:
+        up.data = bytes(buf)
+
+    if head.startswith(ZIP_MAGIC):
+        with up.open() as fh:
+            up.kind = detect_upload_kind(head, fname, fh)
+    else:
+        up.kind = detect_upload_kind(head, fname)
+    return up
+
+
+def intake_uploads(
+    buckets: List[Optional[Iterable[UploadFile]]],
+    *,
+    max_file_bytes: int = MAX_UPLOAD_FILE_BYTES,
+    max_request_bytes: int = MAX_UPLOAD_REQUEST_BYTES,
+    spool_max_memory: int = UPLOAD_SPOOL_MAX_MEMORY,
+    dirpath: Optional[str] = None,
+) -> List[List[SpooledUpload]]:
+    """
+    Intake several buckets of uploads (e.g. PRD / KB / Field) in one pass, sharing the
+    per-request byte budget. On error every already-spooled upload is cleaned up.
+    """
+    out: List[List[SpooledUpload]] = []
+    remaining = max_request_bytes
+    try:
+        for files in buckets:
+            spooled: List[SpooledUpload] = []
+            out.append(spooled)
+            for uf in files or []:
+                if not uf:
+                    continue
+                up = intake_upload(uf, max_file_bytes=max_file_bytes, budget_bytes=remaining,
+                                   spool_max_memory=spool_max_memory, dirpath=dirpath)
+                spooled.append(up)
+                remaining -= up.size
+    except BaseException:
+        close_uploads(out)
+        raise
+    return out
+
+
+def close_uploads(buckets: List[List[SpooledUpload]]) -> None:
+    for spooled in buckets:
+        for up in spooled:
+            up.close()
@@ -0,0 +1,166 @@
+# server/utils/parse_cache.py
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+# Bump whenever a parser change alters the rows it produces; old entries then
+# simply stop matching and age out through LRU eviction.
+PARSER_VERSION = "2"
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "dfmea_parse_cache")
+
+
+@dataclass
+class ParseCacheConfig:
+    enabled: bool = os.getenv("DFMEA_PARSE_CACHE", "1") == "1"
+    cache_dir: str = os.getenv("DFMEA_PARSE_CACHE_DIR", DEFAULT_CACHE_DIR)
+    max_bytes: int = int(float(os.getenv("DFMEA_PARSE_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+
+@dataclass
+class ParseCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    def as_counts(self) -> Dict[str, int]:
+        return {"parse_cache_hits": self.hits, "parse_cache_misses": self.misses}
+
+
+class ParseCache:
+    """
+    Content-addressed, on-disk cache of parsed rows.
+
+    Key   = sha256(parser version + file kind + sha256(file bytes))
+    Value = the parsed rows (list[dict]) stored as one Parquet file per key.
+
+    The directory is bounded by `max_bytes`; least-recently-used entries (by mtime,
+    refreshed on every hit) are evicted first. Any I/O or (de)serialization problem is
+    treated as a miss so the cache can never fail a request.
+    """
+
+    def __init__(self, cfg: Optional[ParseCacheConfig] = None):
+        self.cfg = cfg or ParseCacheConfig()
+        self._lock = threading.Lock()
+        if self.cfg.enabled:
+            os.makedirs(self.cfg.cache_dir, exist_ok=True)
+
+    # ---------- keys ----------
+
+    @staticmethod
+    def key(kind: str, data: bytes) -> str:
+        return ParseCache.key_for_digest(kind, hashlib.sha256(data or b"").hexdigest())
+
+    @staticmethod
+    def key_for_digest(kind: str, sha256: str) -> str:
+        """Same key as key(), from a content digest computed elsewhere (e.g. during upload intake)."""
+        return hashlib.sha256(f"{PARSER_VERSION}:{kind}:{sha256}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cfg.cache_dir, key[:2], f"{key}.parquet")
+
+    # ---------- public api ----------
+
+    def get(self, key: str, stats: Optional[ParseCacheStats] = None) -> Optional[List[Dict[str, Any]]]:
+        """Return cached rows for `key`, or None on a miss."""
+        rows = self._read(key) if self.cfg.enabled else None
+        if stats is not None:
+            if rows is None:
+                stats.misses += 1
+            else:
+                stats.hits += 1
+        return rows
+
+    def put(self, key: str, rows: List[Dict[str, Any]]) -> bool:
+        """Store rows under `key`; returns False if they could not be written (e.g. mixed-type columns)."""
+        if not self.cfg.enabled or rows is None:
+            return False
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            pd.DataFrame(rows).to_parquet(tmp, index=False)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"[ParseCache] Not caching {key[:12]}: {type(e).__name__}: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return False
+        self._evict()
+        return True
+
+    def clear(self) -> None:
+        for path, _, _ in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # ---------- internals ----------
+
+    def _read(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            df = pd.read_parquet(path)
+            os.utime(path)  # LRU: a hit makes the entry most-recent
+        except Exception:
+            return None
+        return df.to_dict(orient="records")
+
+    def _entries(self):
+        out = []
+        root = self.cfg.cache_dir
+        if not os.path.isdir(root):
+            return out
+        for sub in os.listdir(root):
+            d = os.path.join(root, sub)
+            if not os.path.isdir(d):
+                continue
+            for name in os.listdir(d):
+                if not name.endswith(".parquet"):
+                    continue
+                p = os.path.join(d, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                out.append((p, st.st_mtime, st.st_size))
+        return out
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, _, size in entries)
+            if total <= self.cfg.max_bytes:
+                return
+            for path, _, size in sorted(entries, key=lambda e: e[1]):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.cfg.max_bytes:
+                    break
+
+
+_cache: Optional[ParseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_parse_cache() -> ParseCache:
+    """Process-wide ParseCache built from env config."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ParseCache()
+        return _cache
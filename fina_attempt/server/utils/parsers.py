@@ -1,43 +1,313 @@
 # server/utils/parsers.py
 from __future__ import annotations
 
+import hashlib
 import os
-from typing import List, Dict, Any, Iterable, Optional
-
-import pandas as pd
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
 
 from server.utils.excel_parser import (
     parse_excel_or_csv,
     df_to_normalized_rows,
+    df_to_field_issue_rows,
+    iter_csv_normalized_rows,
+    iter_csv_field_issue_rows,
+    iter_xlsx_normalized_rows,
+    iter_xlsx_field_issue_rows,
+    use_arrow_csv,
+    use_xlsx_stream,
+    xlsx_sheet_names,
 )
-from server.utils.docx_parser import parse_docx_to_rows
+from server.utils.docx_parser import iter_docx_rows
 
 
-# --------- Public API ----------
+KB_TEXT_COLS = ("text", "notes", "description", "failure_mode", "failure mode")
+FIELD_TEXT_COLS = ("issue", "description", "symptom", "failure", "problem", "observations")
+PRD_TABLE_TEXT_COLS = ("requirement", "req", "id", "title", "text", "description", "notes")
 
-def load_kb_files(
-    paths: Iterable[str],
+# Process-pool parsing: 1 (default) keeps everything in-process and serial.
+PARSE_WORKERS = int(os.getenv("DFMEA_PARSE_WORKERS", "1"))
+
+
+# --------- Parallel parse helpers ----------
+
+_pools: Dict[str, ProcessPoolExecutor] = {}
+_pool_lock = threading.Lock()
+
+
+def _get_pool(name: str, workers: int) -> ProcessPoolExecutor:
+    """
+    Shared, lazily created process pool per use ("parse", "chunk"). A live pool is
+    reused at whatever size it has: shutting it down would cancel the jobs of
+    concurrent callers. Only a broken pool is replaced (see _reset_pool).
+    """
+    with _pool_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ProcessPoolExecutor(max_workers=workers)
+        return pool
+
+
+def _reset_pool(name: str, broken: Executor) -> None:
+    with _pool_lock:
+        if _pools.get(name) is broken:
+            del _pools[name]
+
+
+def run_parse_jobs(
+    jobs: List[Callable[[], Any]],
+    *,
+    workers: Optional[int] = None,
+    pool_name: str = "parse",
+) -> List[Tuple[Any, Optional[BaseException]]]:
+    """
+    Run zero-arg, picklable parse jobs (e.g. functools.partial of a module-level function)
+    and return [(result, error), ...] in the SAME order as `jobs`.
+
+    workers <= 1 runs serially in-process; otherwise jobs go to the shared process pool
+    `pool_name` (created with `workers` processes) so wall-clock time scales with cores
+    rather than file count. A failing job never stops the others — callers decide how
+    to surface per-file errors.
+    """
+    workers = max(1, int(PARSE_WORKERS if workers is None else workers))
+    out: List[Tuple[Any, Optional[BaseException]]] = []
+
+    if min(workers, len(jobs)) <= 1:
+        for job in jobs:
+            try:
+                out.append((job(), None))
+            except Exception as e:
+                out.append((None, e))
+        return out
+
+    pool = _get_pool(pool_name, workers)
+    futures = [pool.submit(job) for job in jobs]
+    for fut in futures:
+        try:
+            out.append((fut.result(), None))
+        except BrokenProcessPool as e:
+            _reset_pool(pool_name, pool)
+            out.append((None, e))
+        except Exception as e:
+            out.append((None, e))
+    return out
+
+
+def _collect(results: List[Tuple[Any, Optional[BaseException]]]) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for rows, err in results:
+        if err is not None:
+            # same as the serial loop: the first failing file (in input order) propagates
+            raise err
+        out.extend(rows or [])
+    return out
+
+
+# --------- Per-file loaders (module-level so they pickle) ----------
+
+def load_table_file(
+    path: str,
     *,
     product: str,
     subproduct: str,
-    text_pref_cols: Iterable[str] = ("text", "notes", "description", "failure_mode", "failure mode"),
+    source_type: str,
+    text_pref_cols: Iterable[str],
 ) -> List[Dict[str, Any]]:
-    """Load Knowledge Bank CSV/XLSX files and normalize to row dicts."""
+    """
+    Parse one CSV/XLSX file into normalized rows (large CSV/XLSX files are streamed).
+    Cells are read as text whichever reader is used, so the rows (and their chunk
+    text) do not depend on the file size.
+    """
+    if path.lower().endswith(".csv") and use_arrow_csv(path):
+        try:
+            return list(iter_csv_normalized_rows(
+                path,
+                product=product,
+                subproduct=subproduct,
+                source_type=source_type,
+                file_name=os.path.basename(path),
+                text_pref_cols=text_pref_cols,
+            ))
+        except Exception as e:
+            print(f"[parsers] Arrow CSV read failed for '{path}' ({type(e).__name__}: {e}); using pandas")
+    elif use_xlsx_stream(path):
+        try:
+            return load_xlsx_sheet(
+                path,
+                sheet=None,
+                product=product,
+                subproduct=subproduct,
+                source_type=source_type,
+                text_pref_cols=text_pref_cols,
+            )
+        except Exception as e:
+            print(f"[parsers] Streaming XLSX read failed for '{path}' ({type(e).__name__}: {e}); using pandas")
+
+    df = parse_excel_or_csv(path, as_text=True)
+    return df_to_normalized_rows(
+        df,
+        product=product,
+        subproduct=subproduct,
+        source_type=source_type,
+        file_name=os.path.basename(path),
+        text_pref_cols=text_pref_cols,
+    )
+
+
+def load_field_issue_file(
+    path: str,
+    *,
+    product: str,
+    subproduct: str,
+) -> List[Dict[str, str]]:
+    """
+    ContextAgent.generate() rows of one Field Reported Issues CSV/XLSX file (see
+    df_to_field_issue_rows). Large files are streamed, reading only the field-issue
+    columns; cells are read as text whichever reader is used.
+    """
+    if path.lower().endswith(".csv") and use_arrow_csv(path):
+        try:
+            return list(iter_csv_field_issue_rows(path, product=product, subproduct=subproduct))
+        except Exception as e:
+            print(f"[parsers] Arrow CSV read failed for '{path}' ({type(e).__name__}: {e}); using pandas")
+    elif use_xlsx_stream(path):
+        try:
+            return list(iter_xlsx_field_issue_rows(path, product=product, subproduct=subproduct))
+        except Exception as e:
+            print(f"[parsers] Streaming XLSX read failed for '{path}' ({type(e).__name__}: {e}); using pandas")
+
+    df = parse_excel_or_csv(path, as_text=True)
+    return df_to_field_issue_rows(df, product=product, subproduct=subproduct)
+
+
+def load_xlsx_sheet(
+    path: str,
+    *,
+    sheet: str | int | None,
+    product: str,
+    subproduct: str,
+    source_type: str,
+    text_pref_cols: Iterable[str],
+) -> List[Dict[str, Any]]:
+    """Parse one worksheet with the read-only, column-projected reader."""
+    return list(iter_xlsx_normalized_rows(
+        path,
+        product=product,
+        subproduct=subproduct,
+        source_type=source_type,
+        file_name=os.path.basename(path),
+        text_pref_cols=text_pref_cols,
+        sheet=sheet,
+    ))
+
+
+def load_workbook_file(
+    path: str,
+    *,
+    product: str,
+    subproduct: str,
+    source_type: str,
+    text_pref_cols: Iterable[str],
+    sheets: Optional[Iterable[str]] = None,
+    workers: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Parse several sheets of one XLSX workbook (default: every visible sheet), one
+    parse job per sheet so they run concurrently when workers > 1. Rows keep sheet
+    order and carry a 'sheet' key, since idx restarts in every sheet.
+    """
+    names = list(sheets) if sheets is not None else xlsx_sheet_names(path)
+    jobs = [
+        partial(load_xlsx_sheet, path, sheet=name, product=product, subproduct=subproduct,
+                source_type=source_type, text_pref_cols=tuple(text_pref_cols))
+        for name in names
+    ]
     out: List[Dict[str, Any]] = []
-    for p in paths or []:
-        if not (p and os.path.exists(p)):
-            continue
-        df = parse_excel_or_csv(p)
-        rows = df_to_normalized_rows(
-            df,
+    for name, (rows, err) in zip(names, run_parse_jobs(jobs, workers=workers)):
+        if err is not None:
+            raise err
+        out.extend({**r, "sheet": name} for r in rows or [])
+    return out
+
+
+def load_prd_file(
+    path: str,
+    *,
+    product: str,
+    subproduct: str,
+    include_tables: bool = True,
+) -> List[Dict[str, Any]]:
+    """Parse one PRD/spec file (DOCX/DOC or CSV/XLSX/XLS) into normalized rows."""
+    low = path.lower()
+    base = os.path.basename(path)
+
+    if low.endswith((".docx", ".doc")):
+        return list(iter_docx_rows(
+            path,
+            product=product,
+            subproduct=subproduct,
+            file_label=base,
+            include_tables=include_tables,
+        ))
+    if low.endswith((".csv", ".xlsx", ".xls")):
+        # Prefer requirement-ish columns for PRDs; fall back to full row stringify
+        return load_table_file(
+            path,
             product=product,
             subproduct=subproduct,
-            source_type="kb",
-            file_name=os.path.basename(p),
-            text_pref_cols=text_pref_cols,
+            source_type="prd",              # IMPORTANT: classify as PRD
+            text_pref_cols=PRD_TABLE_TEXT_COLS,
         )
-        out.extend(rows)
-    return out
+    return []
+
+
+def _existing(paths: Optional[Iterable[str]]) -> List[str]:
+    return [p for p in (paths or []) if p and os.path.exists(p)]
+
+
+def _kb_jobs(paths, *, product, subproduct, text_pref_cols=KB_TEXT_COLS) -> List[Callable[[], Any]]:
+    return [
+        partial(load_table_file, p, product=product, subproduct=subproduct,
+                source_type="kb", text_pref_cols=tuple(text_pref_cols))
+        for p in _existing(paths)
+    ]
+
+
+def _field_jobs(paths, *, product, subproduct, text_pref_cols=FIELD_TEXT_COLS) -> List[Callable[[], Any]]:
+    return [
+        partial(load_table_file, p, product=product, subproduct=subproduct,
+                source_type="field", text_pref_cols=tuple(text_pref_cols))
+        for p in _existing(paths)
+    ]
+
+
+def _prd_jobs(paths, *, product, subproduct, include_tables=True) -> List[Callable[[], Any]]:
+    return [
+        partial(load_prd_file, p, product=product, subproduct=subproduct, include_tables=include_tables)
+        for p in _existing(paths)
+    ]
+
+
+def _run_jobs(jobs: List[Callable[[], Any]], workers: Optional[int]) -> List[Dict[str, Any]]:
+    return _collect(run_parse_jobs(jobs, workers=workers))
+
+
+# --------- Public API ----------
+
+def load_kb_files(
+    paths: Iterable[str],
+    *,
+    product: str,
+    subproduct: str,
+    text_pref_cols: Iterable[str] = KB_TEXT_COLS,
+    workers: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Load Knowledge Bank CSV/XLSX files and normalize to row dicts."""
+    jobs = _kb_jobs(paths, product=product, subproduct=subproduct, text_pref_cols=text_pref_cols)
+    return _run_jobs(jobs, workers)
 
 
 def load_field_files(
@@ -45,24 +315,27 @@ def load_field_files(
     *,
     product: str,
     subproduct: str,
-    text_pref_cols: Iterable[str] = ("issue", "description", "symptom", "failure", "problem", "observations"),
+    text_pref_cols: Iterable[str] = FIELD_TEXT_COLS,
+    workers: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
     """Load Field Reported Issues CSV/XLSX files and normalize to row dicts."""
-    out: List[Dict[str, Any]] = []
-    for p in paths or []:
-        if not (p and os.path.exists(p)):
-            continue
-        df = parse_excel_or_csv(p)
-        rows = df_to_normalized_rows(
-            df,
-            product=product,
-            subproduct=subproduct,
-            source_type="field",
-            file_name=os.path.basename(p),
-            text_pref_cols=text_pref_cols,
-        )
-        out.extend(rows)
-    return out
+    jobs = _field_jobs(paths, product=product, subproduct=subproduct, text_pref_cols=text_pref_cols)
+    return _run_jobs(jobs, workers)
+
+
+def load_field_issues(
+    paths: Iterable[str],
+    *,
+    product: str,
+    subproduct: str,
+    workers: Optional[int] = None,
+) -> List[Dict[str, str]]:
+    """Field Reported Issues CSV/XLSX files → ContextAgent.generate() rows, in file order."""
+    jobs = [
+        partial(load_field_issue_file, p, product=product, subproduct=subproduct)
+        for p in _existing(paths)
+    ]
+    return _run_jobs(jobs, workers)
 
 
 def load_prd_files(
@@ -71,44 +344,16 @@ def load_prd_files(
     product: str,
     subproduct: str,
     include_tables: bool = True,
+    workers: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
     """
     Load PRD/spec files and normalize to row dicts.
     Supports:
-      - DOCX/DOC: paragraphs + table cells (via python-docx)
+      - DOCX/DOC: paragraphs + table cells (streamed from the document XML)
       - CSV/XLSX/XLS: rows → best-effort text (treated as PRD source)
     """
-    out: List[Dict[str, Any]] = []
-    for p in paths or []:
-        if not (p and os.path.exists(p)):
-            continue
-        low = p.lower()
-        base = os.path.basename(p)
-
-        if low.endswith((".docx", ".doc")):
-            rows = parse_docx_to_rows(
-                p,
-                product=product,
-                subproduct=subproduct,
-                file_label=base,
-                include_tables=include_tables,
-            )
-        elif low.endswith((".csv", ".xlsx", ".xls")):
-            df = parse_excel_or_csv(p)
-            # Prefer requirement-ish columns for PRDs; fall back to full row stringify
-            rows = df_to_normalized_rows(
-                df,
-                product=product,
-                subproduct=subproduct,
-                source_type="prd",              # IMPORTANT: classify as PRD
-                file_name=base,
-                text_pref_cols=("requirement", "req", "id", "title", "text", "description", "notes"),
-            )
-        else:
-            rows = []
-
-        out.extend(rows)
-    return out
+    jobs = _prd_jobs(paths, product=product, subproduct=subproduct, include_tables=include_tables)
+    return _run_jobs(jobs, workers)
 
 
 def load_all_sources(
@@ -118,24 +363,103 @@ def load_all_sources(
     kb_paths: Optional[Iterable[str]] = None,
     field_paths: Optional[Iterable[str]] = None,
     prd_paths: Optional[Iterable[str]] = None,
+    workers: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
     """
     Convenience: load KB + Field + PRD, return a single normalized list.
     Order preserved: Field first (bias retrieval), then PRD, then KB.
-    """
-    kb_paths = list(kb_paths or [])
-    field_paths = list(field_paths or [])
-    prd_paths = list(prd_paths or [])
 
-    field_rows = load_field_files(field_paths, product=product, subproduct=subproduct)
-    prd_rows = load_prd_files(prd_paths, product=product, subproduct=subproduct)
-    kb_rows = load_kb_files(kb_paths, product=product, subproduct=subproduct)
+    workers > 1 (or DFMEA_PARSE_WORKERS) parses all files concurrently in a process pool;
+    output order and per-file idx numbering are identical to the serial path.
+    """
+    jobs: List[Callable[[], Any]] = []
+    jobs += _field_jobs(field_paths, product=product, subproduct=subproduct)
+    jobs += _prd_jobs(prd_paths, product=product, subproduct=subproduct)
+    jobs += _kb_jobs(kb_paths, product=product, subproduct=subproduct)
 
-    combined: List[Dict[str, Any]] = []
-    combined.extend(field_rows)
-    combined.extend(prd_rows)
-    combined.extend(kb_rows)
+    combined = _run_jobs(jobs, workers)
 
     # strip empties
     combined = [r for r in combined if (r.get("text") or "").strip()]
     return combined
+
+
+def iter_table_file_rows(
+    path: str,
+    *,
+    product: str,
+    subproduct: str,
+    source_type: str,
+    text_pref_cols: Iterable[str],
+) -> Iterator[Dict[str, Any]]:
+    """
+    Row-by-row twin of load_table_file(). Files above the CSV/XLSX streaming thresholds
+    are read in batches; smaller ones (and .xls) are loaded whole, as load_table_file does.
+
+    A streaming read that fails falls back to pandas like load_table_file, continuing
+    after the rows already yielded. Both read every cell as text the same way (see
+    parse_excel_or_csv(as_text=True)), and the fallback checks that its first rows are
+    the ones already yielded; if they are not, it raises rather than mix two readers'
+    rows in one file.
+    """
+    is_csv = path.lower().endswith(".csv")
+    kw = dict(product=product, subproduct=subproduct, source_type=source_type,
+              file_name=os.path.basename(path), text_pref_cols=tuple(text_pref_cols))
+    if is_csv and use_arrow_csv(path):
+        stream, label = iter_csv_normalized_rows, "Arrow CSV"
+    elif use_xlsx_stream(path):
+        stream, label = iter_xlsx_normalized_rows, "Streaming XLSX"
+    else:
+        yield from load_table_file(path, product=product, subproduct=subproduct,
+                                   source_type=source_type, text_pref_cols=text_pref_cols)
+        return
+
+    done, seen = 0, hashlib.sha256()
+    try:
+        for row in stream(path, **kw):
+            seen.update(repr(row).encode("utf-8"))
+            yield row
+            done += 1
+        return
+    except Exception as e:
+        print(f"[parsers] {label} read failed for '{path}' after {done} row(s) ({type(e).__name__}: {e}); using pandas")
+    rows = df_to_normalized_rows(parse_excel_or_csv(path, as_text=True), **kw)
+    check = hashlib.sha256()
+    for row in rows[:done]:
+        check.update(repr(row).encode("utf-8"))
+    if check.digest() != seen.digest():
+        raise RuntimeError(f"pandas rows of '{path}' differ from the {done} row(s) already streamed")
+    yield from rows[done:]
+
+
+def iter_all_sources(
+    *,
+    product: str,
+    subproduct: str,
+    kb_paths: Optional[Iterable[str]] = None,
+    field_paths: Optional[Iterable[str]] = None,
+    prd_paths: Optional[Iterable[str]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming twin of load_all_sources(): same Field → PRD → KB order, but files are
+    read one at a time with the streaming readers, so memory does not grow with the
+    corpus. Empty rows are skipped.
+    """
+    def _rows():
+        for p in _existing(field_paths):
+            yield from iter_table_file_rows(p, product=product, subproduct=subproduct,
+                                            source_type="field", text_pref_cols=FIELD_TEXT_COLS)
+        for p in _existing(prd_paths):
+            if p.lower().endswith((".docx", ".doc")):
+                yield from iter_docx_rows(p, product=product, subproduct=subproduct,
+                                          file_label=os.path.basename(p))
+            elif p.lower().endswith((".csv", ".xlsx", ".xls")):
+                yield from iter_table_file_rows(p, product=product, subproduct=subproduct,
+                                                source_type="prd", text_pref_cols=PRD_TABLE_TEXT_COLS)
+        for p in _existing(kb_paths):
+            yield from iter_table_file_rows(p, product=product, subproduct=subproduct,
+                                            source_type="kb", text_pref_cols=KB_TEXT_COLS)
+
+    for r in _rows():
+        if (r.get("text") or "").strip():
+            yield r
@@ -0,0 +1,80 @@
+# server/utils/query_cache.py
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional
+
+
+@dataclass
+class QueryCacheConfig:
+    enabled: bool = os.getenv("DFMEA_QUERY_CACHE", "1") == "1"
+    max_vectors: int = int(os.getenv("DFMEA_QUERY_CACHE_VECTORS", "4096"))   # query embeddings
+    max_results: int = int(os.getenv("DFMEA_QUERY_CACHE_RESULTS", "4096"))   # search hit lists
+
+
+@dataclass
+class QueryCacheStats:
+    vector_hits: int = 0
+    vector_misses: int = 0
+    result_hits: int = 0
+    result_misses: int = 0
+    invalidations: int = 0
+
+    def as_counts(self) -> Dict[str, int]:
+        return {
+            "query_vector_cache_hits": self.vector_hits,
+            "query_vector_cache_misses": self.vector_misses,
+            "retrieval_cache_hits": self.result_hits,
+            "retrieval_cache_misses": self.result_misses,
+            "retrieval_cache_invalidations": self.invalidations,
+        }
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU map holding at most `max_items` entries (0 = disabled)."""
+
+    def __init__(self, max_items: int):
+        self.max_items = max(0, max_items)
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if not self.max_items:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def clear(self) -> int:
+        with self._lock:
+            n = len(self._data)
+            self._data.clear()
+            return n
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def normalize_query(text: str) -> str:
+    """Cache key form of a query: case-folded, whitespace collapsed."""
+    return " ".join((text or "").casefold().split())
+
+
+def make_caches(cfg: Optional[QueryCacheConfig] = None):
+    """(query-vector LRU, search-result LRU) sized from config; both hold nothing when disabled."""
+    cfg = cfg or QueryCacheConfig()
+    if not cfg.enabled:
+        return LRUCache(0), LRUCache(0)
+    return LRUCache(cfg.max_vectors), LRUCache(cfg.max_results)
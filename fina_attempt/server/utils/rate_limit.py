@@ -0,0 +1,178 @@
+# server/utils/rate_limit.py
+from __future__ import annotations
+
+import email.utils
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional
+
+
+class TokenBucket:
+    """
+    Refills `rate_per_min` units per minute up to `capacity`. Requests larger than the
+    capacity are let through once the bucket is full and leave it in debt, so an
+    oversize request slows the following ones instead of blocking forever.
+    """
+
+    def __init__(self, rate_per_min: float, capacity: Optional[float] = None):
+        self.rate = float(rate_per_min) / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_min)
+        self.level = self.capacity
+        self._t = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._t) * self.rate)
+        self._t = now
+
+    def wait_time(self, n: float, now: float) -> float:
+        """Seconds until n units are available (0 = now)."""
+        self._refill(now)
+        need = min(float(n), self.capacity)
+        return 0.0 if self.level >= need else (need - self.level) / self.rate
+
+    def consume(self, n: float) -> None:
+        self.level -= float(n)
+
+
+@dataclass
+class LimiterStats:
+    requests: int = 0
+    tokens: int = 0
+    throttled: int = 0          # 429s reported via on_throttle()
+    waited_sec: float = 0.0     # time callers spent blocked in acquire()
+    min_window: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "tokens": self.tokens,
+            "throttled": self.throttled,
+            "waited_sec": round(self.waited_sec, 2),
+            "min_window": round(self.min_window, 2),
+        }
+
+
+class AdaptiveRateLimiter:
+    """
+    Client-side limiter for a rate-limited API called from several threads.
+
+    * RPM / TPM token buckets (0 disables one); `burst_sec` worth of quota may be
+      spent at once, matching services that enforce quotas over short windows.
+    * A shared pause: on_throttle(retry_after) stops every caller until the server's
+      Retry-After has passed.
+    * An AIMD in-flight window: +1/window per success (about +1 per round trip),
+      halved on each throttle, between `min_concurrency` and `max_concurrency`.
+
+        limiter.acquire(tokens)          # before the request; blocks as needed
+        try:   call(); limiter.on_success()
+        except RateLimit as e: limiter.on_throttle(retry_after)
+        finally: limiter.release()
+    """
+
+    def __init__(
+        self,
+        *,
+        rpm: float = 0,
+        tpm: float = 0,
+        max_concurrency: int = 4,
+        min_concurrency: int = 1,
+        burst_sec: float = 10.0,
+        default_backoff_sec: float = 5.0,
+    ):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.min_concurrency = max(1, min(int(min_concurrency), self.max_concurrency))
+        self.default_backoff_sec = default_backoff_sec
+        share = max(0.0, burst_sec) / 60.0
+        self._req = TokenBucket(rpm, max(1.0, rpm * share)) if rpm > 0 else None
+        self._tok = TokenBucket(tpm, max(1.0, tpm * share)) if tpm > 0 else None
+        self.window = float(self.max_concurrency)
+        self.inflight = 0
+        self.paused_until = 0.0
+        self.stats = LimiterStats(min_window=self.window)
+        self._cv = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_concurrency, int(self.window))
+
+    def acquire(self, tokens: int = 0) -> None:
+        t0 = time.monotonic()
+        with self._cv:
+            while True:
+                now = time.monotonic()
+                wait = self.paused_until - now
+                if wait <= 0 and self.inflight >= self.limit:
+                    self._cv.wait(timeout=1.0)
+                    continue
+                if wait <= 0:
+                    wait = self._take(tokens, now)
+                if wait <= 0:
+                    break
+                self._cv.wait(timeout=wait)
+            self.inflight += 1
+            self.stats.requests += 1
+            self.stats.tokens += int(tokens)
+            self.stats.waited_sec += time.monotonic() - t0
+
+    def release(self) -> None:
+        with self._cv:
+            self.inflight = max(0, self.inflight - 1)
+            self._cv.notify_all()
+
+    def on_success(self) -> None:
+        with self._cv:
+            self.window = min(float(self.max_concurrency), self.window + 1.0 / max(1.0, self.window))
+            self._cv.notify_all()
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> float:
+        """Halve the window and pause everyone; returns the pause in seconds."""
+        pause = retry_after if retry_after is not None and retry_after >= 0 else self.default_backoff_sec
+        with self._cv:
+            self.stats.throttled += 1
+            self.window = max(float(self.min_concurrency), self.window / 2.0)
+            self.stats.min_window = min(self.stats.min_window, self.window)
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            self._cv.notify_all()
+        return pause
+
+    def _take(self, tokens: int, now: float) -> float:
+        # Check both buckets before taking from either, so a request never pays twice.
+        buckets = [(b, n) for b, n in ((self._req, 1), (self._tok, tokens)) if b is not None]
+        wait = max((b.wait_time(n, now) for b, n in buckets), default=0.0)
+        if wait <= 0:
+            for b, n in buckets:
+                b.consume(n)
+        return wait
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]], now: Optional[float] = None) -> Optional[float]:
+    """
+    Seconds to wait from a 429/503 response's headers: `retry-after-ms` (Azure OpenAI),
+    then `retry-after` as delta-seconds or an HTTP date. None when absent or invalid.
+    """
+    if not headers:
+        return None
+    get = getattr(headers, "get", None)
+    if get is None:
+        return None
+    ms = get("retry-after-ms")
+    if ms:
+        try:
+            return max(0.0, float(ms) / 1000.0)
+        except ValueError:
+            pass
+    ra = get("retry-after")
+    if not ra:
+        return None
+    try:
+        return max(0.0, float(ra))
+    except ValueError:
+        pass
+    try:
+        dt = email.utils.parsedate_to_datetime(ra)
+    except (TypeError, ValueError):
+        return None
+    if dt is None:
+        return None
+    return max(0.0, dt.timestamp() - (now if now is not None else time.time()))
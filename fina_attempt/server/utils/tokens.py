@@ -0,0 +1,79 @@
+# server/utils/tokens.py
+from __future__ import annotations
+
+import os
+from bisect import bisect_left
+from typing import List
+
+# Must match the tokenizer of the embedding model (text-embedding-3-* / ada-002 use cl100k_base)
+TOKEN_ENCODING = os.getenv("DFMEA_TOKEN_ENCODING", "cl100k_base")
+
+# Optional tokenizer; without it, counts fall back to ~4 chars/token
+try:
+    from tiktoken import get_encoding
+    _tok = get_encoding(TOKEN_ENCODING)
+except Exception:  # pragma: no cover
+    _tok = None
+
+_CHARS_PER_TOKEN = 4
+
+
+def count_tokens(text: str) -> int:
+    if not _tok:
+        # rough fallback ~4 chars/token
+        return max(1, len(text or "") // _CHARS_PER_TOKEN)
+    return len(_tok.encode(text or ""))
+
+
+def token_offsets(text: str) -> List[int]:
+    """
+    Character offset at which each token of `text` starts, from a single encode.
+    Without tiktoken every 4 characters count as one token.
+    """
+    if not text:
+        return []
+    if not _tok:
+        return list(range(0, len(text), _CHARS_PER_TOKEN))
+    _, offsets = _tok.decode_with_offsets(_tok.encode(text))
+    return offsets
+
+
+def tokens_in_span(offsets: List[int], start: int, end: int) -> int:
+    """Number of tokens (per token_offsets()) that overlap text[start:end]."""
+    if end <= start or not offsets:
+        return 0
+    # tokens of one multi-byte character share a start offset
+    first = bisect_left(offsets, start)
+    if first == len(offsets) or offsets[first] != start:
+        first -= 1  # the token that starts before `start` runs into the span
+    return bisect_left(offsets, end) - max(first, 0)
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of `text`, cut where a token starts, that encodes to <= max_tokens."""
+    if max_tokens <= 0 or not text:
+        return ""
+    offsets = token_offsets(text)
+    n = max_tokens
+    while len(offsets) > n > 0:
+        head = text[:offsets[n]]
+        # a prefix can re-encode differently at the cut; shorten until it fits
+        if count_tokens(head) <= max_tokens:
+            return head
+        n -= 1
+    return text if len(offsets) <= max_tokens else ""
+
+
+def split_tokens(text: str, max_tokens: int) -> List[str]:
+    """Consecutive pieces of `text` (concatenating to it) of <= max_tokens tokens each."""
+    if max_tokens <= 0:
+        return [text] if text else []
+    # encode a bounded window per piece so splitting stays linear in the text length
+    window = max_tokens * 8
+    pieces: List[str] = []
+    pos = 0
+    while pos < len(text):
+        head = truncate_tokens(text[pos:pos + window], max_tokens) or text[pos]
+        pieces.append(head)
+        pos += len(head)
+    return pieces
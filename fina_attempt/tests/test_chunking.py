@@ -0,0 +1,104 @@
+# tests/test_chunking.py
+import tiktoken
+
+from server.agents.chunking_agent import ChunkingAgent, ChunkingConfig
+from server.utils import tokens
+
+# one token per UTF-8 byte: exact counts without downloading a BPE vocabulary
+_BYTES = tiktoken.Encoding(
+    "bytes",
+    pat_str=r"""\s?\S+|\s+""",
+    mergeable_ranks={bytes([i]): i for i in range(256)},
+    special_tokens={},
+)
+
+
+def test_token_budget_chunks_cut_on_sentences_and_carry_counts(monkeypatch):
+    monkeypatch.setattr(tokens, "_tok", _BYTES)
+    sentences = [f"Requirement {i} shall hold at {i * 10} lux – “outdoors”." for i in range(12)]
+    text = " ".join(sentences) + " " + "Z" * 300
+    item = {"product": "Q", "subproduct": "D", "source_type": "prd", "file": "p.docx", "idx": 4, "text": text}
+
+    cfg = ChunkingConfig(unit="tokens", max_tokens=120, overlap_tokens=0)
+    chunks = ChunkingAgent(cfg).run([item])
+
+    assert [c["meta"]["chunk_id"] for c in chunks] == list(range(len(chunks)))
+    for c in chunks:
+        assert c["meta"]["tokens"] == len(_BYTES.encode(c["chunk"])) <= 120
+    # sentence chunks end on a sentence; only the over-long tail is hard-split
+    body = [c["chunk"] for c in chunks if "ZZ" not in c["chunk"]]
+    assert body and all(ch.endswith("”.") for ch in body)
+    assert " ".join(body) == " ".join(sentences)
+    assert "".join(c["chunk"] for c in chunks if c["chunk"].startswith("Z")) == "Z" * 300
+
+    overlapped = ChunkingAgent(ChunkingConfig(unit="tokens", max_tokens=120, overlap_tokens=20)).run([item])
+    assert all(c["meta"]["tokens"] <= 120 for c in overlapped)
+    # the next chunk repeats the tail of the previous one
+    assert overlapped[0]["chunk"].endswith(overlapped[1]["chunk"].split(" Requirement")[0])
+
+
+def test_char_mode_is_unchanged_and_has_no_token_count():
+    item = {"text": "Short text. " * 3, "source_type": "kb"}
+    (chunk,) = ChunkingAgent().run([item])
+    assert chunk["chunk"] == "Short text. Short text. Short text." and "tokens" not in chunk["meta"]
+
+
+def test_sentence_chunks_are_slices_with_char_overlap():
+    cfg = ChunkingConfig(chunk_size=80, chunk_overlap=10, min_chunk_size=20)
+    text = " ".join(f"Sentence number {i} is long enough to stand alone as its own chunk." for i in range(4))
+    chunks = [c["chunk"] for c in ChunkingAgent(cfg).run([{"text": text}])]
+    assert chunks[0] == "Sentence number 0 is long enough to stand alone as its own chunk."
+    # overlap = last 10 chars of the previous chunk, taken straight from the text
+    assert chunks[1] == "own chunk. Sentence number 1 is long enough to stand alone as its own chunk."
+    assert all(ch in text for ch in chunks) and len(chunks) == 4
+
+    # thousands of micro-sentences are merged without quadratic concatenation
+    terse = ChunkingAgent(cfg).run([{"text": "OK. " * 20000}])
+    assert all(len(c["chunk"]) <= 80 + 10 + 1 for c in terse)
+
+
+def test_parallel_run_matches_serial():
+    items = [
+        {"source_type": "prd", "file": f"f{i % 3}.docx", "idx": i,
+         "text": " ".join(f"Requirement {i}.{j} shall be met at {j * 5} degrees." for j in range(i % 40))}
+        for i in range(300)
+    ]
+    serial = ChunkingAgent(ChunkingConfig(chunk_size=200, chunk_overlap=30)).run(items)
+    parallel = ChunkingAgent(ChunkingConfig(chunk_size=200, chunk_overlap=30, workers=2, batch_items=64)).run(iter(items))
+    assert parallel == serial
+
+
+def _prd(idx, text, rid=None, file="spec.docx"):
+    return {"source_type": "prd", "file": file, "idx": idx, "text": text, "requirement_id": rid}
+
+
+def test_prd_blocks_are_grouped_per_requirement_within_budget():
+    rows = [
+        _prd(0, "Introduction paragraph without any requirement."),
+        _prd(1, "4.17.4 Touch Panel"),
+        _prd(2, "4.17.4.1.2 Palm Rejection"),
+        _prd(3, "Quasar-5139 - Palm Rejection The touch panel shall support palm rejection.", "Quasar-5139"),
+        _prd(4, "Shall Have, Req't Team Approved, System Requirement"),
+        _prd(5, "Quasar-5141 - Light Transmission. The touch panel shall transmit 85% of light.", "Quasar-5141"),
+        *[_prd(6 + i, f"Index: {i} | Description: glove type {i} that has to be supported by the panel") for i in range(6)],
+        {"source_type": "kb", "file": "kb.csv", "idx": 0, "text": "KB rows are never grouped."},
+    ]
+    cfg = ChunkingConfig(chunk_size=200, chunk_overlap=0)
+    chunks = ChunkingAgent(cfg).run(rows)
+    metas = [(c["meta"]["idx"], c["meta"].get("idx_last"), c["meta"].get("requirement_id")) for c in chunks]
+    assert metas == [
+        (0, None, None),
+        (1, 4, "Quasar-5139"),      # headings + requirement + its follow-up row
+        (5, 6, "Quasar-5141"),      # table rows join until the 200-char budget ...
+        (7, 8, "Quasar-5141"),      # ... then continue under the same requirement
+        (9, 10, "Quasar-5141"),
+        (11, None, "Quasar-5141"),
+        (0, None, None),
+    ]
+    assert chunks[1]["chunk"].startswith("4.17.4 Touch Panel 4.17.4.1.2 Palm Rejection Quasar-5139")
+    assert all(len(c["chunk"]) <= 200 for c in chunks)
+
+    # shards never cut a group, so the pool gives the serial result
+    par = ChunkingAgent(ChunkingConfig(chunk_size=200, chunk_overlap=0, workers=2, batch_items=2)).run(rows)
+    assert par == chunks
+    assert len(ChunkingAgent(ChunkingConfig(chunk_size=200, chunk_overlap=0, group_requirements=False)).run(rows)) == len(rows)
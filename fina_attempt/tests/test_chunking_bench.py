@@ -0,0 +1,33 @@
+# tests/test_chunking_bench.py
+import os
+
+import pytest
+
+from benchmarks import bench_chunking as bench
+
+QUICK_SCALE = 0.05
+_RUN = (bench.load_baseline().get("runs") or {}).get(f"{QUICK_SCALE:g}")
+
+
+@pytest.mark.skipif(_RUN is None, reason="no quick-scale chunking baseline")
+def test_chunking_output_matches_baseline():
+    # Chunk counts and length distribution are deterministic: a diff here means
+    # chunking_agent.py changed behavior (re-run the benchmark with --update-baseline
+    # if that was intended). Throughput is only enforced with DFMEA_BENCH_STRICT=1, and at
+    # this scale single cases take milliseconds, so mostly through the geomean.
+    strict = os.getenv("DFMEA_BENCH_STRICT") == "1"
+    results = bench.run_suite(scale=QUICK_SCALE, repeat=3 if strict else 1, in_process=True, calibrated=strict)
+    assert set(results) >= set(_RUN["cases"])
+    problems = bench.compare(
+        results, _RUN, tokenizer=bench.tokenizer_name(), tolerance=0.15, case_tolerance=0.8, check_speed=strict,
+    )
+    assert not problems, "\n".join(problems)
+
+
+def test_synthetic_corpora_are_deterministic():
+    for name in bench.CORPORA:
+        a = bench.make_corpus(name, 0.01)
+        assert a == bench.make_corpus(name, 0.01)
+        assert a and all(it["text"] for it in a)
+    prd = bench.make_corpus("prd", 0.05)
+    assert any(it["requirement_id"] for it in prd) and any(it["text"][0].isdigit() for it in prd)
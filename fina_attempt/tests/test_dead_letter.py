@@ -0,0 +1,82 @@
+# tests/test_dead_letter.py
+import numpy as np
+import pytest
+
+from server.agents import embedding_agent
+from server.agents.embedding_backends import EmbeddingBackend
+from server.pipeline.dead_letter import DeadLetterConfig, DeadLetterLog
+from server.pipeline.index_manifest import IndexManifest, IndexManifestConfig, chunk_hash
+from server.utils.embedding_cache import EmbeddingCache, EmbeddingCacheConfig
+
+
+def _log(tmp_path):
+    return DeadLetterLog(
+        collection="c", product="P", subproduct="S", cfg=DeadLetterConfig(dead_letter_dir=str(tmp_path)),
+    )
+
+
+class _FlakyBackend(EmbeddingBackend):
+    name = "flaky"
+
+    def __init__(self, fail_on):
+        self.fail_on = fail_on
+
+    def embed(self, texts):
+        if any(self.fail_on in t for t in texts):
+            raise ConnectionError("service unavailable")
+        return np.ones((len(texts), 2), np.float32)
+
+
+def test_failed_batch_goes_to_dead_letter_log(monkeypatch, tmp_path):
+    monkeypatch.setattr(embedding_agent, "get_embedding_cache", lambda: EmbeddingCache(EmbeddingCacheConfig(enabled=False)))
+    monkeypatch.setenv("EMBED_BATCH_SIZE", "2")
+    agent = embedding_agent.EmbeddingAgent(_FlakyBackend("bad"))
+    agent.dead_letter = log = _log(tmp_path)
+    items = [{"chunk": t, "meta": {"source_type": "kb", "file": "kb.csv", "point_id": f"p{i}"}}
+             for i, t in enumerate(["ok 1", "ok 2", "bad 3", "ok 4", "ok 5"])]
+
+    out = agent.run(items)
+
+    assert [r["metadata"]["point_id"] for r in out] == ["p0", "p1", "p4"]
+    (entry,) = log.pending()
+    assert [r["metadata"]["point_id"] for r in entry["records"]] == ["p2", "p3"]
+    assert entry["records"][0] == {"text": "bad 3", "metadata": items[2]["meta"]}
+    assert "ConnectionError" in entry["error"]
+    (summary,) = _log(tmp_path).summary()  # durable: a fresh log sees it
+    assert summary["chunks"] == 2 and summary["sources"] == ["kb.csv"]
+
+
+def test_failed_query_raises_and_is_never_dead_lettered(monkeypatch, tmp_path):
+    monkeypatch.setattr(embedding_agent, "get_embedding_cache", lambda: EmbeddingCache(EmbeddingCacheConfig(enabled=False)))
+    agent = embedding_agent.EmbeddingAgent(_FlakyBackend("bad"))
+    agent.dead_letter = log = _log(tmp_path)
+
+    assert agent.embed_query("ok query").shape == (2,)
+    with pytest.raises(ConnectionError):
+        agent.embed_query("bad query")
+    assert log.pending() == []
+
+
+def test_resolve_rewrites_and_skips_torn_lines(tmp_path):
+    log = _log(tmp_path)
+    a = log.append([{"text": "a", "metadata": {}}], "boom")
+    b = log.append([{"text": "b", "metadata": {"n": np.int64(3)}}], RuntimeError("x"))
+    with open(log.path, "a", encoding="utf-8") as fh:
+        fh.write('{"id": "torn", "reco')
+
+    assert [e["id"] for e in log.pending()] == [a, b]
+    assert log.resolve([a]) == 1
+    assert [e["id"] for e in log.pending()] == [b]
+    assert log.clear() == 1 and log.pending() == []
+
+
+def test_manifest_add_points_after_replay(tmp_path):
+    m = IndexManifest(collection="c", product="P", subproduct="S", cfg=IndexManifestConfig(manifest_dir=str(tmp_path)))
+    hashes = [chunk_hash(t) for t in ("x", "y", "z")]
+    ids = m.point_ids("kb:/a.csv", hashes)
+    m.record("kb:/a.csv", path="/a.csv", sha256="h", chunks=hashes, points=[ids[0], ids[2]])
+
+    assert m.missing_points() == {ids[1]: "kb:/a.csv"}
+    assert m.add_points([ids[1], "unknown"]) == 1
+    assert m.files["kb:/a.csv"]["points"] == ids
+    assert m.missing_points() == {}
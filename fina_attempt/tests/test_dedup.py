@@ -0,0 +1,41 @@
+# tests/test_dedup.py
+from server.agents.dedup_agent import DedupAgent, DedupConfig
+
+FAILURE = (
+    "Customer reported cracked touch panel after a one metre drop onto concrete; "
+    "glass fractured from the lower left corner and touch stopped responding. Part {pn}, logged {date}."
+)
+
+
+def _chunk(text, source_type="kb", file="kb.csv", idx=0):
+    meta = {"product": "Q", "subproduct": "D", "source_type": source_type, "file": file, "idx": idx, "chunk_id": 0}
+    return {"chunk": text, "meta": meta}
+
+
+def test_exact_and_near_duplicates_fold_into_first_with_aliases():
+    chunks = [
+        _chunk(FAILURE.format(pn="PN-1001", date="2024-01-05"), idx=0),
+        _chunk("Display flickers at low brightness when the backlight PWM drops below 200 Hz.", idx=1),
+        _chunk(FAILURE.format(pn="PN-1001", date="2024-01-05").upper(), idx=2),    # exact (case)
+        _chunk(FAILURE.format(pn="PN-2077", date="2025-11-30"), idx=3),            # near: numbers only
+        _chunk(FAILURE.format(pn="PN-1001", date="2024-01-05"), source_type="prd", file="p.docx", idx=4),
+    ]
+    out = DedupAgent(DedupConfig(enabled=True)).run(chunks)
+
+    assert [c["meta"]["idx"] for c in out] == [0, 1, 4]   # other sources are never folded in
+    rep = out[0]["meta"]
+    assert rep["dup_count"] == 2
+    assert rep["aliases"] == [{"file": "kb.csv", "idx": 2, "chunk_id": 0}, {"file": "kb.csv", "idx": 3, "chunk_id": 0}]
+    assert "aliases" not in chunks[0]["meta"]   # inputs are not mutated
+
+
+def test_prd_numbers_matter_and_streaming_dedups_per_file():
+    spec = "Display shall be readable outdoors in direct sunlight at {lux} lux with full backlight on."
+    prd = [_chunk(spec.format(lux=20000), "prd", "p.docx", 0), _chunk(spec.format(lux=50000), "prd", "p.docx", 1)]
+    agent = DedupAgent(DedupConfig(enabled=True))
+    assert len(agent.run(prd)) == 2
+
+    same = "Glass cracked after drop test on corner."
+    stream = [_chunk(same, file="a.csv", idx=0), _chunk(same, file="a.csv", idx=1), _chunk(same, file="b.csv", idx=0)]
+    out = list(agent.iter_dedup(stream))
+    assert [(c["meta"]["file"], c["meta"].get("dup_count", 0)) for c in out] == [("a.csv", 1), ("b.csv", 0)]
@@ -0,0 +1,83 @@
+# tests/test_dim_reduction.py
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from benchmarks.bench_dimensions import run_suite, synthetic_vectors
+from server.agents import embedding_agent, embedding_backends
+from server.agents.embedding_backends import EmbeddingBackend
+from server.utils.dim_reduction import DimReduction, DimReductionConfig, fit_pca
+from server.utils.embedding_cache import EmbeddingCache, EmbeddingCacheConfig
+
+
+def test_truncate_and_pca_reduce_to_unit_vectors(tmp_path):
+    x, _ = synthetic_vectors(400, 1, dim=64)
+
+    t = DimReduction("truncate", 16).apply(x)
+    assert t.shape == (400, 16) and np.allclose(np.linalg.norm(t, axis=1), 1, atol=1e-5)
+    assert np.allclose(t[0], x[0, :16] / np.linalg.norm(x[0, :16]), atol=1e-6)
+
+    fitted = fit_pca(x, 32, str(tmp_path / "pca.npz"))
+    assert 0.5 < float(fitted["explained"]) <= 1
+    p = DimReduction("pca", 16, str(tmp_path / "pca.npz"))
+    assert p.apply(x).shape == (400, 16)
+    assert p.as_dict() == {"method": "pca", "dims": 16, "pca_path": str(tmp_path / "pca.npz")}
+    with pytest.raises(ValueError):
+        DimReduction("pca", 64, str(tmp_path / "pca.npz"))
+
+
+def test_from_config_picks_api_for_remote_and_truncate_for_local():
+    cfg = DimReductionConfig(dims=256, method="auto")
+    assert DimReduction.from_config(cfg, remote=True).request_dims == 256
+    local = DimReduction.from_config(cfg, remote=False)
+    assert (local.method, local.request_dims) == ("truncate", 0)
+    assert DimReduction.from_config(DimReductionConfig(dims=0)).method == "native"
+
+
+class _Local(EmbeddingBackend):
+    name = "local-dims"
+
+    def embed(self, texts):
+        return np.tile(np.arange(1, 9, dtype=np.float32), (len(texts), 1))
+
+
+def test_agent_reduces_locally_but_caches_full_size(monkeypatch, tmp_path):
+    cache = EmbeddingCache(EmbeddingCacheConfig(path=str(tmp_path / "c.sqlite")))
+    monkeypatch.setattr(embedding_agent, "get_embedding_cache", lambda: cache)
+    agent = embedding_agent.EmbeddingAgent(_Local(), reduction=DimReduction("truncate", 2))
+
+    out = agent.run([{"chunk": "abc", "meta": {"source_type": "kb"}}])
+
+    assert out.dim == 2 and np.allclose(out.vectors[0], np.array([1, 2]) / np.sqrt(5))
+    assert cache.get_many("local-dims", 0, ["abc"])[0].shape == (8,)
+    assert agent.profile() == {"backend": "local-dims", "reduction": {"method": "truncate", "dims": 2}}
+    with pytest.raises(ValueError):
+        embedding_agent.EmbeddingAgent(_Local(), reduction=DimReduction("api", 2))
+
+
+def test_azure_backend_requests_dimensions(monkeypatch):
+    seen = {}
+
+    def create(input, model, **kw):
+        seen.update(kw)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[1.0, 0.0]) for _ in input])
+
+    client = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+    monkeypatch.setattr(embedding_agent, "get_embedding_cache", lambda: EmbeddingCache(EmbeddingCacheConfig(enabled=False)))
+    backend = embedding_backends.AzureOpenAIBackend(client, "text-embedding-3-large")
+    agent = embedding_agent.EmbeddingAgent(backend, reduction=DimReduction("api", 256))
+
+    agent.run([{"chunk": "abc", "meta": {"source_type": "kb"}}])
+    assert seen == {"dimensions": 256} and agent.dimensions == 256
+
+
+def test_dimension_benchmark_reports_recall_against_full_size():
+    corpus, queries = synthetic_vectors(600, 20, dim=96)
+    rows = run_suite(corpus, queries, dims=[48, 16], k=5, fit_sample=300, log=None)
+
+    by = {r["config"]: r for r in rows}
+    assert set(by) == {"native", "truncate-48", "pca-48", "truncate-16", "pca-16"}
+    assert by["native"]["recall@5"] == 1.0
+    assert by["pca-16"]["recall@5"] <= by["pca-48"]["recall@5"]
+    assert by["truncate-16"]["vector_mb"] < by["native"]["vector_mb"]
@@ -0,0 +1,123 @@
+# tests/test_embedding_backends.py
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from server.agents import embedding_agent, embedding_backends
+from server.agents.embedding_backends import EmbeddingBackend, OnnxBackend, OnnxBackendConfig, length_groups
+from server.utils.embedding_cache import EmbeddingCache, EmbeddingCacheConfig
+
+
+class _WordTokenizer:
+    """Stands in for tokenizers.Tokenizer: one id per word (its length), truncated."""
+
+    def __init__(self):
+        self.max_length = None
+
+    def enable_truncation(self, max_length):
+        self.max_length = max_length
+
+    def no_padding(self):
+        pass
+
+    def encode_batch(self, texts):
+        return [SimpleNamespace(ids=[len(w) for w in t.split()][: self.max_length]) for t in texts]
+
+
+class _Session:
+    """Stands in for onnxruntime.InferenceSession: hidden state = [id, 1] per token."""
+
+    def __init__(self):
+        self.shapes = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input_ids"), SimpleNamespace(name="attention_mask")]
+
+    def run(self, _outputs, feeds):
+        ids = feeds["input_ids"]
+        self.shapes.append(ids.shape)
+        return [np.stack([ids.astype(np.float32), np.ones_like(ids, dtype=np.float32)], axis=-1)]
+
+
+def test_length_groups_bound_padded_tokens():
+    lengths = [3, 40, 5, 8, 200, 1, 39, 6]
+    groups = length_groups(lengths, max_batch_tokens=80, max_batch_size=3)
+
+    assert sorted(i for g in groups for i in g) == list(range(len(lengths)))
+    for g in groups:
+        assert len(g) <= 3
+        assert len(g) == 1 or len(g) * max(lengths[i] for i in g) <= 80
+    widths = [max(lengths[i] for i in g) for g in groups]
+    assert widths == sorted(widths)
+    assert [4] in groups  # over-long input runs alone
+
+
+def test_onnx_backend_dynamic_batching_and_mean_pooling():
+    session = _Session()
+    cfg = OnnxBackendConfig(model_dir="/models/mini", max_length=6, max_batch_tokens=12, max_batch_size=8, threads=2)
+    backend = OnnxBackend(cfg, session=session, tokenizer=_WordTokenizer())
+    texts = ["aa " * 6, "a", "aaaa bb", "a b c d e f g h", "xyz"]
+
+    out = backend.embed(texts)
+
+    assert out.shape == (5, 2) and out.dtype == np.float32
+    # padded batch never exceeds the budget and short inputs share a batch
+    assert all(b * w <= 12 or b == 1 for b, w in session.shapes)
+    assert session.shapes == [(3, 2), (2, 6)]
+    # mean over real tokens only (padding masked), original order, unit length
+    expected = np.array([[2, 1], [1, 1], [3, 1], [1, 1], [3, 1]], np.float32)
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    assert np.allclose(out, expected)
+    assert backend.name.startswith("onnx:mini/")
+
+
+class _LocalBackend(EmbeddingBackend):
+    name = "local-test"
+
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[float(len(t)), 1.0] for t in texts], np.float32)
+
+
+def test_agent_uses_local_backend_with_same_record_shape(monkeypatch, tmp_path):
+    cache = EmbeddingCache(EmbeddingCacheConfig(path=str(tmp_path / "c.sqlite")))
+    monkeypatch.setattr(embedding_agent, "get_embedding_cache", lambda: cache)
+    monkeypatch.setenv("EMBED_CONCURRENCY", "4")
+    monkeypatch.setenv("EMBED_MAX_INPUT_TOKENS", "4")
+    backend = _LocalBackend()
+    agent = embedding_agent.EmbeddingAgent(backend)
+    items = [{"chunk": "word " * (i + 10), "meta": {"source_type": "kb", "idx": i}} for i in range(5)]
+
+    out = agent.run(items)
+
+    assert agent.limiter is None and agent.cooldown == 0
+    assert [r["metadata"]["idx"] for r in out] == list(range(5))
+    assert set(out[0]) == {"text", "embedding", "vector", "metadata", "tokens"}
+    assert out[2]["vector"] == [float(len(items[2]["chunk"])), 1.0]  # not truncated by the agent
+    assert len(cache) == 5 and cache.get_many("local-test", 0, [items[0]["chunk"]])[0] is not None
+
+    agent.run(items)
+    assert len(backend.calls) == 1  # second run served from the cache
+    assert agent.embed_query("word " * 10).tolist() == [50.0, 1.0]
+
+
+def test_backend_selected_per_collection(monkeypatch):
+    monkeypatch.setattr(embedding_backends, "EMBED_BACKEND", "azure")
+    monkeypatch.setattr(embedding_backends, "EMBED_BACKENDS", "onprem=onnx, lab = sentence-transformers")
+    assert embedding_backends.backend_name_for("onprem") == "onnx"
+    assert embedding_backends.backend_name_for("lab") == "sentence-transformers"
+    assert embedding_backends.backend_name_for("dfmea_corpus") == "azure"
+    with pytest.raises(ValueError):
+        embedding_backends.make_backend("word2vec")
+
+
+def test_backend_without_embed_cannot_be_created():
+    class _NoEmbed(EmbeddingBackend):
+        name = "no-embed"
+
+    with pytest.raises(TypeError):
+        _NoEmbed()
@@ -0,0 +1,53 @@
+# tests/test_embedding_batch.py
+import numpy as np
+import pytest
+
+from server.utils.embedding_batch import EmbeddingBatch
+
+
+def _batch(n=4, dim=3, start=0):
+    vecs = np.arange(n * dim, dtype=np.float64).reshape(n, dim) + start
+    metas = [{"source_type": "kb", "idx": start + i} for i in range(n)]
+    metas[0]["aliases"] = [{"file": "a.csv", "idx": 9}]
+    return EmbeddingBatch(vecs, [f"t{start + i}" for i in range(n)], metas, [5] * n)
+
+
+def test_rows_are_views_and_read_like_old_records():
+    b = _batch()
+    assert b.vectors.dtype == np.float32 and b.vectors.flags["C_CONTIGUOUS"]
+    assert b.nbytes == 4 * 3 * 4 + 4 * 4
+
+    row = b[1]
+    assert np.shares_memory(row.vector, b.vectors)
+    assert row["vector"] == row["embedding"] == [3.0, 4.0, 5.0]
+    assert row["metadata"] == {"source_type": "kb", "idx": 1}       # no "aliases" key on rows that lacked it
+    assert b[0]["metadata"]["aliases"] == [{"file": "a.csv", "idx": 9}]
+    assert set(row) == {"text", "embedding", "vector", "metadata", "tokens"}
+    assert row.get("id") is None and row.get("tokens") == 5
+
+    row["id"] = "p-1"
+    assert b.ids[1] == "p-1" and row.to_dict()["id"] == "p-1"
+    with pytest.raises(TypeError):
+        row["text"] = "x"
+
+
+def test_slice_concat_and_round_trip():
+    a, b = _batch(), _batch(2, start=10)
+    b.columns["point_id"] = ["x", "y"]
+    s = a[1:3]
+    assert len(s) == 2 and np.shares_memory(s.vectors, a.vectors)
+    assert [r["metadata"]["idx"] for r in s] == [1, 2]
+
+    c = EmbeddingBatch.concat([a, EmbeddingBatch.empty(), b])
+    assert len(c) == 6 and c.vectors.shape == (6, 3)
+    assert [r.metadata.get("point_id") for r in c] == [None] * 4 + ["x", "y"]
+    assert next(c.payloads()) == {"text": "t0", "source_type": "kb", "idx": 0, "aliases": [{"file": "a.csv", "idx": 9}]}
+
+    again = EmbeddingBatch.from_records(c.to_records())
+    assert np.array_equal(again.vectors, c.vectors)
+    assert [r.metadata for r in again] == [r.metadata for r in c]
+
+
+def test_shape_mismatch_is_rejected():
+    with pytest.raises(ValueError):
+        EmbeddingBatch(np.zeros((2, 3)), ["only one"])
@@ -0,0 +1,138 @@
+# tests/test_embedding_batching.py
+from types import SimpleNamespace
+
+import pytest
+import tiktoken
+
+from server.agents import embedding_agent, embedding_backends
+from server.utils.embedding_cache import EmbeddingCache, EmbeddingCacheConfig
+from server.utils import tokens
+
+# one token per UTF-8 byte: exact counts without downloading a BPE vocabulary
+_BYTES = tiktoken.Encoding(
+    "bytes",
+    pat_str=r"""\s?\S+|\s+""",
+    mergeable_ranks={bytes([i]): i for i in range(256)},
+    special_tokens={},
+)
+
+
+class _Recorder:
+    def __init__(self):
+        self.requests = []
+
+    def create(self, input, model):
+        self.requests.append(list(input))
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[1.0, float(len(t))]) for t in input])
+
+
+@pytest.fixture
+def agent(monkeypatch, tmp_path):
+    monkeypatch.setattr(tokens, "_tok", _BYTES)
+    monkeypatch.setattr(embedding_agent, "_count_tokens", tokens.count_tokens)
+    fake = _Recorder()
+    monkeypatch.setattr(embedding_backends, "get_azure_openai_client", lambda: SimpleNamespace(embeddings=fake))
+    monkeypatch.setattr(embedding_backends, "AZURE_EMBEDDING_DEPLOYMENT", "test-embed")
+    cache = EmbeddingCache(EmbeddingCacheConfig(path=str(tmp_path / "emb.sqlite")))
+    monkeypatch.setattr(embedding_agent, "get_embedding_cache", lambda: cache)
+    for k, v in {
+        "EMBED_BATCH_SIZE": "5", "EMBED_MAX_BATCH_TOKENS": "100", "EMBED_MAX_INPUT_TOKENS": "40",
+        "EMBED_BATCH_COOLDOWN_SEC": "0", "EMBED_CONCURRENCY": "1",
+    }.items():
+        monkeypatch.setenv(k, v)
+    a = embedding_agent.EmbeddingAgent()
+    a.fake = fake
+    return a
+
+
+def test_packs_by_tokens_and_inputs_in_order(agent):
+    # upstream counts win over re-counting: "tokens" in meta is what gets budgeted
+    items = [{"chunk": f"row {i}", "meta": {"source_type": "kb", "idx": i, "tokens": t}}
+             for i, t in enumerate([30, 30, 30, 10, 5, 5, 5, 5, 5, 5, 40])]
+    out = agent.run(items)
+
+    assert [len(r) for r in agent.fake.requests] == [4, 5, 2]       # 100 tokens | 5 inputs | 5 + 40
+    assert [r["metadata"]["idx"] for r in out] == list(range(11))
+    assert [r["tokens"] for r in out] == [30, 30, 30, 10, 5, 5, 5, 5, 5, 5, 40]
+
+
+def test_oversize_input_is_truncated_without_failing_its_batch(agent):
+    items = [{"chunk": "short", "meta": {"source_type": "kb"}},
+             {"chunk": "é" * 50, "meta": {"source_type": "kb"}}]   # 100 byte-tokens
+    out = agent.run(items)
+
+    sent = agent.fake.requests[0]
+    assert sent[0] == "short" and sent[1] == "é" * 20                 # 40 tokens, whole characters
+    assert [r["text"] for r in out] == ["short", "é" * 50]           # payload keeps the original text
+    assert out[1]["tokens"] == 40
+
+
+def test_oversize_input_split_and_averaged(agent):
+    agent.oversize = "split"
+    long = "abcdefghij" * 7                                           # 70 tokens -> 40 + 30
+    out = agent.run([{"chunk": long, "meta": {"source_type": "prd"}}])
+
+    assert agent.fake.requests == [[long[:40], long[40:]]]
+    assert len(out) == 1 and out[0]["tokens"] == 70
+    assert sum(x * x for x in out[0]["vector"]) == pytest.approx(1.0)
+
+    # pieces beyond one request's token budget (100 // 40 = 2 pieces) are dropped
+    out = agent.run([{"chunk": long * 2, "meta": {"source_type": "prd"}}])
+    assert out[0]["tokens"] == 80
+
+
+def test_split_tokens_respects_character_boundaries(monkeypatch):
+    monkeypatch.setattr(tokens, "_tok", _BYTES)
+    text = "ab€cd€" * 7
+    pieces = tokens.split_tokens(text, 5)
+    assert "".join(pieces) == text
+    assert all(0 < tokens.count_tokens(p) <= 5 for p in pieces)
+    assert tokens.truncate_tokens(text, 3) == "ab"
+
+
+def test_cache_hits_skip_the_api_across_runs(agent):
+    items = [{"chunk": f"row {i}", "meta": {"source_type": "kb", "idx": i}} for i in range(6)]
+    first = agent.run(items)
+    assert agent.cache_stats.as_counts() == {"embed_cache_hits": 0, "embed_cache_misses": 6}
+
+    calls = len(agent.fake.requests)
+    again = agent.run(items + [{"chunk": "row new", "meta": {"source_type": "kb", "idx": 6}}])
+    assert agent.cache_stats.as_counts() == {"embed_cache_hits": 6, "embed_cache_misses": 1}
+    assert agent.cache_totals.as_counts() == {"embed_cache_hits": 6, "embed_cache_misses": 7}
+    assert agent.fake.requests[calls:] == [["row new"]]
+    assert [r["vector"] for r in again[:6]] == [r["vector"] for r in first]
+    assert [r["metadata"]["idx"] for r in again] == list(range(7))
+
+    # a different deployment or dimension never reuses these vectors
+    agent.dimensions = 256
+    agent.run(items[:1])
+    assert agent.cache_stats.misses == 1
+
+
+def test_embed_query_is_one_direct_request(agent, monkeypatch):
+    indexed = agent.run([{"chunk": "row 0", "meta": {"source_type": "kb"}}])
+    stats = agent.cache_stats
+    agent.cooldown = 5
+    monkeypatch.setattr(embedding_agent.time, "sleep", lambda s: pytest.fail("query slept"))
+    agent.dead_letter = SimpleNamespace(append=lambda *a: pytest.fail("query dead-lettered"))
+
+    calls = len(agent.fake.requests)
+    assert list(agent.embed_query("row 0")) == indexed[0]["vector"]       # served from the cache
+    agent.embed_query("where does it crack")
+    assert agent.fake.requests[calls:] == [["where does it crack"]]
+    assert agent.cache_stats is stats and stats.as_counts() == {"embed_cache_hits": 0, "embed_cache_misses": 1}
+
+    agent.fake.create = lambda input, model: (_ for _ in ()).throw(ConnectionError("down"))
+    with pytest.raises(ConnectionError):
+        agent.embed_query("unseen query")
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(EmbeddingCacheConfig(path=str(tmp_path / "e.sqlite"), max_bytes=4 * 16))
+    vec = [0.5] * 4                                                   # 16 bytes as float32
+    cache.put_many("m", 0, ["a", "b", "c", "d"], [vec] * 4)
+    assert cache.get_many("m", 0, ["a"])[0] is not None               # "a" becomes most recent
+    cache.put_many("m", 0, ["e"], [vec])
+    hits = [v is not None for v in cache.get_many("m", 0, ["a", "b", "c", "d", "e"])]
+    assert hits[0] and hits[4] and sum(hits) <= 4 and not hits[1]
+    assert cache.get_many("m", 0, ["e"])[0].dtype == "float32"
@@ -0,0 +1,105 @@
+# tests/test_embedding_concurrency.py
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+from openai import RateLimitError
+
+from server.agents import embedding_agent, embedding_backends
+from server.utils.embedding_cache import EmbeddingCache, EmbeddingCacheConfig
+from server.utils.rate_limit import AdaptiveRateLimiter, parse_retry_after
+
+
+class _FakeEmbeddings:
+    def __init__(self, throttle_first: int = 0, retry_after_ms: str = "50"):
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.peak = 0
+        self.calls = 0
+        self.throttle_first = throttle_first
+        self.retry_after_ms = retry_after_ms
+
+    def create(self, input, model):
+        with self.lock:
+            self.calls += 1
+            throttle = self.calls <= self.throttle_first
+            self.inflight += 1
+            self.peak = max(self.peak, self.inflight)
+        try:
+            if throttle:
+                resp = httpx.Response(
+                    429, headers={"retry-after-ms": self.retry_after_ms},
+                    request=httpx.Request("POST", "https://example.invalid/embeddings"),
+                )
+                raise RateLimitError("rate limited", response=resp, body=None)
+            time.sleep(random.uniform(0.001, 0.02))
+            return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(t))]) for t in input])
+        finally:
+            with self.lock:
+                self.inflight -= 1
+
+
+def _agent(monkeypatch, fake, **env):
+    client = SimpleNamespace(embeddings=fake)
+    monkeypatch.setattr(embedding_agent, "get_embedding_cache", lambda: EmbeddingCache(EmbeddingCacheConfig(enabled=False)))
+    monkeypatch.setattr(embedding_backends, "get_azure_openai_client", lambda: client)
+    monkeypatch.setattr(embedding_backends, "AZURE_EMBEDDING_DEPLOYMENT", "test-embed")
+    for k, v in {"EMBED_BATCH_SIZE": "3", "EMBED_BATCH_COOLDOWN_SEC": "0", **env}.items():
+        monkeypatch.setenv(k, v)
+    return embedding_agent.EmbeddingAgent()
+
+
+def _items(n):
+    return [{"chunk": "x" * (i + 1), "meta": {"source_type": "kb", "idx": i}} for i in range(n)]
+
+
+def test_concurrent_embedding_keeps_input_order(monkeypatch):
+    fake = _FakeEmbeddings()
+    agent = _agent(monkeypatch, fake, EMBED_CONCURRENCY="4")
+    out = agent.run(_items(40))
+
+    assert [r["metadata"]["idx"] for r in out] == list(range(40))
+    assert all(r["vector"] == [float(len(r["text"]))] for r in out)
+    assert 1 < fake.peak <= 4
+
+    batches = list(agent.iter_embed(_items(10)))
+    assert [len(b) for b in batches] == [3, 3, 3, 1]
+    assert [r["metadata"]["idx"] for b in batches for r in b] == list(range(10))
+
+
+def test_throttle_honors_retry_after_and_halves_window(monkeypatch):
+    fake = _FakeEmbeddings(throttle_first=1, retry_after_ms="200")
+    agent = _agent(monkeypatch, fake, EMBED_CONCURRENCY="4")
+    t0 = time.monotonic()
+    out = agent.run(_items(6))
+
+    assert [r["metadata"]["idx"] for r in out] == list(range(6))
+    assert time.monotonic() - t0 >= 0.2
+    assert agent.limiter.stats.throttled == 1
+    assert agent.limiter.stats.min_window == 2.0
+
+
+def test_token_bucket_paces_requests_and_tokens():
+    lim = AdaptiveRateLimiter(rpm=6000, max_concurrency=1, burst_sec=0.1)  # 100/s, burst 10
+    t0 = time.monotonic()
+    for _ in range(60):
+        lim.acquire()
+        lim.release()
+    assert 0.45 <= time.monotonic() - t0 < 1.5
+
+    lim = AdaptiveRateLimiter(tpm=600000, max_concurrency=1, burst_sec=0.1)  # 10k/s, burst 1000
+    t0 = time.monotonic()
+    for n in (1000, 2500, 250):  # oversize request goes through on a full bucket, then pays back
+        lim.acquire(n)
+        lim.release()
+    assert 0.25 <= time.monotonic() - t0 < 1.0
+
+
+def test_parse_retry_after():
+    assert parse_retry_after({"retry-after-ms": "1500", "retry-after": "9"}) == 1.5
+    assert parse_retry_after({"retry-after": "7"}) == 7.0
+    assert parse_retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:10 GMT"}, now=1445412480.0) == 10.0
+    assert parse_retry_after({"retry-after": "soon"}) is None
+    assert parse_retry_after({}) is None
@@ -0,0 +1,108 @@
+# tests/test_index_manifest.py
+import hashlib
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+from server.agents import context_agent, embedding_agent, vectorstore_agent
+from server.agents.embedding_backends import EmbeddingBackend
+from server.pipeline import dfmea_pipeline
+from server.pipeline.dead_letter import DeadLetterConfig, DeadLetterLog
+from server.pipeline.index_manifest import IndexManifest, IndexManifestConfig, chunk_hash
+from server.utils.embedding_cache import EmbeddingCache, EmbeddingCacheConfig
+
+
+def _manifest(tmp_path):
+    cfg = IndexManifestConfig(manifest_dir=str(tmp_path / "manifests"))
+    return IndexManifest(collection="dfmea", product="Quasar", subproduct="Display", cfg=cfg)
+
+
+def test_manifest_plan_and_chunk_diff(tmp_path):
+    a, b, c = (tmp_path / n for n in ("a.csv", "b.docx", "c.xlsx"))
+    a.write_text("text\nseal leak\n")
+    b.write_bytes(b"v1")
+    c.write_bytes(b"kb")
+
+    m = _manifest(tmp_path)
+    plan = m.plan([("kb", str(a)), ("prd", str(b)), ("kb", str(c))])
+    assert plan.counts() == {"added": 3, "updated": 0, "deleted": 0, "unchanged": 0}
+
+    for key in plan.to_process:
+        hashes = [chunk_hash("alpha"), chunk_hash("beta"), chunk_hash("alpha")]
+        ids, kept, stale = m.diff_file(key, hashes)
+        assert len(set(ids)) == 3 and kept == [] and stale == []
+        m.record(key, path=plan.paths[key], sha256=plan.hashes[key], chunks=hashes, points=ids)
+    m.save()
+
+    # edit one file, drop another
+    b.write_bytes(b"v2")
+    m2 = _manifest(tmp_path)
+    plan = m2.plan([("kb", str(a)), ("prd", str(b))])
+    assert plan.counts() == {"added": 0, "updated": 1, "deleted": 1, "unchanged": 1}
+    assert len(m2.stale_points(plan.deleted)) == 3
+
+    key = plan.updated[0]
+    old = m2.files[key]["points"]
+    ids, kept, stale = m2.diff_file(key, [chunk_hash("alpha"), chunk_hash("gamma")])
+    assert ids[0] == old[0] and kept == [old[0]]        # unchanged chunk keeps its point
+    assert sorted(stale) == sorted(old[1:])             # removed rows -> points to delete
+
+    m2.reset()                                          # full rebuild: start from nothing
+    assert m2.files == {} and _manifest(tmp_path).files == {}
+    m2.reset()
+
+
+class _HashBackend(EmbeddingBackend):
+    name = "hash"
+
+    def embed(self, texts):
+        return np.array([list(hashlib.sha256(t.encode()).digest()[:8]) for t in texts], np.float32) + 1
+
+
+def test_incremental_index_rewrites_payloads_of_moved_rows(monkeypatch, tmp_path):
+    client = QdrantClient(":memory:")
+    monkeypatch.setattr(embedding_agent, "make_backend", lambda name: _HashBackend())
+    monkeypatch.setattr(embedding_agent, "get_embedding_cache", lambda: EmbeddingCache(EmbeddingCacheConfig(enabled=False)))
+    monkeypatch.setattr(context_agent, "get_azure_openai_client", lambda: None)
+    monkeypatch.setattr(vectorstore_agent, "COLLECTION_PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(context_agent, "VectorStoreAgent", lambda collection_name: vectorstore_agent.VectorStoreAgent(
+        vectorstore_agent.QdrantConfig(collection=collection_name), client=client))
+    monkeypatch.setattr(dfmea_pipeline, "VectorStoreAgent", lambda cfg: vectorstore_agent.VectorStoreAgent(cfg, client=client))
+    monkeypatch.setattr(dfmea_pipeline, "DeadLetterLog", lambda **kw: DeadLetterLog(
+        **kw, cfg=DeadLetterConfig(dead_letter_dir=str(tmp_path / "dead"))))
+    monkeypatch.setattr(dfmea_pipeline, "IndexManifest", lambda **kw: IndexManifest(
+        **kw, cfg=IndexManifestConfig(manifest_dir=str(tmp_path / "manifests"))))
+
+    kb = tmp_path / "kb.csv"
+    header = "ID,Function,Potential Failure Mode,Potential Failure Effects,Potential Causes\n"
+    rows = [
+        "1,Display,Mura when the touch panel is pressed,Localized distortion,No clearance behind display\n",
+        "2,Battery,Swelling after long charge cycles,Back cover lifts,Cell overcharge at high temperature\n",
+        "3,Speaker,Rattle at maximum volume,Distorted audio,Loose membrane adhesive\n",
+    ]
+    kb.write_text(header + "".join(rows))
+    pipe = dfmea_pipeline.DFMEAPipeline(product="Quasar", subproduct="Display", qdrant_collection="t")
+
+    def stored():
+        points, _ = client.scroll("t", limit=100, with_payload=True)
+        return {p.payload["text"]: p.payload for p in points}
+
+    first = pipe.index(kb_paths=[str(kb)], field_paths=[], prd_paths=[], incremental=True)
+    before = stored()
+    assert first["upserted"] == len(before) > 0
+
+    kb.write_text(header + "0,Scanner,Barcode read fails in sunlight,Missed scans,Window coating reflects glare\n" + "".join(rows))
+    second = pipe.index(kb_paths=[str(kb)], field_paths=[], prd_paths=[], incremental=True)
+    after = stored()
+    new = [t for t in after if t not in before]
+    assert second["embedded"] == len(new) > 0                 # only the inserted row is embedded
+    assert second["payloads_updated"] == len(before)          # every other row moved down by one
+    for text, payload in before.items():
+        assert after[text]["idx"] == payload["idx"] + 1
+    again = pipe.index(kb_paths=[str(kb)], field_paths=[], prd_paths=[], incremental=True)
+    assert again["unchanged"] == 1 and again["payloads_updated"] == 0
+
+    # the incrementally maintained payloads equal those of a full rebuild
+    pipe.index(kb_paths=[str(kb)], field_paths=[], prd_paths=[], incremental=False)
+    without_id = lambda payloads: {t: {k: v for k, v in p.items() if k != "point_id"} for t, p in payloads.items()}
+    assert without_id(stored()) == without_id(after)
@@ -0,0 +1,21 @@
+# tests/test_parse_cache.py
+from server.utils.parse_cache import ParseCache, ParseCacheConfig, ParseCacheStats
+
+
+def test_parse_cache_roundtrip_and_lru(tmp_path):
+    cache = ParseCache(ParseCacheConfig(enabled=True, cache_dir=str(tmp_path), max_bytes=10**9))
+    stats = ParseCacheStats()
+    rows = [{"file": "a.docx", "idx": 0, "text": "REQ-1 shall", "requirement_id": "REQ-1"}]
+
+    k = cache.key("docx", b"same bytes")
+    assert k == cache.key("docx", b"same bytes") != cache.key("csv", b"same bytes")
+    assert cache.get(k, stats) is None
+    assert cache.put(k, rows)
+    assert cache.get(k, stats) == rows
+    assert stats.as_counts() == {"parse_cache_hits": 1, "parse_cache_misses": 1}
+
+    # shrink the budget: putting a new entry evicts the least-recently-used one
+    cache.cfg.max_bytes = 1
+    k2 = cache.key("docx", b"other bytes")
+    cache.put(k2, rows)
+    assert cache.get(k) is None
@@ -28,3 +28,312 @@ def test_load_all_sources_smoke():
     # ensure order preference (field first, then prd, then kb) if multiple present
     if len(rows) >= 1:
         assert rows[0]["source_type"] in ("field", "prd", "kb")
+
+
+@pytest.mark.skipif(not os.path.exists(SAMPLE_DIR), reason="sample_files not found")
+def test_streaming_docx_rows_match_python_docx():
+    from server.utils.docx_parser import iter_docx_rows, parse_docx_to_rows
+
+    prds = [p for p in os.listdir(SAMPLE_DIR) if p.endswith(".docx")]
+    if not prds:
+        pytest.skip("No sample DOCX files available")
+    for name in prds:
+        p = _path(name)
+        assert list(iter_docx_rows(p, product="Quasar")) == parse_docx_to_rows(p, product="Quasar")
+
+
+def test_df_to_normalized_rows_columnwise():
+    import pandas as pd
+    from server.utils.excel_parser import df_to_normalized_rows, df_to_field_issue_rows
+
+    df = pd.DataFrame({
+        "Description": ["  cracked glass ", None, "", 42],
+        "Product": ["Quasar", None, "Quasar", "Quasar"],
+        "Fault_Code": ["E1", "E2", None, "E4"],
+    }, index=[10, 11, 12, 13])
+    rows = df_to_normalized_rows(df, product="Q", subproduct="D", source_type="field", file_name="/tmp/f.xlsx")
+    assert [(r["idx"], r["text"]) for r in rows] == [(10, "cracked glass"), (13, "42")]
+    assert rows[0]["file"] == "f.xlsx"
+
+    fri = df_to_field_issue_rows(df, product="Q", subproduct="D")
+    assert len(fri) == 4
+    assert fri[1]["product"] == "Q" and fri[1]["component"] == "D"
+    assert fri[2]["fault_code"] == "" and fri[3]["fault_code"] == "E4"
+
+
+@pytest.mark.skipif(not os.path.exists(SAMPLE_DIR), reason="sample_files not found")
+def test_load_all_sources_parallel_matches_serial():
+    prds = [_path(p) for p in sorted(os.listdir(SAMPLE_DIR)) if p.endswith(".docx")]
+    kw = dict(
+        product="Quasar",
+        subproduct="Display",
+        kb_paths=[_path("dfmea_knowledge_bank_3.csv")],
+        field_paths=[_path("field_reported_issues_3.xlsx")],
+        prd_paths=prds * 2,
+    )
+    serial = load_all_sources(workers=1, **kw)
+    parallel = load_all_sources(workers=3, **kw)
+    assert parallel == serial
+
+
+def test_concurrent_pool_users_do_not_cancel_each_other():
+    import threading, time
+    from functools import partial
+    from server.utils import parsers
+
+    results = {}
+
+    def call(name, workers, pool_name):
+        jobs = [partial(time.sleep, 0.2) for _ in range(4)]
+        results[name] = parsers.run_parse_jobs(jobs, workers=workers, pool_name=pool_name)
+
+    threads = [threading.Thread(target=call, args=a) for a in
+               (("a", 2, "parse"), ("b", 3, "parse"), ("c", 3, "chunk"))]
+    for t in threads:
+        t.start()
+        time.sleep(0.05)
+    for t in threads:
+        t.join()
+    assert all(err is None for res in results.values() for _, err in res)
+    assert parsers._pools["parse"] is not parsers._pools["chunk"]
+
+
+def test_arrow_csv_stream_matches_pandas(tmp_path):
+    import pandas as pd
+    from server.utils.excel_parser import (
+        df_to_normalized_rows, df_to_field_issue_rows, parse_excel_or_csv,
+        iter_csv_normalized_rows, iter_csv_field_issue_rows,
+    )
+
+    p = str(tmp_path / "fri.csv")
+    n = 3000
+    pd.DataFrame({
+        "Issue": [f"display flicker {i}" if i % 9 else "" for i in range(n)],
+        "Subsystem": [f"S{i % 4}" if i % 5 else None for i in range(n)],
+        "Fault_Type": ["electrical"] * n,
+        "Score": range(n),
+    }).to_csv(p, index=False)
+    df = parse_excel_or_csv(p, as_text=True)
+    assert len(df) == n
+
+    kw = dict(product="Q", subproduct="D", source_type="field", text_pref_cols=("issue",))
+    streamed = list(iter_csv_normalized_rows(p, block_size=4096, **kw))
+    assert streamed == df_to_normalized_rows(df, file_name=p, **kw)
+
+    fri = list(iter_csv_field_issue_rows(p, product="Q", subproduct="D", block_size=4096))
+    assert fri == df_to_field_issue_rows(df, product="Q", subproduct="D")
+
+
+def test_arrow_csv_multiline_cells_and_latin1_fallback(tmp_path):
+    import pandas as pd
+    from server.utils.excel_parser import iter_csv_batches
+
+    p = str(tmp_path / "notes.csv")
+    n = 2000
+    pd.DataFrame({
+        "Issue": [f"line one {i}\nline two, \"quoted\"\nline three" for i in range(n)],
+        "Code": [f"C{i}" for i in range(n)],
+    }).to_csv(p, index=False)
+    # blocks smaller than a single (multi-line) record
+    frames = list(iter_csv_batches(p, block_size=32))
+    got = pd.concat(frames)
+    assert len(frames) > 1 and len(got) == n
+    assert got.equals(pd.read_csv(p, dtype=str))
+
+    # UTF-8 for the first blocks, then a latin-1 byte: the whole file is read as latin-1
+    lat = str(tmp_path / "export.csv")
+    with open(lat, "wb") as f:
+        f.write("Issue,Code\n".encode())
+        f.write("".join(f"ok {i},C{i}\n" for i in range(500)).encode())
+        f.write("écran cassé,C500\nfin,C501\n".encode("latin-1"))
+    with open(lat, "rb") as fh:
+        got = pd.concat(iter_csv_batches(fh, block_size=256))
+    assert list(got.index) == list(range(502))
+    assert list(got["Issue"].iloc[-2:]) == ["écran cassé", "fin"]
+
+    head = str(tmp_path / "header.csv")
+    with open(head, "wb") as f:
+        f.write("Défaut,Code\nfissure,C1\n".encode("latin-1"))
+    assert list(pd.concat(iter_csv_batches(head)).columns) == ["Défaut", "Code"]
+
+
+def test_table_rows_do_not_depend_on_the_stream_threshold(tmp_path, monkeypatch):
+    import datetime
+    from openpyxl import Workbook
+    from server.utils import parsers
+    from server.utils.excel_parser import iter_csv_normalized_rows
+
+    # numeric columns, blanks and NA markers, and no preferred text column (whole-row text)
+    csv = str(tmp_path / "kb.csv")
+    with open(csv, "w", encoding="utf-8") as f:
+        f.write("ID,Score,Flag,Note,Component,Fault_Code\n")
+        f.write("60,2.50,True,,TP,7\n061, 7 ,,NA,,\n,1e3,False,\"ok, \"\"quoted\"\"\",Glass,12\n")
+    xlsx = str(tmp_path / "kb.xlsx")
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["ID", "Score", "Flag", "Note", "Component", "Fault_Code"])
+    ws.append([60, 2.5, True, None, "TP", 7])
+    ws.append([61.0, 0.1 + 0.2, None, "NA", None, None])
+    ws.append([None, datetime.datetime(2024, 1, 2), False, "ok", "Glass", 12])
+    wb.save(xlsx)
+
+    kw = dict(product="Q", subproduct="D", source_type="kb", text_pref_cols=parsers.KB_TEXT_COLS)
+    fri = dict(product="Q", subproduct="D")
+    for path, switch in ((csv, "use_arrow_csv"), (xlsx, "use_xlsx_stream")):
+        monkeypatch.setattr(parsers, switch, lambda p: False)
+        rows, issues = parsers.load_table_file(path, **kw), parsers.load_field_issue_file(path, **fri)
+        monkeypatch.setattr(parsers, switch, lambda p: True)
+        assert parsers.load_table_file(path, **kw) == rows
+        assert parsers.load_field_issue_file(path, **fri) == issues
+        assert [r["fault_code"] for r in issues] == ["7", "", "12"]
+
+    assert rows[1]["text"] == "{'ID': '61', 'Score': '0.3', 'Flag': nan, 'Note': nan, " \
+                              "'Component': nan, 'Fault_Code': nan}"
+    streamed = list(iter_csv_normalized_rows(csv, block_size=64, file_name="kb.csv", **kw))
+    monkeypatch.setattr(parsers, "use_arrow_csv", lambda p: False)
+    assert streamed == parsers.load_table_file(csv, **kw)
+    assert streamed[0]["text"] == "{'ID': '60', 'Score': '2.50', 'Flag': 'True', 'Note': nan, " \
+                                  "'Component': 'TP', 'Fault_Code': '7'}"
+    assert parsers.load_field_issues([csv, xlsx], **fri) == parsers.load_field_issue_file(csv, **fri) + issues
+
+
+def test_streamed_column_names_match_pandas(tmp_path):
+    import pandas as pd
+    from openpyxl import Workbook
+    from server.utils.excel_parser import iter_csv_batches, iter_xlsx_batches, parse_excel_or_csv
+
+    header = ["a", "", "b", "a", "a.1", " a ", "Issue\nnotes"]
+    csv = str(tmp_path / "names.csv")
+    pd.DataFrame([range(7), range(7, 14)], columns=header).to_csv(csv, index=False)
+    xlsx = str(tmp_path / "names.xlsx")
+    wb = Workbook()
+    wb.active.append([h or None for h in header])
+    wb.active.append(list(range(7)))
+    wb.save(xlsx)
+
+    expected = ["a", "Unnamed: 1", "b", "a.2", "a.1", "a", "Issue\nnotes"]
+    for path, frames in ((csv, iter_csv_batches(csv, block_size=16)), (xlsx, iter_xlsx_batches(xlsx))):
+        got = pd.concat(frames)
+        assert list(got.columns) == expected
+        assert got.equals(parse_excel_or_csv(path, as_text=True))
+
+
+def test_streaming_table_rows_fall_back_to_pandas_midway(tmp_path, monkeypatch):
+    import pandas as pd
+    from server.utils import parsers
+
+    # numbers, blanks and no preferred text column: the whole row is the text
+    df = pd.DataFrame({"ID": range(20), "Score": [2.5, None] * 10, "Code": ["7", ""] * 10})
+    csv, xlsx = str(tmp_path / "kb.csv"), str(tmp_path / "kb.xlsx")
+    df.to_csv(csv, index=False)
+    df.to_excel(xlsx, index=False)
+    kw = dict(product="Q", subproduct="D", source_type="kb", text_pref_cols=("text",))
+
+    def failing(stream, at, bad=lambda row: row):
+        def read(path, **k):
+            for i, row in enumerate(stream(path, **k)):
+                if i == at:
+                    raise ValueError("parser got out of sync")
+                yield bad(row)
+        return read
+
+    for path, switch, name in ((csv, "use_arrow_csv", "iter_csv_normalized_rows"),
+                               (xlsx, "use_xlsx_stream", "iter_xlsx_normalized_rows")):
+        expected = parsers.load_table_file(path, **kw)   # pandas: below the stream thresholds
+        assert expected[1]["text"] == "{'ID': '1', 'Score': nan, 'Code': nan}"
+        monkeypatch.setattr(parsers, switch, lambda p: True)
+        stream = getattr(parsers, name)
+        monkeypatch.setattr(parsers, name, failing(stream, 7))
+        assert list(parsers.iter_table_file_rows(path, **kw)) == expected
+
+        # streamed rows the pandas re-read would not reproduce: never mixed in one file
+        monkeypatch.setattr(parsers, name, failing(stream, 7, bad=lambda row: {**row, "text": row["text"] + " "}))
+        with pytest.raises(RuntimeError):
+            list(parsers.iter_table_file_rows(path, **kw))
+        monkeypatch.undo()
+
+
+def test_streaming_xlsx_matches_pandas_and_parallel_sheets(tmp_path):
+    import pandas as pd
+    from server.utils.excel_parser import (
+        df_to_normalized_rows, df_to_field_issue_rows, parse_excel_or_csv,
+        iter_xlsx_normalized_rows, iter_xlsx_field_issue_rows,
+    )
+    from server.utils.parsers import load_workbook_file
+
+    p = str(tmp_path / "fri.xlsx")
+    n = 1500
+    with pd.ExcelWriter(p, engine="openpyxl") as xw:
+        pd.DataFrame({
+            "Symptom": [f"no touch {i}" if i % 6 else None for i in range(n)],
+            "Component": [f"C{i % 3}" for i in range(n)],
+            "Fault_Code": ["E1", "E2", "E3"] * (n // 3),
+        }).to_excel(xw, index=False, sheet_name="Sheet1")
+        pd.DataFrame({"Symptom": ["dead pixel", "backlight off"]}).to_excel(xw, index=False, sheet_name="Extra")
+    df = parse_excel_or_csv(p, as_text=True)
+
+    kw = dict(product="Q", subproduct="D", source_type="field", text_pref_cols=("symptom",))
+    assert list(iter_xlsx_normalized_rows(p, batch_rows=400, **kw)) == df_to_normalized_rows(df, file_name=p, **kw)
+    fri = list(iter_xlsx_field_issue_rows(p, product="Q", subproduct="D", batch_rows=400))
+    assert fri == df_to_field_issue_rows(df, product="Q", subproduct="D")
+
+    serial = load_workbook_file(p, workers=1, **kw)
+    assert load_workbook_file(p, workers=2, **kw) == serial
+    assert [r["sheet"] for r in serial[-2:]] == ["Extra", "Extra"]
+
+
+def test_docx_tables_one_block_per_row_with_merged_cells(tmp_path):
+    from docx import Document
+    from server.utils.docx_parser import iter_docx_blocks, extract_docx_blocks
+
+    doc = Document()
+    doc.add_paragraph("Optical requirements")
+    t = doc.add_table(rows=4, cols=3)
+    for c, h in zip(t.rows[0].cells, ("Category", "Parameter", "Limit")):
+        c.text = h
+    t.cell(1, 0).merge(t.cell(3, 0)).text = "Display"          # vertical merge
+    t.cell(1, 1).text, t.cell(1, 2).text = "Brightness", ">= 500 nits"
+    t.cell(2, 1).merge(t.cell(2, 2)).text = "Contrast TBD"     # horizontal merge
+    t.cell(3, 1).text, t.cell(3, 2).text = "Viewing angle", "80 deg"
+    p = str(tmp_path / "merged.docx")
+    doc.save(p)
+
+    blocks = extract_docx_blocks(p)
+    assert blocks == [
+        "Optical requirements",
+        "Category: Display | Parameter: Brightness | Limit: >= 500 nits",
+        "Parameter: Contrast TBD",
+        "Parameter: Viewing angle | Limit: 80 deg",
+    ]
+    assert list(iter_docx_blocks(p)) == blocks
+
+
+def test_docx_two_column_tables_key_value_unless_header_marked(tmp_path):
+    from docx import Document
+    from docx.oxml import OxmlElement
+    from server.utils.docx_parser import iter_docx_blocks, extract_docx_blocks
+
+    def table(doc, rows, bold_first=False, repeat_first=False):
+        t = doc.add_table(rows=len(rows), cols=2)
+        for i, (r, kv) in enumerate(zip(t.rows, rows)):
+            for c, text in zip(r.cells, kv):
+                c.paragraphs[0].add_run(text).bold = bold_first and i == 0
+        if repeat_first:
+            t.rows[0]._tr.get_or_add_trPr().append(OxmlElement("w:tblHeader"))
+
+    doc = Document()
+    table(doc, [("Part number", "QX-100"), ("Supplier", "Acme"), ("Rev", "B")])
+    table(doc, [("Parameter", "Limit"), ("Brightness", "500 nits")], bold_first=True)
+    table(doc, [("Test", "Standard"), ("ESD", "EN61000-4-2")], repeat_first=True)
+    p = str(tmp_path / "kv.docx")
+    doc.save(p)
+
+    blocks = extract_docx_blocks(p)
+    assert blocks == [
+        "Part number: QX-100",
+        "Supplier: Acme",
+        "Rev: B",
+        "Parameter: Brightness | Limit: 500 nits",
+        "Test: ESD | Standard: EN61000-4-2",
+    ]
+    assert list(iter_docx_blocks(p)) == blocks
@@ -0,0 +1,28 @@
+# tests/test_query_cache.py
+from server.utils.query_cache import LRUCache, QueryCacheConfig, QueryCacheStats, make_caches, normalize_query
+
+
+def test_lru_evicts_least_recently_used():
+    c = LRUCache(2)
+    c.put("a", 1)
+    c.put("b", 2)
+    assert c.get("a") == 1      # refreshes "a"
+    c.put("c", 3)               # evicts "b"
+    assert c.get("b", "miss") == "miss" and c.get("a") == 1 and c.get("c") == 3
+    c.put("empty", [])
+    assert c.get("empty", "miss") == []   # cached empty hit lists are hits too
+    assert c.clear() == 2 and len(c) == 0
+
+
+def test_disabled_cache_stores_nothing():
+    vectors, results = make_caches(QueryCacheConfig(enabled=False))
+    vectors.put("q", [1.0])
+    results.put("q", [])
+    assert vectors.get("q") is None and len(results) == 0
+
+
+def test_normalize_query_and_counts():
+    assert normalize_query("  Quasar • Display\tfault:NO   DISPLAY ") == "quasar • display fault:no display"
+    st = QueryCacheStats(vector_hits=3, result_misses=1)
+    assert st.as_counts()["query_vector_cache_hits"] == 3
+    assert st.as_counts()["retrieval_cache_misses"] == 1
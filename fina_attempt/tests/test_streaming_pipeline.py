@@ -0,0 +1,54 @@
+# tests/test_streaming_pipeline.py
+import threading
+import time
+
+import pytest
+
+from server.pipeline.streaming import BoundedPipeline
+
+
+def test_stages_preserve_order_and_report_stats():
+    pipe = (
+        BoundedPipeline(maxsize=2)
+        .add("double", lambda xs: (x * 2 for x in xs))
+        .add("pairs", lambda xs: (list(p) for p in zip(xs, xs)))
+    )
+    out = []
+    n, stats = pipe.run(range(10), sink=out.append)
+    assert n == 5 and out == [[0, 2], [4, 6], [8, 10], [12, 14], [16, 18]]
+    assert [(s.name, s.items) for s in stats] == [("source", 10), ("double", 10), ("pairs", 5)]
+
+
+def test_backpressure_bounds_items_in_flight():
+    produced = []
+    release = threading.Event()
+
+    def slow_sink(_):
+        release.wait(5)
+
+    def feed():
+        for i in range(1000):
+            produced.append(i)
+            yield i
+
+    pipe = BoundedPipeline(maxsize=3).add("same", lambda xs: xs)
+    t = threading.Thread(target=pipe.run, args=(feed(),), kwargs={"sink": slow_sink})
+    t.start()
+    time.sleep(0.3)
+    # sink holds 1; each of the two queues holds <= 3; each stage holds <= 1 pending put
+    assert len(produced) <= 1 + 3 + 1 + 3 + 1 + 1
+    release.set()
+    t.join(5)
+    assert len(produced) == 1000
+
+
+def test_first_stage_error_is_raised_and_stops_pipeline():
+    def boom(xs):
+        for x in xs:
+            if x == 3:
+                raise ValueError("bad row 3")
+            yield x
+
+    pipe = BoundedPipeline(maxsize=1).add("boom", boom).add("same", lambda xs: xs)
+    with pytest.raises(ValueError, match="bad row 3"):
+        pipe.run(iter(range(10_000_000)))
@@ -0,0 +1,51 @@
+# tests/test_upload_intake.py
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import UploadFile
+
+from server.utils.io_helpers import UploadTooLarge, detect_upload_kind, intake_upload, intake_uploads, close_uploads
+from server.utils.excel_parser import read_csv_safe
+
+
+def _upload(name, data):
+    return UploadFile(file=io.BytesIO(data), filename=name)
+
+
+def test_intake_hashes_sniffs_and_spills(tmp_path):
+    csv = b"issue,description\nleak,seal failed\n"
+    up = intake_upload(_upload("field.xlsx", csv), spool_max_memory=8, dirpath=str(tmp_path))
+    # type comes from content, not the (wrong) extension
+    assert up.kind == "csv"
+    assert up.sha256 == hashlib.sha256(csv).hexdigest()
+    assert up.path and os.path.exists(up.path) and up.data is None
+    assert read_csv_safe(up.source()).iloc[0]["issue"] == "leak"
+    up.close()
+    assert not os.listdir(tmp_path)
+
+    legacy = intake_upload(_upload("spec.docx", b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + b"\0" * 64))
+    assert legacy.kind == "doc"
+    assert intake_upload(_upload("empty.csv", b"")).kind == "empty"
+
+
+def test_text_kind_follows_extension_and_accepts_legacy_encodings():
+    latin1 = "issue,description\nfissure,écran cassé\n".encode("latin-1")
+    assert detect_upload_kind(latin1, "field.csv") == "csv"
+    assert read_csv_safe(latin1).iloc[0]["description"] == "écran cassé"
+    assert detect_upload_kind(b"a,b\n1,2\n", "export") == "csv"
+    for name in ("notes.txt", "data.json", "README.md"):
+        assert detect_upload_kind(b'{"a": 1}\n', name) == "unknown"
+    assert detect_upload_kind(b"\x01\x02\x03binary", "field.csv") == "unknown"
+
+
+def test_intake_enforces_request_budget(tmp_path):
+    files = [_upload("a.csv", b"x\n" * 40), _upload("b.csv", b"y\n" * 40)]
+    with pytest.raises(UploadTooLarge):
+        intake_uploads([files], max_request_bytes=100, spool_max_memory=0, dirpath=str(tmp_path))
+    assert not os.listdir(tmp_path)
+
+    ok = intake_uploads([[_upload("a.csv", b"x\n")], []], max_request_bytes=100)
+    assert [len(b) for b in ok] == [1, 0] and ok[0][0].data == b"x\n"
+    close_uploads(ok)
@@ -0,0 +1,181 @@
+# tests/test_vectorstore.py
+import threading
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
+
+from server.agents import context_agent, vectorstore_agent
+from server.agents.vectorstore_agent import QdrantConfig, VectorStoreAgent, collection_generation
+from server.utils.embedding_batch import EmbeddingBatch
+
+
+class _CountingClient:
+    """QdrantClient(":memory:") that records upserts and can fail the first few.
+
+    The local client is not thread-safe, so writes into it are serialized here;
+    the agent still issues them from concurrent workers.
+    """
+
+    def __init__(self, fail=0, status=None):
+        self.inner = QdrantClient(":memory:")
+        self.upserts = []
+        self.fail = fail
+        self.status = status
+        self.lock = threading.Lock()
+
+    def upsert(self, collection_name, points, wait):
+        with self.lock:
+            return self._upsert(collection_name, points, wait)
+
+    def _upsert(self, collection_name, points, wait):
+        if self.fail:
+            self.fail -= 1
+            if self.status:
+                raise UnexpectedResponse(self.status, "err", b"", None)
+            raise ResponseHandlingException(TimeoutError("timed out"))
+        self.upserts.append((len(points.ids), wait))
+        return self.inner.upsert(collection_name, points=points, wait=wait)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+@pytest.fixture(autouse=True)
+def _profiles(monkeypatch, tmp_path):
+    monkeypatch.setattr(vectorstore_agent, "COLLECTION_PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(vectorstore_agent.time, "sleep", lambda s: None)
+
+
+def _agent(client, **cfg):
+    return VectorStoreAgent(QdrantConfig(collection="t", **cfg), client=client)
+
+
+def _batch(n, dim=8, text="x", **meta):
+    rng = np.random.default_rng(n)
+    return EmbeddingBatch(
+        rng.standard_normal((n, dim)),
+        [f"{text} {i}" for i in range(n)],
+        [{"product": "Quasar", "subproduct": "Display", "idx": i, **meta} for i in range(n)],
+    )
+
+
+def test_upsert_splits_into_bounded_parallel_batches_that_all_wait():
+    client = _CountingClient()
+    agent = _agent(client, upsert_batch_points=100, upsert_parallel=3)
+    gen = collection_generation("t")
+
+    assert agent.upsert(_batch(950)) == 950
+
+    assert sorted(client.upserts) == [(50, True)] + [(100, True)] * 9   # every sub-batch waits
+    assert client.count("t").count == 950
+    assert agent.last_upsert.batches == 10 and agent.last_upsert.points_per_sec > 0
+    assert collection_generation("t") == gen + 1
+
+
+def test_upsert_batches_are_bounded_by_request_bytes():
+    client = _CountingClient()
+    agent = _agent(client, upsert_batch_mb=0.1)  # ~20 KB payloads -> at most 5 per request
+    assert agent.upsert(_batch(40, text="y" * 20000)) == 40
+    sizes = [n for n, wait in client.upserts]
+    assert sum(sizes) == 40 and max(sizes) <= 5
+
+
+def test_transient_failures_are_retried_and_client_errors_are_not():
+    client = _CountingClient(fail=2)
+    agent = _agent(client)
+    assert agent.upsert(_batch(10)) == 10
+    assert agent.last_upsert.retries == 2 and client.count("t").count == 10
+
+    client = _CountingClient(fail=1, status=400)
+    with pytest.raises(UnexpectedResponse):
+        _agent(client).upsert(_batch(10))
+
+
+def test_legacy_upsert_shapes_and_delete():
+    agent = _agent(QdrantClient(":memory:"))
+    vecs = np.eye(4).tolist()
+    assert agent.upsert(vecs, [{"text": f"t{i}", "product": "Quasar"} for i in range(4)]) == 4
+    recs = _batch(3, dim=4).to_records()
+    recs[0]["id"] = "00000000-0000-0000-0000-000000000001"
+    assert agent.upsert(recs) == 3
+    assert agent.client.count("t").count == 7
+    assert agent.delete([recs[0]["id"]]) == 1 and agent.client.count("t").count == 6
+
+
+def test_delete_where_clears_one_scope():
+    agent = _agent(QdrantClient(":memory:"))
+    assert agent.delete_where(product="Quasar", subproduct="Display") == 0   # no collection yet
+    agent.upsert(_batch(6))
+    other = _batch(4)
+    other.columns["subproduct"] = ["TP"] * 4
+    agent.upsert(other)
+    gen = collection_generation("t")
+
+    assert agent.delete_where(product="Quasar", subproduct="Display") == 6
+    assert agent.client.count("t").count == 4 and collection_generation("t") == gen + 1
+    with pytest.raises(ValueError):
+        agent.delete_where()
+
+
+def test_search_filters_and_result_shape():
+    agent = _agent(QdrantClient(":memory:"))
+    b = _batch(20)
+    b.columns["component"] = ["TP"] * 5 + ["Glass"] * 5 + [None] * 10
+    agent.upsert(b)
+
+    hits = agent.search(b.vectors[0], top_k=3, product="Quasar", subsystem="Display", components=["TP"])
+    assert hits[0]["text"] == "x 0" and hits[0]["metadata"]["idx"] == 0
+    assert set(hits[0]) == {"id", "score", "text", "metadata", "payload"}
+    found = agent.search(b.vectors[7], top_k=20, components=["TP"])
+    assert all(h["metadata"].get("component") in ("TP", None) for h in found)
+    assert agent.search(b.vectors[0], product="Other") == []
+    assert agent.search(b.vectors[0], score_threshold=1.01) == []
+
+
+def test_profile_recorded_and_mismatch_refused():
+    client = QdrantClient(":memory:")
+    agent = _agent(client)
+    agent.embedding_profile = {"backend": "m", "reduction": {"method": "truncate", "dims": 8}}
+    agent.ensure_collection()
+    assert agent.collection_profile()["dims"] == 8
+
+    other = _agent(client)
+    other.embedding_profile = {"backend": "other", "reduction": {"method": "native", "dims": 0}}
+    with pytest.raises(ValueError):
+        other.upsert(_batch(2))
+    with pytest.raises(ValueError):
+        _agent(client).upsert(_batch(2, dim=16))
+
+
+def test_context_agent_caches_retrieval_until_collection_changes(monkeypatch):
+    client = QdrantClient(":memory:")
+    monkeypatch.setattr(context_agent, "get_azure_openai_client", lambda: None)
+    monkeypatch.setattr(context_agent, "VectorStoreAgent", lambda collection_name: _agent(client))
+    batch = _batch(10)
+    _agent(client).upsert(batch)
+
+    class _Embedder:
+        calls = 0
+
+        def embed_query(self, text):
+            _Embedder.calls += 1
+            return batch.vectors[0]
+
+    agent = context_agent.ContextAgent(collection_name="t", embedder=_Embedder(), score_threshold=0.0)
+    searches = []
+    search = agent.vectorstore.search
+    agent.vectorstore.search = lambda *a, **k: searches.append(1) or search(*a, **k)
+    agent._chat = lambda system, user: '[{"Failure Mode": "crack"}]'
+    rows = [{"product": "Quasar", "subsystem": "Display", "component": "TP", "fault_code": "Crack"}] * 50
+    rows += [{"product": "Quasar", "subsystem": "Display", "component": "TP", "fault_code": " crack "}] * 50
+
+    assert len(agent.generate(rows)) == 100
+    assert len(searches) == 1 and _Embedder.calls == 1
+    assert agent.cache_stats.as_counts()["retrieval_cache_hits"] == 99
+
+    _agent(client).upsert(_batch(2))  # bumps the collection generation
+    agent.generate(rows[:3])
+    assert len(searches) == 2 and _Embedder.calls == 1
+    assert agent.cache_stats.invalidations == 1